@@ -0,0 +1,8 @@
+@REM Batch script to run dbcs on Windows
+@echo off
+set path = %PATH%;%CD%\src;
+
+python src\dbcs.py %*
+
+pause
+
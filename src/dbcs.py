@@ -0,0 +1,262 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Single entry point for the whole toolkit. Each file goes through a series of
+# stages (load -> validate -> dot -> render), with the command given saying how
+# far to go. The model is only loaded once, and gets passed along through each
+# of the stages, so that "validate then draw" doesn't load everything twice.
+#
+# Files which fail validation don't get drawn (unless --keep-going is given),
+# so that no time is spent rendering diagrams of broken schemas.
+
+import sys
+import traceback
+
+from optparse import OptionParser
+
+import dbcsLoader
+import dbcsValidate
+import dbcsReport
+import dbcs2Graph
+import dbcsRender
+import dbcsWatch
+import dbcsProfile
+
+###############################
+# STAGES
+
+# stages that each file goes through (in order)
+# NOTE: the command given on the commandline is the last stage to run
+stages = ["load", "validate", "dot", "render"];
+
+# Settings for the stages that each file goes through
+class Pipeline:
+	__slots__ = [
+		'stages',		# names of the stages to run (in order)
+		'mode',			# set of tests to perform (see dbcsValidate.modes)
+		'restricted',	# only allow the dbcs mini-language in files (see dbcsLoader.readDBCS)
+		'keepGoing',	# draw files even if they fail validation
+		'incremental',	# skip writing .dot files and rendering diagrams which are already up to date
+
+		'gv_engine',	# GraphViz engine to render diagrams with
+		'formats',		# formats of diagrams to render
+		'timeout',		# max time (in seconds) to let each render run for
+		'focus',		# (entity name, depth) to only draw the part of each model around an entity
+		'partitioning',	# (mode, areas, min size, link format) to draw each model in parts
+	]
+
+	# Constructor
+	#	lastStage: last stage to run (with all the ones before it being run too)
+	#	validate: run the validation stage (if it comes before the last stage)
+	def __init__ (self, lastStage, validate=True):
+		self.stages = stages[:stages.index(lastStage) + 1];
+		if (not validate) and (lastStage != "validate") and ("validate" in self.stages):
+			self.stages.remove("validate");
+
+		self.mode = dbcsValidate.modes[0];
+		self.restricted = False;
+		self.keepGoing = False;
+		self.incremental = False;
+
+		self.gv_engine = dbcs2Graph.gv_engines[0];
+		self.formats = dbcs2Graph.formats[:1];
+		self.timeout = None;
+		self.focus = None;
+		self.partitioning = None;
+
+	# run the stages for the given file
+	#	scheduler: dbcsRender.RenderScheduler to queue renders on (they aren't waited for here)
+	#	reporter: dbcsReport.Reporter to report the results of validating the file to
+	#	profiler: dbcsProfile.Profiler to record the time taken for each phase in
+	# < returns: (model, passed) - the model loaded from the file (or None if it couldn't be loaded, or
+	#			  didn't need to be), and whether it passed validation (or was loaded, if it wasn't validated)
+	def run (self, fileN, scheduler, reporter, profiler=None):
+		profiler = profiler or dbcsProfile.NULL_PROFILER;
+		validating = ("validate" in self.stages);
+
+		# unchanged files don't even need loading if everything drawn from them is up to date
+		# NOTE: files still need loading to be validated though
+		sourceHash = None;
+		if self.incremental and ("dot" in self.stages):
+			if "render" in self.stages:
+				renders = [(self.gv_engine, format) for format in self.formats];
+			else:
+				renders = [];
+			whole = not (self.focus or self.partitioning);
+			sourceHash, current = dbcs2Graph.checkSchemaSource(fileN, renders, whole and not validating);
+			if current:
+				return (None, True);
+
+		if validating:
+			reporter.beginFile(fileN);
+
+		try:
+			model = dbcs2Graph.loadSchema(fileN, self.restricted, profiler);
+			if model is None:
+				if validating:
+					reporter.fileError(fileN, "Couldn't load model");
+				passed = False;
+			elif validating:
+				passed = dbcsValidate.checkSchema(fileN, model, self.mode, self.restricted, reporter, profiler);
+			else:
+				passed = True;
+		except Exception, e:
+			# errors in the file shouldn't stop the rest of the files getting processed
+			traceback.print_exc();
+			if validating:
+				reporter.fileError(fileN, "%s: %s" % (e.__class__.__name__, e));
+			model = None;
+			passed = False;
+
+		if validating:
+			reporter.endFile(fileN, passed);
+
+		if (model is None) or ("dot" not in self.stages):
+			return (model, passed);
+
+		if (not passed) and (not self.keepGoing):
+			print("!! Not drawing %s, since it failed validation" % (fileN));
+			return (model, passed);
+
+		# draw the model
+		graphFileNs = dbcs2Graph.writeGraphs(fileN, model, self.incremental, self.focus, self.partitioning, profiler, sourceHash);
+		if "render" in self.stages:
+			for graphFileN in graphFileNs:
+				dbcs2Graph.queueRenders(scheduler, self.gv_engine, self.formats, graphFileN, self.timeout, model, self.incremental);
+
+		return (model, passed);
+
+###############################
+
+def main ():
+	# set up option parser for managing the commandline args
+	usage = ("usage: %prog " + "|".join(stages) + " [-n] [-k] [-m modename] [-r format] [-o file] [--cache] [-e enginename] [-f format[,format...]] [-j jobs] [-t timeout] " +
+			 "[-i] [-s] [-w] [-p mode [--areas file] | --focus entity [--depth k]] [--compact] [--snapshots] [--profile] file1 [file2 [...]]\n\n" +
+			 "Runs each file through the stages up to (and including) the one given, out of:\n" +
+			 "  load     - load the model\n" +
+			 "  validate - check the model for common design flaws (as for dbcsValidate)\n" +
+			 "  dot      - write GraphViz (.dot) graphs of the model (as for dbcs2Graph)\n" +
+			 "  render   - render diagrams from the graphs (as for dbcs2Graph)");
+	parser = OptionParser(usage);
+	parser.add_option("-n", "--no-validate", dest="validate",
+			default=True, action="store_false",
+			help="Skip the validation stage (for 'dot' and 'render')")
+	parser.add_option("-k", "--keep-going", dest="keepGoing",
+			default=False, action="store_true",
+			help="Draw files even if they fail validation")
+	parser.add_option("-j", "--jobs", dest="jobs",
+			default=0, type="int",
+			help="Max number of GraphViz renders to run at once (defaults to the number of CPU's)")
+	parser.add_option("-i", "--incremental", dest="incremental",
+			default=False, action="store_true",
+			help="Skip writing .dot files and rendering diagrams which are already up to date")
+	parser.add_option("-s", "--safe", dest="restricted",
+			default=False, action="store_true",
+			help="Only allow the dbcs mini-language in files, instead of running them as Python scripts (for untrusted files)")
+	parser.add_option("-w", "--watch", dest="watch",
+			default=False, action="store_true",
+			help="Keep watching the given files/directories (or the current directory), and process them again when they change")
+	parser.add_option("--compact", dest="compact",
+			default=False, action="store_true",
+			help="Load models in a compact form (taking much less memory), for very large schemas")
+	parser.add_option("--snapshots", dest="snapshots",
+			default=False, action="store_true",
+			help="Save loaded models next to the files (as .dbcsm files), to load them faster while they're unchanged (mostly worthwhile along with --compact)")
+	dbcsValidate.addReportOptions(parser);
+	dbcs2Graph.addRenderOptions(parser);
+	dbcsProfile.addProfileOptions(parser);
+
+	# parse commandline options
+	(options, args) = parser.parse_args()
+	if (len(args) == 0) or (args[0] not in stages):
+		parser.error("expected one of %s" % stages);
+	fileNs = args[1:];
+	if (len(fileNs) == 0) and (not options.watch):
+		parser.error("no files given");
+
+	# load models in compact form
+	dbcsLoader.USE_COMPACT_MODELS = options.compact;
+	# save snapshots of loaded models
+	dbcsLoader.USE_MODEL_SNAPSHOTS = options.snapshots;
+	# keep validation results between runs
+	dbcsValidate.USE_RESULT_CACHE = options.cache;
+
+	# stages to run
+	pipeline = Pipeline(args[0], options.validate);
+	pipeline.mode = dbcsValidate.getMode(options);
+	pipeline.restricted = options.restricted;
+	pipeline.keepGoing = options.keepGoing;
+	pipeline.incremental = options.incremental or options.watch;
+	pipeline.gv_engine, pipeline.formats, pipeline.focus, pipeline.partitioning = dbcs2Graph.getRenderSettings(parser, options);
+
+	reportStream = dbcsValidate.openReportStream(options);
+
+	# always print version info first...
+	print("DataBase Conceptual Schema (EER) Toolkit");
+	print("Copyright 2010, Joshua Leung (aligorith@gmail.com)\n");
+
+	# results of validating the files get reported in the same way, whether watching or not
+	reporter = dbcsReport.makeReporter(options.report, reportStream);
+	reporter.begin();
+
+	# parse filename arguments
+	if options.watch:
+		# process files again as they change
+		# NOTE: only the changed outputs get rewritten/rendered again
+		def process (fileN):
+			print("$ Processing file ===> %s ..." % fileN);
+			profiler = dbcsProfile.makeProfiler(options.profile);
+			scheduler = dbcsRender.RenderScheduler(options.jobs, profiler=profiler);
+
+			pipeline.run(fileN, scheduler, reporter, profiler);
+			if reportStream:
+				reportStream.flush(); # don't keep whoever is reading the report waiting
+
+			scheduler.wait();
+			if scheduler.finished:
+				scheduler.printSummary(sys.stdout);
+			profiler.report(format=options.profileFormat);
+			print("");
+
+		dbcsWatch.Watcher(dbcsWatch.getWatchPaths(fileNs), process).run();
+
+		reporter.end();
+		if options.output:
+			reportStream.close();
+	else:
+		profiler = dbcsProfile.makeProfiler(options.profile);
+
+		# renders run in the background, while the later files get loaded and checked
+		scheduler = dbcsRender.RenderScheduler(options.jobs, profiler=profiler);
+		results = [];
+
+		for fileN in fileNs:
+			# print info on file we're handling
+			print("$ Processing file ===> %s ..." % fileN);
+
+			passed = pipeline.run(fileN, scheduler, reporter, profiler)[1];
+			results.append((fileN, passed));
+
+			# insert linebreak before next file for clarity
+			print("\n");
+
+		reporter.end();
+		if options.output:
+			reportStream.close();
+
+		# wait for the renders to finish
+		scheduler.wait();
+		if "render" in pipeline.stages:
+			scheduler.printSummary(sys.stdout);
+
+		if ("validate" in pipeline.stages) and (len(results) > 1):
+			dbcsValidate.printBatchSummary(results);
+		profiler.report(format=options.profileFormat);
+
+		# let scripts know if anything went wrong
+		failedRenders = [job for job in scheduler.finished if not job.succeeded()];
+		if failedRenders or not all([passed for fileN, passed in results]):
+			sys.exit(1);
+
+if __name__ == '__main__':
+	main();
@@ -11,48 +11,77 @@ from optparse import OptionParser
 
 from dbcsTypes import *
 import dbcsLoader
+import dbcsRender
+import dbcsLayout
+import dbcsBuild
+import dbcsWatch
+import dbcsProfile
+import dbcsCompact
+import dbcsPartition
 
 ##################################
+# DOT EMITTER
+#
+# The graph is generated as a stream of text chunks (roughly one per entity or
+# relationship) in a single pass over the model. These are then either gathered 
+# up into large buffered writes (createGraph), or joined in memory (getGraphText).
+
+# node/link options which don't change between items
+# NOTE: graphviz DOESN'T DO UNDERLINE, so keys just get a bold outline...
+ATTR_OPTS = 'shape=ellipse,fillcolor="lightcyan1",label="%s",%s';
+ATTR_STYLE_MULTI	= 'peripheries=2,style="filled,solid"';	# multivalued are always drawn with a double border
+ATTR_STYLE_DERIVED	= 'style="filled,dashed"';				# derived keys are always drawn with dotted lines
+ATTR_STYLE_KEY		= 'style="filled,solid,bold"';
+ATTR_STYLE_NORMAL	= 'style="filled,solid"';
+
+ENTITY_OPTS = 'shape=box,fillcolor="lightblue2",style="filled,solid",label="%s"';
+REL_OPTS = 'shape=diamond,fillcolor="lavenderblush2",style="filled,solid",label="%s"';
+SPEC_OPTS = 'shape=circle,fillcolor="grey97",style="filled,solid",label="%s"';
+DOUBLE_BORDER = ',peripheries=2';
+
+SPEC_LINK_OPTS = 'shape="tee",dir=forward,len=1.30';
 
-# write the given attribute to the graph file
-def writeAttribute (f, owner_name, attr):
+# stand-ins for entities outside the part of the model being drawn (see emitPartialGraph)
+STUB_OPTS = 'shape=box,fillcolor="grey90",style="filled,dashed",label="%s\\n(%s)"';
+STUB_URL = ',URL="%s"';
+# parts in the overview of a partitioned model
+PART_OPTS = 'shape=box,fillcolor="lightblue2",style="filled,solid",label="%s\\n(%d entities, %d relationships)",URL="%s"';
+
+# size of the chunks of text written to files at a time
+WRITE_BUFFER_SIZE = 64 * 1024;
+
+# -----------
+
+# add the text for the given attribute (and its components) to the list of chunks
+# NOTE: attributes are the most numerous items, so they get appended to their owner's 
+#		chunk instead of each one getting its own generator
+def appendAttribute (out, owner_name, attr):
 	# make name for this attribute node
 	aName = "%s_a%s" % (owner_name, attr.name);
 	
-	# attribute itself
-	#	- options
-	# 	NOTE: graphviz DOESN'T DO UNDERLINE, so just change the color...
-	opts = ['shape=ellipse'];
-	opts.append('fillcolor="lightcyan1"');
-	opts.append('label="%s"' % attr.name);
+	# style to use
 	if isinstance(attr, MultiAttr):
-		# multivalued are always drawn with a double border
-		opts.append('peripheries=2');
-		opts.append('style="filled,solid"');
-	elif isinstance(attr, DerivedAttr):	
-		# derived keys are always drawn with dotted lines
-		opts.append('style="filled,dashed"');
+		style = ATTR_STYLE_MULTI;
+	elif isinstance(attr, DerivedAttr):
+		style = ATTR_STYLE_DERIVED;
 	elif attr.key:
 		# keys cannot be multivalued (unique) or derived (we mustn't rely on calculation which may change)
 		# TODO: we need care when dealing with keys on weak entities (which are partial!)
-		opts.append('style="filled,solid,bold"');
+		style = ATTR_STYLE_KEY;
 	else:
-		# normal attributes
-		opts.append('style="filled,solid"');
-	#	- write the attribute now
-	f.write('\t\t"%s" [%s];\n' % (aName, ",".join(opts) ));
+		style = ATTR_STYLE_NORMAL;
 	
-	# link to owner
-	f.write('\t\t%s -- %s [len=0.5];\n' % (owner_name, aName));
+	# attribute itself, and the link to its owner
+	out.append('\t\t"%s" [%s];\n\t\t%s -- %s [len=0.5];\n' % (aName, ATTR_OPTS % (attr.name, style), owner_name, aName));
 	
 	# for composite attributes, include the component attributes
 	# NOTE: we simply define a composite attribute as one which can store 
 	# 		a set of 'component' attributes...
 	for subAttr in attr.components:
-		writeAttribute(f, aName, subAttr);
+		appendAttribute(out, aName, subAttr);
 	
-# write the specialisation for the entity
-def writeSpec (f, spec, index):
+# add the text for the specialisation for the entity to the list of chunks
+def appendSpec (out, spec, index):
 	# owner identifier to attach links to
 	owner_name = spec.parent_entity.name
 	
@@ -61,22 +90,16 @@ def writeSpec (f, spec, index):
 		# name for this node
 		my_name = "%s_s%d" % (owner_name, index);
 		
-		# write the spec itself
-		# 	- options
-		opts = ['shape=circle']
-		opts.append('fillcolor="grey97"');
-		opts.append('style="filled,solid"');
+		# the spec itself
 		if isinstance(spec, DisjointSpec):
-			opts.append('label="d"');
+			label = "d";
 		elif isinstance(spec, OverlapSpec):
-			opts.append('label="o"');
+			label = "o";
 		else:
-			opts.append('label=""');
-		# 	- write the spec item now
-		f.write('\t"%s" [%s];\n' % (my_name, ",".join(opts) ));
+			label = "";
+		out.append('\t"%s" [%s];\n' % (my_name, SPEC_OPTS % label));
 		
-		# write a link from spec to the entity that owns it
-		# 	- options
+		# link from spec to the entity that owns it
 		opts = [];
 		if spec.total:
 			# hack to get us total specialisation if there's only 1 specialisation for the class
@@ -84,132 +107,441 @@ def writeSpec (f, spec, index):
 		if spec.role:
 			opts.append('label="%s"' % spec.role);
 		opts.append('len=1.50');
-		#	- write the link
-		f.write('\t%s -- %s [%s];\n' % (owner_name, my_name, ",".join(opts) ));
+		out.append('\t%s -- %s [%s];\n' % (owner_name, my_name, ",".join(opts)));
 		
 		# make the name of this node the owner_name for subsequent entries
 		owner_name = my_name
 		
 	# create links between derived entities and us
 	for dEntity in spec.derived_entities:
-		# write a link from spec to the entity that owns it
-		# 	- options
-		opts = ['shape="tee"', 'dir=forward'];
-		opts.append('len=1.30');
-		#	- write the link
-		f.write('\t%s -- %s [%s];\n' % (owner_name, dEntity.name, ",".join(opts) ));
-
-# write the links for specialisations for the given entity
-# TODO: maybe we should just do all specs in one pass?
-def writeEntitySpecs (f, entity):
-	# write each specialisation and it's links
+		out.append('\t%s -- %s [%s];\n' % (owner_name, dEntity.name, SPEC_LINK_OPTS));
+
+# add the text for the specialisations for the given entity to the list of chunks
+def appendEntitySpecs (out, entity):
+	# each specialisation and it's links
 	for i,spec in enumerate(entity.specialisations):
-		writeSpec(f, spec, i);
-	f.write("\n");
-
-# write the given entity to the graph file
-def writeEntity (f, entity):
-	# start a subgraph for entity and its attributes
-	f.write('\tsubgraph {\n');
-
-	# entity itself first
-	#	- options
-	opts = ['shape=box'];
-	opts.append('fillcolor="lightblue2"');
-	opts.append('style="filled,solid"');
-	opts.append('label="%s"' % entity.name);
+		appendSpec(out, spec, i);
+	out.append("\n");
+
+# get the text for the given entity (and its attributes)
+def emitEntity (entity):
+	# subgraph for entity and its attributes, starting with the entity itself
+	opts = ENTITY_OPTS % entity.name;
 	if isinstance(entity, WeakEntity):
-		opts.append('peripheries=2');
-	#	- write the entity now
-	f.write('\t\t"%s" [%s];\n' % (entity.name, ",".join(opts)));
+		opts += DOUBLE_BORDER;
+	out = ['\tsubgraph {\n\t\t"%s" [%s];\n' % (entity.name, opts)];
 	
 	# entity attributes
 	for attr in entity.attributes:
-		writeAttribute(f, entity.name, attr);
+		appendAttribute(out, entity.name, attr);
 		
 	# close the subgraph
-	f.write('\t}');
-	
-# write the given relationship to the graph file
-def writeRelationship (f, rel):
-	# start a subgraph for entity and its attributes
-	f.write('\tsubgraph {\n');
-	
-	# add the relationship diamond
-	#	- options
-	opts = ['shape=diamond'];
-	opts.append('fillcolor="lavenderblush2"');
-	opts.append('style="filled,solid"');
-	opts.append('label="%s"' % rel.name);
+	out.append('\t}');
+	return "".join(out);
+	
+# get the text for the given relationship (and its attributes and links)
+def emitRelationship (rel):
+	# subgraph for relationship diamond and its attributes
+	opts = REL_OPTS % rel.name;
 	if isinstance(rel, IdentifyingRel): 
-		opts.append('peripheries=2');
-	#	- write the node
-	f.write('\t"%s" [%s];\n' % (rel.name, ",".join(opts) ));
+		opts += DOUBLE_BORDER;
+	out = ['\tsubgraph {\n\t"%s" [%s];\n' % (rel.name, opts)];
 	
 	# relationship attributes
 	for attr in rel.attributes:
-		writeAttribute(f, rel.name, attr);
+		appendAttribute(out, rel.name, attr);
 	
 	# close the subgraph
 	# NOTE: don't include links in this, since those can stretch further
-	f.write('\t}');
+	out.append('\t}');
 	
 	# add links from entities to relationship
+	# NOTE: just use structural constraints instead of worrying about participation vs cardinality
 	for link in rel.links:
-		# build up list of options 
-		opts = [];
-		
-		# NOTE: just use structural constraints instead of worrying about participation vs cardinality
-		opts.append('label="(%s,%s)"' % link.structCon);
-		opts.append('len=1.0');
-		
-		# write the link
-		f.write('\t%s -- %s [%s];\n' % (link.entity.name, rel.name, ",".join(opts) ));
+		out.append('\t%s -- %s [label="(%s,%s)",len=1.0];\n' % ((link.entity.name, rel.name) + tuple(link.structCon)));
+	
+	return "".join(out);
 
 # ----------- 
 
-# create the .dot graph file
-def createGraph (fileN, model):
-	# open graph file for writing
-	f = open(fileN, 'w');
+# generate the text of the .dot graph for the model
+def emitGraph (model):
+	# compact models get emitted straight from their tables instead
+	if isinstance(model, dbcsCompact.CompactModel):
+		for chunk in emitCompactGraph(model):
+			yield chunk;
+		return;
 	
 	# prefactory stuff...
-	f.write('graph ER\n{\n');
+	yield 'graph ER\n{\n';
 	
-	# write each entity to the file
+	# each entity, in a single pass over the entities
+	# NOTE: specialisation links are collected up to go after all the entities
+	specChunks = [];
 	for entity in model.entities:
-		writeEntity(f, entity);
-		f.write("\n");
+		yield emitEntity(entity);
+		yield "\n";
 		
-	# second pass over entity to add their specialisation links to the file
-	for entity in model.entities:
-		writeEntitySpecs(f, entity);
+		appendEntitySpecs(specChunks, entity);
+	
+	for chunk in specChunks:
+		yield chunk;
 		
 	# add some padding
-	f.write("\n\n");
+	yield "\n\n";
 		
-	# write each relationship to the file 
+	# each relationship
 	for rel in model.relationships:
-		writeRelationship(f, rel);
+		yield emitRelationship(rel);
 	
-	# info about the graph
-	#	- label string
+	# info about the graph, and finishing up
+	yield emitGraphInfo(model);
+
+# get the text for the info about the graph (which goes at the end)
+#	title: what part of the model the graph shows (if it doesn't show all of it)
+def emitGraphInfo (model, title=None):
+	# 	- label string
 	labelStr = "%s\\n" % (model.name);
+	if title:
+		labelStr += "%s\\n" % (title);
 	if len(model.description):
 		labelStr += "%s\\n" % (model.description);
 	labelStr += "by %s" % (model.getAuthorsString());
-	f.write('\n\tlabel = "%s"\n' % (labelStr));
+	
+	out = ['\n\tlabel = "%s"\n' % (labelStr)];
 	# 	- other settings
-	f.write('\toverlap = scalexy\n'); # very spaced out, but doesn't overlap... 
+	out.append('\toverlap = scalexy\n'); # very spaced out, but doesn't overlap... 
 	
 	# finishing up
-	f.write('}\n');
-	f.close();
+	out.append('}\n');
+	return "".join(out);
+
+# -----------
+# Parts of partitioned models (see dbcsPartition)
+
+# generate the text of the .dot graph for one part of a model (i.e. of a partitioned model)
+#	part: dbcsPartition.Partition with the items to include
+#	getStub: function (entity) -> (note, URL of diagram or None) for entities outside the part
+# NOTE: entities outside the part that the items link to are drawn as 'stubs', with the
+#		same node names as the real ones (so the links can be written in the same way)
+def emitPartialGraph (model, part, getStub):
+	yield 'graph ER\n{\n';
+	
+	included = set(part.entities);
+	stubs = [];
+	stubSet = set();
+	def addStub (entity):
+		if (entity is not None) and (entity not in included) and (entity not in stubSet):
+			stubSet.add(entity);
+			stubs.append(entity);
+	
+	# each entity, with specialisation links collected up to go after all the entities
+	specChunks = [];
+	for entity in part.entities:
+		yield emitEntity(entity);
+		yield "\n";
+		
+		appendEntitySpecs(specChunks, entity);
+		for spec in entity.specialisations:
+			for dEntity in spec.derived_entities:
+				addStub(dEntity);
+		
+		# superclasses in other parts get linked to directly
+		for parent in model.getEntitySuperclasses(entity):
+			if parent not in included:
+				addStub(parent);
+				specChunks.append('\t%s -- %s [%s];\n' % (parent.name, entity.name, SPEC_LINK_OPTS));
+	
+	for chunk in specChunks:
+		yield chunk;
+	
+	yield "\n\n";
+	
+	# each relationship
+	for rel in part.relationships:
+		yield emitRelationship(rel);
+		for link in rel.links:
+			addStub(link.entity);
+	
+	# stubs for everything in other parts
+	if stubs:
+		yield "\n";
+	for entity in stubs:
+		note, url = getStub(entity);
+		opts = STUB_OPTS % (entity.name, note);
+		if url:
+			opts += STUB_URL % (url);
+		yield '\t"%s" [%s];\n' % (entity.name, opts);
+	
+	yield emitGraphInfo(model, part.name);
+
+# generate the text of the .dot graph giving an overview of how the parts of a model link together
+#	getURL: function (part) -> URL of the diagram for the part
+def emitOverviewGraph (model, partitions, getURL):
+	yield 'graph ER\n{\n';
+	
+	# each part
+	for part in partitions:
+		opts = PART_OPTS % (part.name, len(part.entities), len(part.relationships), getURL(part));
+		yield '\t"%s" [%s];\n' % (part.key, opts);
+	
+	yield "\n";
+	
+	# links between them (labelled with how many links there are)
+	crossLinks = dbcsPartition.getCrossLinks(model, partitions);
+	for i, j in sorted(crossLinks):
+		yield '\t"%s" -- "%s" [label="%d",len=2.0];\n' % (partitions[i].key, partitions[j].key, crossLinks[(i, j)]);
+	
+	yield emitGraphInfo(model, "Overview");
+
+# -----------
+# Compact models (see dbcsCompact) get emitted straight from their tables, without any views.
+# NOTE: the text must be exactly the same as for the normal version of the model
+
+# styles for the kinds of attributes
+COMPACT_ATTR_STYLES = {
+	dbcsCompact.ATTR_MULTI   : ATTR_STYLE_MULTI,
+	dbcsCompact.ATTR_DERIVED : ATTR_STYLE_DERIVED,
+}
+
+# labels for the kinds of specialisations
+COMPACT_SPEC_LABELS = {
+	dbcsCompact.SPEC_PLAIN    : "",
+	dbcsCompact.SPEC_DISJOINT : "d",
+	dbcsCompact.SPEC_OVERLAP  : "o",
+}
+
+# add the text for the given attributes (and their components) to the list of chunks
+#	first, last: range of attributes in the attribute table
+def appendCompactAttributes (out, cm, owner_name, first, last):
+	strings = cm.strings;
+	
+	for a in xrange(first, last):
+		name = strings[cm.attrName[a]];
+		aName = "%s_a%s" % (owner_name, name);
+		
+		style = COMPACT_ATTR_STYLES.get(cm.attrKind[a]);
+		if style is None:
+			if cm.attrKey[a]:
+				style = ATTR_STYLE_KEY;
+			else:
+				style = ATTR_STYLE_NORMAL;
+		
+		out.append('\t\t"%s" [%s];\n\t\t%s -- %s [len=0.5];\n' % (aName, ATTR_OPTS % (name, style), owner_name, aName));
+		
+		# components
+		if cm.attrComps[a] != cm.attrComps[a + 1]:
+			appendCompactAttributes(out, cm, aName, cm.attrComps[a], cm.attrComps[a + 1]);
+
+# generate the text of the .dot graph for a compact model
+def emitCompactGraph (cm):
+	strings = cm.strings;
+	
+	yield 'graph ER\n{\n';
+	
+	# each entity (with specialisation links collected up to go after all the entities)
+	specChunks = [];
+	for e in xrange(len(cm.entName)):
+		name = strings[cm.entName[e]];
+		
+		opts = ENTITY_OPTS % name;
+		if cm.entWeak[e]:
+			opts += DOUBLE_BORDER;
+		out = ['\tsubgraph {\n\t\t"%s" [%s];\n' % (name, opts)];
+		appendCompactAttributes(out, cm, name, cm.entAttrs[e], cm.entAttrs[e + 1]);
+		out.append('\t}');
+		
+		yield "".join(out);
+		yield "\n";
+		
+		# specialisations
+		for s in xrange(cm.entSpecs[e], cm.entSpecs[e + 1]):
+			owner_name = name;
+			first = cm.specSubs[s];
+			last = cm.specSubs[s + 1];
+			
+			if last - first > 1:
+				my_name = "%s_s%d" % (owner_name, s - cm.entSpecs[e]);
+				specChunks.append('\t"%s" [%s];\n' % (my_name, SPEC_OPTS % COMPACT_SPEC_LABELS[cm.specKind[s]]));
+				
+				opts = [];
+				if cm.specTotal[s]:
+					opts.append('color="black:black"');
+				if cm.specRole[s] != dbcsCompact.NO_ITEM:
+					opts.append('label="%s"' % strings[cm.specRole[s]]);
+				opts.append('len=1.50');
+				specChunks.append('\t%s -- %s [%s];\n' % (owner_name, my_name, ",".join(opts)));
+				
+				owner_name = my_name;
+			
+			for k in xrange(first, last):
+				specChunks.append('\t%s -- %s [%s];\n' % (owner_name, strings[cm.entName[cm.subEntity[k]]], SPEC_LINK_OPTS));
+		specChunks.append("\n");
+	
+	for chunk in specChunks:
+		yield chunk;
+	
+	yield "\n\n";
+	
+	# each relationship
+	for r in xrange(len(cm.relName)):
+		name = strings[cm.relName[r]];
+		
+		opts = REL_OPTS % name;
+		if cm.relIdent[r]:
+			opts += DOUBLE_BORDER;
+		out = ['\tsubgraph {\n\t"%s" [%s];\n' % (name, opts)];
+		appendCompactAttributes(out, cm, name, cm.relAttrs[r], cm.relAttrs[r + 1]);
+		out.append('\t}');
+		
+		for l in xrange(cm.relLinks[r], cm.relLinks[r + 1]):
+			entity = cm.linkEntity[l];
+			if entity == dbcsCompact.NO_ITEM:
+				raise ValueError, "Relationship '%s' has a link with no participant" % (name)
+			else:
+				entityName = strings[cm.entName[entity]];
+			out.append('\t%s -- %s [label="(%s,%s)",len=1.0];\n' % ((entityName, name) + tuple(cm.constraints[cm.linkCon[l]])));
+		
+		yield "".join(out);
+	
+	yield emitGraphInfo(cm);
+	
+# write the given chunks of text to the file, in large blocks
+def writeChunks (f, chunks):
+	buf = [];
+	size = 0;
+	
+	for chunk in chunks:
+		buf.append(chunk);
+		size += len(chunk);
+		
+		if size >= WRITE_BUFFER_SIZE:
+			f.write("".join(buf));
+			buf = [];
+			size = 0;
+	
+	# write whatever is left over
+	if buf:
+		f.write("".join(buf));
+
+# pass on the given chunks of text, counting the nodes, edges and bytes in them
+# NOTE: this is only used when profiling, so that the emitter doesn't need to keep count itself.
+#		Node definitions are the only lines with a quoted name before the options, apart from
+#		the edges between quoted names in overview graphs (which get taken off again),
+#		and edges are the only ones with links (" -- ") in them.
+def countChunks (chunks, profiler):
+	nodes = edges = size = 0;
+	
+	for chunk in chunks:
+		nodes += chunk.count('" [') - chunk.count('" -- "');
+		edges += chunk.count(' -- ');
+		size += len(chunk);
+		yield chunk;
+	
+	profiler.count("dot.nodes", nodes);
+	profiler.count("dot.edges", edges);
+	profiler.count("dot.bytes", size);
+
+# -----------
+
+# get the text of the .dot graph for the model
+def getGraphText (model):
+	return "".join(emitGraph(model));
+
+# create the .dot graph file
+#	profiler: dbcsProfile.Profiler to count the nodes/edges/bytes written in
+def createGraph (fileN, model, profiler=None):
+	writeGraphFile(fileN, emitGraph(model), profiler);
+
+# write a .dot graph file from the given chunks of text
+#	profiler: dbcsProfile.Profiler to count the nodes/edges/bytes written in
+def writeGraphFile (fileN, chunks, profiler=None):
+	if profiler and profiler.enabled:
+		chunks = countChunks(chunks, profiler);
+	
+	# open graph file for writing
+	f = open(fileN, 'w');
+	try:
+		writeChunks(f, chunks);
+	finally:
+		f.close();
+
+# write the .dot graph file for the given .dbcs file, unless it is already up to date
+# NOTE: this relies on the .dot output being the same each time for the same model
+#	sourceHash: hash of the .dbcs file that the model was loaded from (if the graph is for the whole file)
+# < returns: False if the file was already up to date
+def updateGraphFile (fileN, chunks, profiler=None, sourceHash=None):
+	fileG = dbcsLoader.changeExtension(fileN, "dot");
+	
+	if profiler and profiler.enabled:
+		chunks = countChunks(chunks, profiler);
+	text = "".join(chunks);
+	dotHash = dbcsBuild.hashText(text);
+	
+	manifest = dbcsBuild.BuildManifest(fileN);
+	if manifest.isCurrent("dot", dotHash, fileG) and (dbcsBuild.hashFile(fileG) == dotHash):
+		# still note the version of the .dbcs file it is for, i.e. if only comments changed
+		if sourceHash and (manifest.entries.get(dbcsBuild.SOURCE_KEY) != sourceHash):
+			manifest.record(dbcsBuild.SOURCE_KEY, sourceHash);
+		return False;
+	
+	f = open(fileG, 'w');
+	try:
+		f.write(text);
+	finally:
+		f.close();
+	
+	manifest.entries["dot"] = dotHash;
+	if sourceHash:
+		manifest.entries[dbcsBuild.SOURCE_KEY] = sourceHash;
+	else:
+		manifest.entries.pop(dbcsBuild.SOURCE_KEY, None);
+	manifest.save();
+	return True;
+
+# are the .dot file and the given diagrams for the given .dbcs file all up to date with it?
+# NOTE: this can be checked without loading the model, using the hash of the .dbcs file it was last loaded from
+#	renders: list of (engine, format) for the diagrams which should have been rendered
+def isSchemaCurrent (fileN, sourceHash, renders=[]):
+	fileG = dbcsLoader.changeExtension(fileN, "dot");
+	
+	manifest = dbcsBuild.BuildManifest(fileN);
+	if not manifest.isCurrent(dbcsBuild.SOURCE_KEY, sourceHash, fileN):
+		return False;
+	
+	# .dot file mustn't have been changed since
+	dotHash = manifest.entries.get("dot");
+	if (dotHash is None) or (dbcsBuild.hashFile(fileG) != dotHash):
+		return False;
+	
+	for gv_engine, format in renders:
+		key = dbcsBuild.getRenderKey(gv_engine, format);
+		if not manifest.isCurrent(key, dotHash, dbcsLoader.changeExtension(fileN, format)):
+			return False;
+	return True;
+
+# helper for incremental builds - hash the given .dbcs file (before loading it), and check whether everything drawn from it is up to date
+# NOTE: the hash is taken before loading, so that changes made while loading get picked up next time
+#	renders: list of (engine, format) for the diagrams which get rendered from the graph
+#	whole: only the whole model gets drawn (otherwise the other graphs drawn from it can't be checked this way)
+# < returns: (hash of the file (or None if it can't be read), whether everything is up to date)
+def checkSchemaSource (fileN, renders=[], whole=True):
+	fileN = dbcsLoader.changeExtension(fileN, "dbcs");
+	sourceHash = dbcsBuild.hashFile(fileN);
+	
+	current = whole and (sourceHash is not None) and isSchemaCurrent(fileN, sourceHash, renders);
+	if current:
+		print("!! %s is already up to date" % (fileN));
+	return (sourceHash, current);
 
 ##################################
 
-# create a graph for the specified file
-def convertSchema (fileN):
+# load the model from the specified file
+#	restricted: only allow the dbcs mini-language in the file (see dbcsLoader.readDBCS)
+#	profiler: dbcsProfile.Profiler to record the time taken for each phase in
+# < returns: the model loaded from the file (or None if it couldn't be loaded)
+def loadSchema (fileN, restricted=False, profiler=None):
+	profiler = profiler or dbcsProfile.NULL_PROFILER;
 	print("$ Loading schema description...")
 	
 	# make sure filename is of the form *.dbcs
@@ -217,42 +549,297 @@ def convertSchema (fileN):
 	fileN = dbcsLoader.changeExtension(fileN, "dbcs");
 	
 	# get the model used by the file
-	model = dbcsLoader.readDBCS(fileN);
+	profiler.begin("load");
+	model = dbcsLoader.readDBCS(fileN, restricted);
+	profiler.end("load");
 	if model is None:
-		return False;
+		return None;
+	
+	profiler.count("model.entities", len(model.entities));
+	profiler.count("model.relationships", len(model.relationships));
+	return model;
+
+# create a graph for the specified file
+#	restricted: only allow the dbcs mini-language in the file (see dbcsLoader.readDBCS)
+#	incremental: don't rewrite the .dot file if it is already up to date, and don't even load the file
+#				 if it hasn't changed since the .dot file (and the given diagrams) were made from it
+#	renders: list of (engine, format) for the diagrams which get rendered from the graph (for 'incremental')
+#	profiler: dbcsProfile.Profiler to record the time taken for each phase in
+# < returns: the model loaded from the file (or None if it couldn't be loaded, or everything was up to date)
+def convertSchema (fileN, restricted=False, incremental=False, profiler=None, renders=[]):
+	sourceHash = None;
+	if incremental:
+		sourceHash, current = checkSchemaSource(fileN, renders);
+		if current:
+			return None;
+	
+	model = loadSchema(fileN, restricted, profiler);
+	if model is None:
+		return None;
+	
+	writeSchemaGraph(fileN, model, incremental, profiler, sourceHash);
+	return model;
+
+# write the .dot graph for the model loaded from the given file
+#	incremental: don't rewrite the .dot file if it is already up to date
+#	sourceHash: hash of the .dbcs file at the time the model was loaded (for 'incremental', defaults to its current hash)
+# < returns: False if the file was already up to date
+def writeSchemaGraph (fileN, model, incremental=False, profiler=None, sourceHash=None):
+	profiler = profiler or dbcsProfile.NULL_PROFILER;
+	
+	# make sure filename is of the form *.dbcs
+	fileN = dbcsLoader.changeExtension(fileN, "dbcs");
 	
 	print("$ Writing graphviz (.dot) version...")
 	# get filename for graph representation
 	fileG = dbcsLoader.changeExtension(fileN, "dot");
 	
 	# create a graph file for this
-	createGraph(fileG, model);
+	profiler.begin("dot");
+	if incremental:
+		# only write the file if its contents have changed
+		if sourceHash is None:
+			sourceHash = dbcsBuild.hashFile(fileN);
+		if not updateGraphFile(fileN, emitGraph(model), profiler, sourceHash):
+			profiler.end("dot");
+			print("!! Already up to date");
+			return False;
+	else:
+		createGraph(fileG, model, profiler);
+	profiler.end("dot");
 	print("!! Done... :)");
 	
 	return True;
+
+# split the model loaded from the given file into parts, and write a .dot graph for each (plus an overview)
+# NOTE: each part is treated as if it came from its own file (i.e. "schema.dbcs" gives "schema.<key>.dot"),
+#		so that these can be rendered/updated just like normal ones
+#	mode, areas, minSize: how to split up the model (see dbcsPartition.partitionModel)
+#	linkFormat: format of the diagrams that stubs/parts in the overview link to (i.e. "svg")
+#	incremental: don't rewrite the .dot files which are already up to date
+# < returns: names of the 'files' for each part (with the overview first)
+def convertPartitions (fileN, model, mode, areas=None, minSize=2, linkFormat="svg", incremental=False, profiler=None):
+	profiler = profiler or dbcsProfile.NULL_PROFILER;
+	fileN = dbcsLoader.changeExtension(fileN, "dbcs");
 	
-# run GraphViz on this if required
-def run_graphviz(gv_engine, format, fileN):
-	print("$ Running GraphViz (%s) to produce diagram..." % gv_engine)
+	profiler.begin("partition");
+	partitions = dbcsPartition.partitionModel(model, mode, areas, minSize);
+	profiler.end("partition");
+	profiler.count("partitions", len(partitions));
+	
+	print("$ Writing graphviz (.dot) versions of %d parts..." % len(partitions))
+	
+	# 'files' for each part
+	def getPartFile (key):
+		return dbcsLoader.changeExtension(fileN, key + ".dbcs");
+	def getURL (part):
+		return os.path.basename(dbcsLoader.changeExtension(getPartFile(part.key), linkFormat));
+	
+	partOf = dbcsPartition.getEntityPartitions(partitions);
+	def getStub (entity):
+		part = partOf.get(entity);
+		if part is None:
+			return ("not in model", None);
+		return ("see %s" % (part.name), getURL(part));
+	
+	graphs = [(getPartFile("overview"), emitOverviewGraph(model, partitions, getURL))];
+	for part in partitions:
+		graphs.append((getPartFile(part.key), emitPartialGraph(model, part, getStub)));
+	
+	profiler.begin("dot");
+	written = 0;
+	for partFileN, chunks in graphs:
+		if writePartGraph(partFileN, chunks, incremental, profiler):
+			written += 1;
+	profiler.end("dot");
+	print("!! Done (%d of %d files written)... :)" % (written, len(graphs)));
+	
+	return [partFileN for partFileN, chunks in graphs];
+
+# convert the model loaded from the given file into a .dot graph of just the part around the given entity
+# NOTE: like the parts of partitioned models, this is treated as if it came from its own file
+#		(i.e. "schema.dbcs" gives "schema.focus_<entity>_<depth>.dot")
+#	entityName, depth: entity to draw the neighbourhood of, and how many links to follow from it
+#	incremental: don't rewrite the .dot file if it is already up to date
+# < returns: name of the 'file' for the neighbourhood
+def convertFocus (fileN, model, entityName, depth=1, incremental=False, profiler=None):
+	profiler = profiler or dbcsProfile.NULL_PROFILER;
+	fileN = dbcsLoader.changeExtension(fileN, "dbcs");
 	
+	profiler.begin("focus");
+	part = dbcsPartition.getNeighbourhood(model, entityName, depth);
+	profiler.end("focus");
+	profiler.count("focus.entities", len(part.entities));
+	profiler.count("focus.relationships", len(part.relationships));
+	
+	print("$ Writing graphviz (.dot) version of the %d entities around %s..." % (len(part.entities), entityName))
+	focusFileN = dbcsLoader.changeExtension(fileN, part.key + ".dbcs");
+	
+	# entities just past the edge of the neighbourhood are only linked to by specialisations
+	def getStub (entity):
+		return ("more than %d links away" % (depth), None);
+	
+	profiler.begin("dot");
+	if writePartGraph(focusFileN, emitPartialGraph(model, part, getStub), incremental, profiler):
+		print("!! Done... :)");
+	else:
+		print("!! Already up to date");
+	profiler.end("dot");
+	
+	return focusFileN;
+
+# helper for writing the .dot graph for a part of a model
+#	partFileN: 'file' for the part
+# < returns: False if the file was already up to date
+def writePartGraph (partFileN, chunks, incremental=False, profiler=None):
+	if incremental:
+		return updateGraphFile(partFileN, chunks, profiler);
+	
+	writeGraphFile(dbcsLoader.changeExtension(partFileN, "dot"), chunks, profiler);
+	return True;
+	
+# render a diagram of the model using the built-in layout engine
+def renderBuiltin (model, format, fileP):
+	if format not in BUILTIN_FORMATS:
+		raise ValueError, "The %s engine can only produce %s diagrams" % (BUILTIN_ENGINE, "/".join(BUILTIN_FORMATS))
+	
+	dbcsLayout.renderSVG(model, fileP);
+
+# get the render job for producing a diagram of the given file
+#	model: the model loaded from the file (only needed by the built-in engine)
+def makeRenderJob (gv_engine, format, fileN, timeout=None, model=None):
 	# get filename for graph representation
 	fileG = dbcsLoader.changeExtension(fileN, "dot");
 	# get filename for output image
 	fileP = dbcsLoader.changeExtension(fileN, format);
 	
+	# the built-in engine works on the model directly, instead of the .dot file
+	if gv_engine == BUILTIN_ENGINE:
+		return dbcsRender.FunctionJob(gv_engine, format, fileP, lambda: renderBuiltin(model, format, fileP));
+	
+	return dbcsRender.RenderJob(gv_engine, format, fileG, fileP, timeout);
+	
+# queue up GraphViz renders of the given file (one for each format)
+#	incremental: skip renders whose outputs are already up to date
+def queueRenders (scheduler, gv_engine, formats, fileN, timeout=None, model=None, incremental=False):
+	print("$ Queueing GraphViz (%s) renders to produce %s diagrams..." % (gv_engine, "/".join(formats)))
+	
+	if incremental:
+		# outputs are up to date if they were rendered from the current .dot file, with the same engine and format
+		manifest = dbcsBuild.BuildManifest(fileN);
+		dotHash = dbcsBuild.hashFile(dbcsLoader.changeExtension(fileN, "dot"));
+	
+	for format in formats:
+		job = makeRenderJob(gv_engine, format, fileN, timeout, model);
+		
+		if incremental:
+			key = dbcsBuild.getRenderKey(gv_engine, format);
+			if manifest.isCurrent(key, dotHash, job.fileP):
+				print("!! %s is already up to date" % (job.fileP));
+				continue;
+			
+			# record the render in the manifest once it has succeeded
+			def recordRender (job, key=key):
+				if job.succeeded():
+					manifest.record(key, dotHash);
+			scheduler.submit(job, recordRender);
+		else:
+			scheduler.submit(job);
+	
+# run GraphViz on this if required (waiting for it to finish)
+#	incremental: skip the render if its output is already up to date
+def run_graphviz(gv_engine, format, fileN, timeout=None, model=None, incremental=False):
+	print("$ Running GraphViz (%s) to produce diagram..." % gv_engine)
+	
 	# run graphviz (specifically the 'neato' module), to produce a png of this...
-	status = os.system("%s -T%s %s > %s" % (gv_engine, format, fileG, fileP));
+	job = makeRenderJob(gv_engine, format, fileN, timeout, model);
 	
-	if status:
-		print("!! Failed with %d! :( " % status)
-	else:
+	if incremental:
+		# up to date if it was rendered from the current .dot file, with the same engine and format (as for queueRenders)
+		manifest = dbcsBuild.BuildManifest(fileN);
+		dotHash = dbcsBuild.hashFile(dbcsLoader.changeExtension(fileN, "dot"));
+		key = dbcsBuild.getRenderKey(gv_engine, format);
+		if manifest.isCurrent(key, dotHash, job.fileP):
+			print("!! Already up to date");
+			return True;
+	
+	scheduler = dbcsRender.RenderScheduler(1, verbose=False);
+	scheduler.submit(job);
+	scheduler.wait();
+	
+	if job.succeeded():
 		print("!! Done... :)");
+		if incremental:
+			manifest.record(key, dotHash);
+	else:
+		print("!! %s! :( " % job.error)
+	
+	return job.succeeded();
+
+# write the .dot graph(s) for the model loaded from the given file
+#	focus: (entity name, depth) to only draw the part of the model around an entity (see convertFocus)
+#	partitioning: (mode, areas, min size, link format) to draw the model in parts (see convertPartitions)
+#	sourceHash: hash of the .dbcs file at the time the model was loaded (see writeSchemaGraph)
+# < returns: names of the 'files' to render diagrams of (see queueRenders)
+def writeGraphs (fileN, model, incremental=False, focus=None, partitioning=None, profiler=None, sourceHash=None):
+	# the whole model doesn't get written out when only part of it is being drawn
+	if focus:
+		entityName, depth = focus;
+		try:
+			return [convertFocus(fileN, model, entityName, depth, incremental, profiler)];
+		except ValueError, e:
+			sys.stderr.write("ERROR: couldn't draw the part of %s around %s (%s)\n" % (fileN, entityName, e));
+			return [];
+	
+	writeSchemaGraph(fileN, model, incremental, profiler, sourceHash);
+	
+	if partitioning:
+		mode, areas, minSize, linkFormat = partitioning;
+		try:
+			return convertPartitions(fileN, model, mode, areas, minSize, linkFormat, incremental, profiler);
+		except ValueError, e:
+			sys.stderr.write("ERROR: couldn't split up %s (%s)\n" % (fileN, e));
+			return [];
+	
+	return [fileN];
+
+# write the .dot graph(s) for the model loaded from the given file, and queue up renders of them
+#	focus, partitioning: which parts of the model to draw (see writeGraphs)
+#	sourceHash: hash of the .dbcs file at the time the model was loaded (see writeSchemaGraph)
+def queueGraphRenders (scheduler, gv_engine, formats, fileN, model, timeout=None, incremental=False,
+					   focus=None, partitioning=None, profiler=None, sourceHash=None):
+	for graphFileN in writeGraphs(fileN, model, incremental, focus, partitioning, profiler, sourceHash):
+		# NOTE: the model is only used by the built-in engine, which can only draw whole models
+		queueRenders(scheduler, gv_engine, formats, graphFileN, timeout, model, incremental);
+
+# convert the given file, and queue up renders of the diagrams for it
+#	incremental: skip outputs which are already up to date (without even loading the file if it hasn't changed)
+#	focus, partitioning: which parts of the model to draw (see writeGraphs)
+# < returns: the model loaded from the file (or None if it couldn't be loaded, or everything was up to date)
+def processFile (scheduler, gv_engine, formats, fileN, restricted=False, timeout=None, incremental=False,
+				 focus=None, partitioning=None, profiler=None):
+	sourceHash = None;
+	if incremental:
+		renders = [(gv_engine, format) for format in formats];
+		sourceHash, current = checkSchemaSource(fileN, renders, not (focus or partitioning));
+		if current:
+			return None;
+	
+	model = loadSchema(fileN, restricted, profiler);
+	if model:
+		queueGraphRenders(scheduler, gv_engine, formats, fileN, model, timeout, incremental, focus, partitioning,
+						  profiler, sourceHash);
+	return model;
 	
 ##################################
 
+# built-in layout engine (see dbcsLayout), for use when GraphViz isn't available
+BUILTIN_ENGINE = "builtin";
+BUILTIN_FORMATS = ["svg"];
+
 # graphviz engines 
 # TODO: no engine = skip?
-gv_engines = ["neato", "fdp", "sfdp", "dot"];
+gv_engines = ["neato", "fdp", "sfdp", "dot", BUILTIN_ENGINE];
 
 # output formats
 # TODO: what about other formats?
@@ -260,6 +847,95 @@ formats = ["png", "svg"];
 
 # -----------
 
+# Add the options for what to draw and how to render it to a commandline option parser
+# NOTE: these are shared with the other tools which draw diagrams (i.e. dbcs.py)
+def addRenderOptions (parser):
+	parser.add_option("-e", "--engine", dest="gv_engine", 
+			default="neato", type="string",
+			help="Name of GraphViz engine to render the file with (out of %s)" % gv_engines)
+	parser.add_option("-f", "--format", dest="format", 
+			default=None, type="string",
+			help="Name of output file format(s) to render to, separated by commas (out of %s, defaulting to %s, or %s for the %s engine)" % (formats, formats[0], BUILTIN_FORMATS[0], BUILTIN_ENGINE))
+	parser.add_option("-t", "--timeout", dest="timeout",
+			default=None, type="float",
+			help="Max time (in seconds) to let each GraphViz render run for")
+	parser.add_option("-p", "--partition", dest="partition",
+			default=None, type="choice", choices=dbcsPartition.partitionModes,
+			help="Split each model into parts which get drawn separately (with an overview linking them together), by %s" % dbcsPartition.partitionModes)
+	parser.add_option("--areas", dest="areas",
+			default=None, type="string",
+			help="File giving the subject areas to split models into (for '-p areas'), with lines like 'Sales: CUSTOMER, ORDER'")
+	parser.add_option("--min-part-size", dest="minPartSize",
+			default=2, type="int",
+			help="Parts with fewer entities than this get put together (for '-p components' and '-p hierarchies')")
+	parser.add_option("--focus", dest="focus",
+			default=None, type="string",
+			help="Only draw the part of each model around the given entity (see --depth)")
+	parser.add_option("--depth", dest="depth",
+			default=1, type="int",
+			help="Number of links (through relationships and specialisations) to follow from the --focus entity")
+
+# Get the settings for drawing/rendering diagrams from the parsed commandline options (see addRenderOptions)
+# < returns: (GraphViz engine, list of output formats, focus, partitioning), as for processFile()
+def getRenderSettings (parser, options):
+	# graphviz engine to use
+	if (options.gv_engine) and (options.gv_engine in gv_engines):
+		gv_engine = options.gv_engine;
+	else:
+		gv_engine = gv_engines[0]; # default to 'neato' again
+	# output formats
+	out_formats = [];
+	for format in (options.format or "").split(","):
+		if (format in formats) and (format not in out_formats):
+			out_formats.append(format);
+	if gv_engine == BUILTIN_ENGINE:
+		if len(out_formats) == 0:
+			out_formats = BUILTIN_FORMATS[:1]; # can't do 'png'
+		for format in out_formats:
+			if format not in BUILTIN_FORMATS:
+				parser.error("the %s engine can only produce %s diagrams" % (BUILTIN_ENGINE, "/".join(BUILTIN_FORMATS)));
+	elif len(out_formats) == 0:
+		out_formats = formats[:1]; # default to 'png' again
+	
+	# partitioning
+	partitioning = None;
+	if options.partition:
+		if gv_engine == BUILTIN_ENGINE:
+			parser.error("the %s engine can't draw partitioned models" % BUILTIN_ENGINE);
+		
+		areas = None;
+		if options.partition == "areas":
+			if not options.areas:
+				parser.error("a subject areas file (--areas) is needed for '-p areas'");
+			try:
+				areas = dbcsPartition.readAreas(options.areas);
+			except (IOError, ValueError), e:
+				parser.error("couldn't read subject areas file (%s)" % e);
+		
+		# stubs and the overview link to the svg versions of the diagrams if there are any
+		if "svg" in out_formats:
+			linkFormat = "svg";
+		else:
+			linkFormat = out_formats[0];
+		
+		partitioning = (options.partition, areas, options.minPartSize, linkFormat);
+	
+	# focusing on one entity
+	focus = None;
+	if options.focus:
+		if partitioning:
+			parser.error("--focus and --partition can't be used together");
+		if gv_engine == BUILTIN_ENGINE:
+			parser.error("the %s engine can only draw whole models" % BUILTIN_ENGINE);
+		if options.depth < 0:
+			parser.error("--depth can't be negative");
+		
+		focus = (options.focus, options.depth);
+	
+	return (gv_engine, out_formats, focus, partitioning);
+
+# -----------
+
 def main ():
 	# always print version info first...
 	# TODO: we should have a way to supress this for super-scripts...
@@ -267,42 +943,78 @@ def main ():
 	print("Copyright 2010, Joshua Leung (aligorith@gmail.com)\n");
 	
 	# set up option parser for managing the commandline args
-	usage = "usage: %prog [-e enginename] [-f format] [file1 [file2 [...]]]";
+	usage = "usage: %prog [-e enginename] [-f format[,format...]] [-j jobs] [-t timeout] [-i] [-s] [-w] [-p mode [--areas file] | --focus entity [--depth k]] [--compact] [--snapshots] [--profile] [file1 [file2 [...]]]";
 	parser = OptionParser(usage);
-	parser.add_option("-e", "--engine", dest="gv_engine", 
-			default="neato", type="string",
-			help="Name of GraphViz engine to render the file with (out of %s)" % gv_engines)
-	parser.add_option("-f", "--format", dest="format", 
-			default="png", type="string",
-			help="Name of output file format to render to (out of %s)" % formats)
+	parser.add_option("-j", "--jobs", dest="jobs",
+			default=0, type="int",
+			help="Max number of GraphViz renders to run at once (defaults to the number of CPU's)")
+	parser.add_option("-i", "--incremental", dest="incremental",
+			default=False, action="store_true",
+			help="Skip writing .dot files and rendering diagrams which are already up to date")
+	parser.add_option("-s", "--safe", dest="restricted",
+			default=False, action="store_true",
+			help="Only allow the dbcs mini-language in files, instead of running them as Python scripts (for untrusted files)")
+	parser.add_option("-w", "--watch", dest="watch",
+			default=False, action="store_true",
+			help="Keep watching the given files/directories (or the current directory), and convert them again when they change")
+	parser.add_option("--compact", dest="compact",
+			default=False, action="store_true",
+			help="Load models in a compact form (taking much less memory), for very large schemas")
+	parser.add_option("--snapshots", dest="snapshots",
+			default=False, action="store_true",
+			help="Save loaded models next to the files (as .dbcsm files), to load them faster while they're unchanged (mostly worthwhile along with --compact)")
+	addRenderOptions(parser);
+	dbcsProfile.addProfileOptions(parser);
 	
 	# parse commandline options
 	(options, args) = parser.parse_args()
 	
-	# graphviz engine to use
-	if (options.gv_engine) and (options.gv_engine in gv_engines):
-		gv_engine = options.gv_engine;
-	else:
-		gv_engine = gv_engines[0]; # default to 'neato' again
-	# output format
-	if (options.format) and (options.format in formats):
-		format = options.format;
-	else:
-		format = formats[0]; # default to 'png' again
+	# load models in compact form
+	dbcsLoader.USE_COMPACT_MODELS = options.compact;
+	# save snapshots of loaded models
+	dbcsLoader.USE_MODEL_SNAPSHOTS = options.snapshots;
+	
+	gv_engine, out_formats, focus, partitioning = getRenderSettings(parser, options);
 	
 	# parse filename arguments
-	if len(args) >= 1:
-		# argv[0] = scriptname...
-		for fileN in sys.argv[1:]:
+	if options.watch:
+		# reconvert files as they change
+		# NOTE: only the changed outputs get rewritten/rendered again
+		def process (fileN):
+			print("$ Processing file ===> %s ..." % fileN);
+			profiler = dbcsProfile.makeProfiler(options.profile);
+			
+			scheduler = dbcsRender.RenderScheduler(options.jobs, profiler=profiler);
+			processFile(scheduler, gv_engine, out_formats, fileN, options.restricted, options.timeout, True,
+						focus, partitioning, profiler);
+			
+			scheduler.wait();
+			scheduler.printSummary();
+			profiler.report(format=options.profileFormat);
+			print("");
+		
+		dbcsWatch.Watcher(dbcsWatch.getWatchPaths(args), process).run();
+	elif len(args) >= 1:
+		# renders run in the background, while the later files get converted
+		profiler = dbcsProfile.makeProfiler(options.profile);
+		scheduler = dbcsRender.RenderScheduler(options.jobs, profiler=profiler);
+		
+		# NOTE: options have already been stripped from these
+		for fileN in args:
 			# print info on file we're handling
 			print("$ Processing file ===> %s ..." % fileN);
 			
 			# convert the file, then run graphviz on it 
-			if convertSchema(fileN):
-				run_graphviz(gv_engine, format, fileN);
+			processFile(scheduler, gv_engine, out_formats, fileN, options.restricted, options.timeout, options.incremental,
+						focus, partitioning, profiler);
 			
 			# insert linebreak before next file for clarity
 			print("\n"); 
+		
+		# wait for the renders to finish
+		scheduler.wait();
+		scheduler.printSummary();
+		profiler.report(format=options.profileFormat);
 	else:
 		# keep looping while user keeps supplying valid filenames 
 		while True:
@@ -314,8 +1026,18 @@ def main ():
 				break;
 			
 			# try to process file
-			if convertSchema(fileN):
-				run_graphviz(gv_engine, format, fileN);
+			if focus or partitioning:
+				scheduler = dbcsRender.RenderScheduler(options.jobs);
+				processFile(scheduler, gv_engine, out_formats, fileN, options.restricted, options.timeout,
+							focus=focus, partitioning=partitioning);
+				scheduler.wait();
+				scheduler.printSummary();
+			else:
+				renders = [(gv_engine, format) for format in out_formats];
+				model = convertSchema(fileN, options.restricted, options.incremental, renders=renders);
+				if model:
+					for format in out_formats:
+						run_graphviz(gv_engine, format, fileN, options.timeout, model, options.incremental);
 		
 if __name__ == '__main__':
 	main();
@@ -0,0 +1,330 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Benchmarks for timing the various stages of processing dbcs files
+
+import sys
+import os
+import time
+import json
+import shutil
+import platform
+import tempfile
+
+from optparse import OptionParser
+
+import dbcsLoader
+import dbcsValidate
+import dbcsReport
+import dbcs2Graph
+import dbcsLayout
+import dbcsGenerate
+
+##################################
+# TIMING UTILITIES
+
+# time how long it takes to call the given function
+#	fn: function to call (without any args)
+#	repeats: number of times to call it
+# < returns: (best, mean) time in seconds
+def timeCalls (fn, repeats):
+	times = [];
+	for i in xrange(repeats):
+		start = time.time();
+		fn();
+		times.append(time.time() - start);
+
+	return (min(times), sum(times) / len(times));
+
+##################################
+# LOADER BENCHMARKS
+
+# ways of loading files to compare
+#	(name, restricted, use bytecode cache, use model snapshots)
+LOADER_MODES = [
+	("exec",              False, False, False, False),
+	("exec+bytecode",     False, True,  False, False),
+	("exec+snapshot",     False, True,  True,  False),
+	("restricted (ast)",  True,  False, False, False),
+	("compact",           False, True,  False, True),
+	("compact+snapshot",  False, True,  True,  True),
+]
+
+# time loading the given file in each of the ways possible
+# < returns: list of (mode name, best, mean) tuples
+def benchLoaders (fileN, repeats):
+	results = [];
+
+	# save the cache settings so that they can be restored afterwards
+	oldSettings = (dbcsLoader.USE_BYTECODE_CACHE, dbcsLoader.USE_MODEL_SNAPSHOTS, dbcsLoader.USE_COMPACT_MODELS);
+
+	try:
+		for name, restricted, bytecode, snapshot, compact in LOADER_MODES:
+			dbcsLoader.USE_BYTECODE_CACHE = bytecode;
+			dbcsLoader.USE_MODEL_SNAPSHOTS = snapshot;
+			dbcsLoader.USE_COMPACT_MODELS = compact;
+
+			load = lambda: dbcsLoader.readDBCS(fileN, restricted);
+
+			# warm up first (i.e. so that the caches are filled)
+			if load() is None:
+				return None;
+
+			best, mean = timeCalls(load, repeats);
+			results.append((name, best, mean));
+	finally:
+		dbcsLoader.USE_BYTECODE_CACHE, dbcsLoader.USE_MODEL_SNAPSHOTS, dbcsLoader.USE_COMPACT_MODELS = oldSettings;
+
+	return results;
+
+##################################
+# STAGE BENCHMARKS
+
+# helper - load the model from the file, without using any of the caches
+def _load_uncached (fileN):
+	oldSettings = (dbcsLoader.USE_BYTECODE_CACHE, dbcsLoader.USE_MODEL_SNAPSHOTS);
+	dbcsLoader.USE_BYTECODE_CACHE = dbcsLoader.USE_MODEL_SNAPSHOTS = False;
+	try:
+		return dbcsLoader.readDBCS(fileN);
+	finally:
+		dbcsLoader.USE_BYTECODE_CACHE, dbcsLoader.USE_MODEL_SNAPSHOTS = oldSettings;
+
+# helper - validate the model, without printing (or caching) anything
+def _validate (model):
+	return dbcsValidate.validateModel(model, dbcsValidate.BASIC_TESTS, dbcsReport.Reporter());
+
+# helper - validate the model using the results cached for the file (see dbcsValidate.ResultCache)
+def _validate_cached (fileN, model):
+	cache = dbcsValidate.ResultCache(fileN, model);
+	return dbcsValidate.validateModel(model, dbcsValidate.BASIC_TESTS, dbcsReport.Reporter(), cache);
+
+# stages of the pipeline that can be timed
+#	(name, function (fileN, model) to time)
+STAGES = [
+	("load",     lambda fileN, model: _load_uncached(fileN)),
+	("validate", lambda fileN, model: _validate(model)),
+	("validate+cache", lambda fileN, model: _validate_cached(fileN, model)),
+	("dot",      lambda fileN, model: dbcs2Graph.getGraphText(model)),
+	("layout",   lambda fileN, model: dbcsLayout.getSVGText(model)),
+]
+
+# names of the stages that get timed by default
+# NOTE: the built-in layout is left out, since it takes a long time for big files
+DEFAULT_STAGES = ["load", "validate", "validate+cache", "dot"];
+
+# time each stage of the pipeline for the given file
+#	stages: names of the stages to time
+# < returns: (info, list of (stage name, best, mean) tuples), or None if the file couldn't be loaded
+def benchStages (fileN, stages, repeats):
+	# the model that the later stages work on
+	model = _load_uncached(fileN);
+	if model is None:
+		return None;
+
+	info = {'entities': len(model.entities), 'relationships': len(model.relationships)};
+	results = [];
+
+	for name, fn in STAGES:
+		if name in stages:
+			# warm up first (i.e. so that the caches are filled)
+			fn(fileN, model);
+
+			best, mean = timeCalls(lambda: fn(fileN, model), repeats);
+			results.append((name, best, mean));
+
+	return (info, results);
+
+# stages must also be at least this much slower (in seconds) to count as regressions
+# NOTE: the timings of the quickest stages are mostly noise, so percentages alone aren't enough
+MIN_REGRESSION = 0.001;
+
+# print table of stage timings, compared with the timings from a previous run
+#	baseline: dict of stage name -> {'best': ..., 'mean': ...} from previous results (or None)
+#	threshold: fractional slowdown which counts as a regression
+# < returns: number of stages which have regressed
+def printStageResults (results, baseline=None, threshold=0.1):
+	regressions = 0;
+
+	print("   %-20s %12s %12s %12s" % ("Stage", "Best (ms)", "Mean (ms)", "Change"));
+	for name, best, mean in results:
+		change = "";
+		if baseline and (name in baseline) and baseline[name]['best']:
+			ratio = best / baseline[name]['best'] - 1.0;
+			change = "%+7.1f%%" % (ratio * 100.0);
+
+			if (ratio > threshold) and (best - baseline[name]['best'] > MIN_REGRESSION):
+				change += " !!";
+				regressions += 1;
+
+		print("   %-20s %12.3f %12.3f %12s" % (name, best * 1000.0, mean * 1000.0, change));
+
+	return regressions;
+
+##################################
+# RESULTS FILES
+
+# version of the results file format
+RESULTS_VERSION = 1;
+
+# build the data for a results file
+#	fileResults: list of (key, info, stage results) for each file benchmarked
+def makeResultsData (fileResults, repeats):
+	files = {};
+	for key, info, results in fileResults:
+		stages = {};
+		for name, best, mean in results:
+			stages[name] = {'best': best, 'mean': mean};
+		files[key] = {'info': info, 'stages': stages};
+
+	return {
+		'version': RESULTS_VERSION,
+		'time': time.strftime("%Y-%m-%d %H:%M:%S"),
+		'python': platform.python_version(),
+		'platform': platform.platform(),
+		'repeats': repeats,
+		'files': files,
+	};
+
+# write results to a file
+def saveResults (fileN, data):
+	f = open(fileN, 'w');
+	try:
+		json.dump(data, f, indent=1, sort_keys=True);
+	finally:
+		f.close();
+
+# read results from a file
+# < returns: data from file, or None if it isn't a valid results file
+def loadResults (fileN):
+	try:
+		f = open(fileN, 'r');
+		try:
+			data = json.load(f);
+		finally:
+			f.close();
+	except (IOError, ValueError), e:
+		sys.stderr.write("ERROR: couldn't read results file %s (%s)\n" % (fileN, e));
+		return None;
+
+	if (not isinstance(data, dict)) or (data.get('version') != RESULTS_VERSION):
+		sys.stderr.write("ERROR: %s isn't a (compatible) results file\n" % fileN);
+		return None;
+	return data;
+
+# print table of benchmark results
+def printResults (results):
+	# use the first one as the baseline for comparisons
+	baseline = results[0][1];
+
+	print("   %-20s %12s %12s %8s" % ("Mode", "Best (ms)", "Mean (ms)", "Speedup"));
+	for name, best, mean in results:
+		if best:
+			speedup = "%7.2fx" % (baseline / best);
+		else:
+			speedup = "-";
+		print("   %-20s %12.3f %12.3f %8s" % (name, best * 1000.0, mean * 1000.0, speedup));
+
+##################################
+
+def main ():
+	# always print version info first...
+	print("DataBase Conceptual Schema (EER) Benchmarks");
+	print("Copyright 2010, Joshua Leung (aligorith@gmail.com)\n");
+
+	# set up option parser for managing the commandline args
+	usage = "usage: %prog [-n repeats] [-s stage[,stage...]] [-g size[,size...]] [-o results] [-c baseline] [-l] [file1 [file2 [...]]]";
+	parser = OptionParser(usage);
+	parser.add_option("-n", "--repeats", dest="repeats",
+			default=10, type="int",
+			help="Number of times to repeat each measurement")
+	parser.add_option("-s", "--stages", dest="stages",
+			default=",".join(DEFAULT_STAGES), type="string",
+			help="Stages of the pipeline to time, separated by commas (out of %s)" % [name for name, fn in STAGES])
+	parser.add_option("-g", "--generate", dest="generate",
+			default=None, type="string",
+			help="Also benchmark generated schemas with the given numbers of entities, separated by commas (i.e. 100,1000,10000)")
+	parser.add_option("-o", "--output", dest="output",
+			default=None, type="string",
+			help="File to save the results to (as JSON)")
+	parser.add_option("-c", "--compare", dest="compare",
+			default=None, type="string",
+			help="Results file from a previous run to compare against")
+	parser.add_option("-t", "--threshold", dest="threshold",
+			default=10.0, type="float",
+			help="Percentage slowdown (compared with the previous run) which counts as a regression")
+	parser.add_option("-l", "--loaders", dest="loaders",
+			default=False, action="store_true",
+			help="Also compare the different ways of loading each file")
+
+	# parse commandline options
+	(options, args) = parser.parse_args()
+	repeats = max(1, options.repeats);
+	stages = [name for name in options.stages.split(",") if name];
+
+	# files to benchmark: (key for results, filename)
+	# NOTE: the keys for generated files only depend on the parameters, so that they can be compared between runs
+	files = [(os.path.basename(fileN), fileN) for fileN in args];
+
+	tempDir = None;
+	if options.generate:
+		tempDir = tempfile.mkdtemp(prefix="dbcsbench");
+		for size in options.generate.split(","):
+			params = dbcsGenerate.SchemaParams(int(size));
+			fileN = os.path.join(tempDir, params.getName() + ".dbcs");
+			dbcsGenerate.generateFile(fileN, params);
+			files.append((params.getName(), fileN));
+
+	if len(files) == 0:
+		parser.error("no files to benchmark");
+
+	# results to compare against
+	baseline = None;
+	if options.compare:
+		baseline = loadResults(options.compare);
+		if baseline is None:
+			sys.exit(1);
+
+	# benchmark each file
+	try:
+		fileResults = [];
+		regressions = 0;
+
+		for key, fileN in files:
+			print("$ Benchmarking file ===> %s (%d runs) ..." % (key, repeats));
+
+			if options.loaders:
+				results = benchLoaders(fileN, repeats);
+				if results:
+					printResults(results);
+					print("");
+
+			bench = benchStages(fileN, stages, repeats);
+			if bench:
+				info, results = bench;
+				print("   (%d entities, %d relationships)" % (info['entities'], info['relationships']));
+
+				if baseline:
+					fileBaseline = baseline['files'].get(key, {}).get('stages');
+				else:
+					fileBaseline = None;
+				regressions += printStageResults(results, fileBaseline, options.threshold / 100.0);
+
+				fileResults.append((key, info, results));
+
+			print("");
+	finally:
+		if tempDir:
+			shutil.rmtree(tempDir, True);
+
+	# save the results for comparing against later
+	if options.output:
+		saveResults(options.output, makeResultsData(fileResults, repeats));
+		print("$ Saved results to %s" % (options.output));
+
+	if baseline:
+		print("$ %d stage(s) were more than %g%% slower than in %s" % (regressions, options.threshold, options.compare));
+		if regressions:
+			sys.exit(1);
+
+if __name__ == '__main__':
+	main();
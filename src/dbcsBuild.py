@@ -0,0 +1,75 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Build manifests for incremental builds, recording hashes of the inputs
+# that each generated file (.dot files and rendered diagrams) was made from,
+# so that files which are already up to date can be skipped.
+
+import os
+import json
+import hashlib
+
+import dbcsLoader
+
+###############################
+# HASHING
+
+# get the hash of the given text
+def hashText (text):
+	return hashlib.sha1(text).hexdigest();
+
+# get the hash of the contents of the given file (or None if it can't be read)
+def hashFile (fileN):
+	data = dbcsLoader.readCacheFile(fileN);
+	if data is None:
+		return None;
+	return hashText(data);
+
+###############################
+# MANIFEST
+
+# Record of the inputs used to generate the outputs of a .dbcs file
+# NOTE: manifests are stored in the __pycache__ folder alongside the file
+class BuildManifest:
+	__slots__ = [
+		'manifestN',	# name of the file the manifest is stored in
+		'entries',		# output key -> hash of the input it was generated from
+	]
+
+	# Constructor - load the manifest for the given .dbcs file
+	def __init__ (self, fileN):
+		self.manifestN = dbcsLoader.getCacheFilename(os.path.abspath(fileN), "dbcsbuild");
+		self.entries = {};
+
+		# load the existing manifest (if there is one that can be read)
+		data = dbcsLoader.readCacheFile(self.manifestN);
+		if data:
+			try:
+				entries = json.loads(data);
+			except ValueError:
+				entries = None; # corrupted, so just start again
+			if isinstance(entries, dict):
+				self.entries = entries;
+
+	# is the given output up to date?
+	#	key: identifier for the output (i.e. "dot", or "render:neato:png")
+	#	inputHash: hash of the input that the output would be generated from now
+	#	outFile: name of the generated file (which must exist)
+	def isCurrent (self, key, inputHash, outFile):
+		return (self.entries.get(key) == inputHash) and os.path.exists(outFile);
+
+	# record that the given output has been generated from the input with the given hash
+	def record (self, key, inputHash):
+		self.entries[key] = inputHash;
+		self.save();
+
+	# write the manifest to disk
+	def save (self):
+		dbcsLoader.writeCacheFile(self.manifestN, json.dumps(self.entries, sort_keys=True));
+
+# manifest key for the hash of the .dbcs file that the current .dot file was written from
+SOURCE_KEY = "source";
+
+# get the manifest key for a rendered diagram
+def getRenderKey (engine, format):
+	return "render:%s:%s" % (engine, format);
@@ -0,0 +1,233 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Thin client for the dbcs daemon (see dbcsDaemon), for validating/rendering
+# files without paying for starting up Python and loading the models again
+# each time (i.e. from editors on each save, or CI steps).
+#
+# NOTE: this only imports what it needs to talk to the daemon, so that it
+#		starts up as quickly as possible
+
+import sys
+import os
+import json
+import socket
+import tempfile
+
+from optparse import OptionParser
+
+###############################
+# CONNECTION
+
+# get the default socket that the daemon listens on
+# NOTE: each user gets their own daemon (unless DBCSD_SOCKET says otherwise)
+def getDefaultSocket ():
+	socketN = os.environ.get("DBCSD_SOCKET");
+	if socketN:
+		return socketN;
+
+	if hasattr(os, 'getuid'):
+		user = os.getuid();
+	else:
+		user = os.environ.get("USERNAME", "user");
+	return os.path.join(tempfile.gettempdir(), "dbcsd-%s.sock" % (user));
+
+# send a message (as a single line of JSON)
+def writeMessage (f, message):
+	f.write(json.dumps(message));
+	f.write("\n");
+	f.flush();
+
+# read a message (as a single line of JSON)
+# < returns: the message (or None if the connection has been closed)
+def readMessage (f):
+	line = f.readline();
+	if not line:
+		return None;
+	return json.loads(line);
+
+# Connection to the daemon
+# NOTE: the daemon only answers one request per connection, so this connects again for each one
+class Client:
+	__slots__ = [
+		'socketN',		# filename of the socket that the daemon listens on
+		'sock',			# socket connected to the daemon (or None between requests)
+		'f',			# file for reading/writing on the socket
+	]
+
+	# Constructor - connect to the daemon
+	# NOTE: this raises socket.error if the daemon isn't running
+	def __init__ (self, socketN=None):
+		self.socketN = socketN or getDefaultSocket();
+		self.sock = self.f = None;
+		self.connect();
+
+	# connect to the daemon (if not connected already)
+	def connect (self):
+		if self.sock is not None:
+			return;
+
+		sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM);
+		try:
+			sock.connect(self.socketN);
+		except:
+			sock.close();
+			raise;
+		self.sock = sock;
+		self.f = sock.makefile('r+b');
+
+	# send a request to the daemon, and wait for its response
+	#	command: name of the command (see dbcsDaemon.Daemon)
+	#	args: the command's arguments
+	# < returns: dict with the response (where 'ok' is False if the request failed)
+	def request (self, command, **args):
+		args['command'] = command;
+
+		self.connect();
+		try:
+			writeMessage(self.f, args);
+			response = readMessage(self.f);
+		finally:
+			self.close();
+
+		if response is None:
+			raise IOError, "Daemon closed the connection"
+		return response;
+
+	# disconnect from the daemon
+	def close (self):
+		if self.sock is not None:
+			self.f.close();
+			self.sock.close();
+			self.sock = self.f = None;
+
+###############################
+
+# helper - show the results of a request (returning whether it succeeded)
+def _show_response (response, options):
+	if not response.get('ok'):
+		sys.stderr.write("ERROR: %s\n" % (response.get('error')));
+		return False;
+
+	sys.stdout.write(response.get('output', ""));
+	if response.get('report'):
+		sys.stdout.write(response['report']);
+
+	if options.profile and response.get('profile'):
+		import dbcsProfile; # only needed for this
+		profiler = dbcsProfile.Profiler();
+		profiler.merge(response['profile']);
+		profiler.report(format=options.profileFormat);
+
+	return response.get('passed', True) and response.get('succeeded', True);
+
+# commands that can be sent
+commands = ["validate", "render", "forget", "stats", "ping", "stop"];
+
+def main ():
+	# set up option parser for managing the commandline args
+	usage = ("usage: %prog [-S socket] validate [-r format] [-s] file1 [file2 [...]]\n" +
+			 "       %prog [-S socket] render [-e enginename] [-f format[,format...]] [-t timeout] [-s] [-p mode [--areas file] | --focus entity [--depth k]] file1 [file2 [...]]\n" +
+			 "       %prog [-S socket] forget file1 [file2 [...]]\n" +
+			 "       %prog [-S socket] stats|ping|stop");
+	parser = OptionParser(usage);
+	parser.add_option("-S", "--socket", dest="socket",
+			default=None, type="string",
+			help="Socket that the daemon is listening on (defaults to %s)" % getDefaultSocket())
+	parser.add_option("-r", "--report", dest="report",
+			default="text", type="string",
+			help="Format of validation reports (as for dbcsValidate)")
+	parser.add_option("-s", "--safe", dest="restricted",
+			default=False, action="store_true",
+			help="Only allow the dbcs mini-language in files (for untrusted files)")
+	parser.add_option("-e", "--engine", dest="gv_engine",
+			default="neato", type="string",
+			help="Name of GraphViz engine to render files with (as for dbcs2Graph)")
+	parser.add_option("-f", "--format", dest="format",
+			default="png", type="string",
+			help="Name of output file format(s) to render to, separated by commas")
+	parser.add_option("-t", "--timeout", dest="timeout",
+			default=None, type="float",
+			help="Max time (in seconds) to let each GraphViz render run for")
+	parser.add_option("-p", "--partition", dest="partition",
+			default=None, type="string",
+			help="Split each model into parts which get drawn separately (as for dbcs2Graph)")
+	parser.add_option("--areas", dest="areas",
+			default=None, type="string",
+			help="File giving the subject areas to split models into (for '-p areas')")
+	parser.add_option("--min-part-size", dest="minPartSize",
+			default=2, type="int",
+			help="Min number of entities in each part found for '-p components' or '-p hierarchies'")
+	parser.add_option("--focus", dest="focus",
+			default=None, type="string",
+			help="Only draw the part of each model around the given entity")
+	parser.add_option("--depth", dest="depth",
+			default=1, type="int",
+			help="Number of links to follow from the --focus entity")
+	parser.add_option("--profile", dest="profile",
+			default=False, action="store_true",
+			help="Report how long the daemon took for each phase of the work (written to stderr)")
+	parser.add_option("--profile-format", dest="profileFormat",
+			default="table", type="string",
+			help="Format of the profile report (as for dbcsValidate)")
+
+	# parse commandline options
+	(options, args) = parser.parse_args()
+	if (len(args) == 0) or (args[0] not in commands):
+		parser.error("expected one of %s" % commands);
+	command = args[0];
+	fileNs = args[1:];
+
+	if (command in ("validate", "render", "forget")) and (len(fileNs) == 0):
+		parser.error("no files given to %s" % command);
+
+	try:
+		client = Client(options.socket);
+	except socket.error, e:
+		sys.stderr.write("ERROR: couldn't connect to the daemon at %s (%s). Is 'dbcsDaemon.py' running?\n" %
+				(options.socket or getDefaultSocket(), e));
+		sys.exit(2);
+
+	ok = True;
+	try:
+		# paths are sent in full, since the daemon isn't running in the same directory
+		for fileN in fileNs:
+			fileN = os.path.abspath(fileN);
+
+			if command == "validate":
+				response = client.request("validate", file=fileN, report=options.report,
+						restricted=options.restricted, profile=options.profile);
+			elif command == "render":
+				if options.areas:
+					areas = os.path.abspath(options.areas);
+				else:
+					areas = None;
+
+				if options.focus:
+					focus = [options.focus, options.depth];
+				else:
+					focus = None;
+
+				response = client.request("render", file=fileN, engine=options.gv_engine,
+						formats=options.format.split(","), timeout=options.timeout, restricted=options.restricted,
+						partition=options.partition, areas=areas, minSize=options.minPartSize, focus=focus, profile=options.profile);
+			else:
+				response = client.request(command, file=fileN, restricted=options.restricted);
+
+			if not _show_response(response, options):
+				ok = False;
+
+		# commands which aren't about files
+		if not fileNs:
+			response = client.request(command);
+			if command != "stop":
+				sys.stdout.write(json.dumps(response, indent=1, sort_keys=True) + "\n");
+			ok = response.get('ok', False);
+	finally:
+		client.close();
+
+	if not ok:
+		sys.exit(1);
+
+if __name__ == '__main__':
+	main();
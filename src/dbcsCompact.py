@@ -0,0 +1,640 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Compact representation of models, for very large (i.e. generated) schemas.
+# Instead of each entity, attribute, link, etc. being an object of its own
+# (with lists of its own), everything is kept in tables of arrays (one array
+# per field), with names interned in a single string table and items
+# referring to each other by their index in the tables.
+#
+# The items can still be used as dbcsTypes objects, through 'views' which
+# read straight from the arrays. These are only created when they're needed,
+# so the rest of the toolkit works on compact models unchanged.
+
+import array
+
+from dbcsTypes import *
+
+###############################
+# CONSTANTS
+
+# index used for 'no item'
+NO_ITEM = -1;
+
+# kinds of attributes
+ATTR_NORMAL		= 0;
+ATTR_DERIVED	= 1;
+ATTR_MULTI		= 2;
+
+# kinds of specialisations
+SPEC_PLAIN		= 0;
+SPEC_DISJOINT	= 1;
+SPEC_OVERLAP	= 2;
+
+# helper - get a new (empty) array of indices
+def _indices ():
+	return array.array('i');
+
+# helper - get a new (empty) array of flags/small values
+def _flags ():
+	return array.array('b');
+
+###############################
+# COMPACT MODEL
+
+# Model stored as tables of arrays
+# NOTE: the items of each owner (i.e. an entity's attributes, or a relationship's links)
+#		are stored next to each other, so each owner only needs an 'offsets' entry saying
+#		where they start (with the next owner's entry saying where they end)
+# NOTE: compact models can't be changed once built (see compactModel())
+class CompactModel (Model):
+	__slots__ = [
+		'strings',		# id -> string (names of items and attributes, and roles), with each distinct one only stored once
+		'constraints',	# id -> structural constraint (each distinct one is only stored once)
+
+		# Entities
+		'entName',		# string id of name
+		'entWeak',		# is it a weak entity
+		'entKey',		# attribute index of key (or NO_ITEM)
+		'entIdRel',		# relationship index of identifying relationship (or NO_ITEM)
+		'entAttrs',		# offsets of attributes in the attribute table
+		'entSpecs',		# offsets of specialisations in the specialisation table
+		'entSupers',	# offsets of superclasses in supEntity
+		'entRels',		# offsets of relationships participated in, in partRel
+
+		'supEntity',	# entity index of superclass
+		'partRel',		# relationship index of relationship participated in
+
+		# Attributes
+		'attrName',		# string id of name
+		'attrKind',		# kind of attribute (ATTR_*)
+		'attrKey',		# is it a key
+		'attrComps',	# offsets of component attributes in the attribute table
+
+		# Specialisations
+		'specKind',		# kind of specialisation (SPEC_*)
+		'specParent',	# entity index of parent entity
+		'specRole',		# string id of role (or NO_ITEM)
+		'specTotal',	# is it total
+		'specSubs',		# offsets of subclasses in subEntity
+
+		'subEntity',	# entity index of subclass
+
+		# Relationships
+		'relName',		# string id of name
+		'relIdent',		# is it an identifying relationship
+		'relAttrs',		# offsets of attributes in the attribute table
+		'relLinks',		# offsets of links in the link table
+
+		# Links
+		'linkEntity',	# entity index of participant (or NO_ITEM)
+		'linkCon',		# constraint id of structural constraint
+		'linkRole',		# string id of role name
+
+		# Views (not saved)
+		'_itemIds',		# name -> index of entity (as 2i) or relationship (as 2i+1)
+		'_entityViews',	# entity index -> view (or None if it hasn't been needed yet)
+		'_specViews',	# specialisation index -> view (or None if it hasn't been needed yet)
+		'_relViews',	# relationship index -> view (or None if it hasn't been needed yet)
+	]
+
+	# Constructor - create an empty model (to be filled in by compactModel())
+	def __init__ (self, name, description, authors):
+		self.name = name;
+		self.description = description;
+		self.authors = authors;
+		self._closure = None;
+
+		self.strings = [];
+		self.constraints = [];
+
+		self.entName = _indices();
+		self.entWeak = _flags();
+		self.entKey = _indices();
+		self.entIdRel = _indices();
+		self.entAttrs = _indices();
+		self.entSpecs = _indices();
+		self.entSupers = _indices();
+		self.entRels = _indices();
+		self.supEntity = _indices();
+		self.partRel = _indices();
+
+		self.attrName = _indices();
+		self.attrKind = _flags();
+		self.attrKey = _flags();
+		self.attrComps = _indices();
+
+		self.specKind = _flags();
+		self.specParent = _indices();
+		self.specRole = _indices();
+		self.specTotal = _flags();
+		self.specSubs = _indices();
+		self.subEntity = _indices();
+
+		self.relName = _indices();
+		self.relIdent = _flags();
+		self.relAttrs = _indices();
+		self.relLinks = _indices();
+
+		self.linkEntity = _indices();
+		self.linkCon = _indices();
+		self.linkRole = _indices();
+
+		self._reset_views();
+
+	# helper function (private) - throw away the views (i.e. after the tables have been filled in)
+	def _reset_views (self):
+		numEntities = len(self.entName);
+		numRels = len(self.relName);
+
+		self._itemIds = {};
+		for i in xrange(numEntities):
+			self._itemIds[self.strings[self.entName[i]]] = 2 * i;
+		for i in xrange(numRels):
+			self._itemIds[self.strings[self.relName[i]]] = 2 * i + 1;
+
+		self._entityViews = [None] * numEntities;
+		self._specViews = [None] * len(self.specKind);
+		self._relViews = [None] * numRels;
+		self._closure = None;
+
+	# Pickling ---------------------------
+
+	# only the tables get saved, since the views can be made again
+	def __getstate__ (self):
+		state = {};
+		for name in ['name', 'description', 'authors'] + CompactModel.__slots__:
+			if not name.startswith('_'):
+				state[name] = getattr(self, name);
+		return state;
+
+	def __setstate__ (self, state):
+		for name, value in state.iteritems():
+			setattr(self, name, value);
+		self._reset_views();
+
+	# Views ------------------------------
+
+	# get the view for the entity with the given index
+	def getEntity (self, i):
+		view = self._entityViews[i];
+		if view is None:
+			if self.entWeak[i]:
+				view = WeakEntityView(self, i);
+			else:
+				view = EntityView(self, i);
+			self._entityViews[i] = view;
+		return view;
+
+	# get the view for the specialisation with the given index
+	def getSpec (self, i):
+		view = self._specViews[i];
+		if view is None:
+			view = _SPEC_VIEWS[self.specKind[i]](self, i);
+			self._specViews[i] = view;
+		return view;
+
+	# get the view for the relationship with the given index
+	def getRel (self, i):
+		view = self._relViews[i];
+		if view is None:
+			if self.relIdent[i]:
+				view = IdentifyingRelView(self, i);
+			else:
+				view = RelView(self, i);
+			self._relViews[i] = view;
+		return view;
+
+	# get a view for the attribute with the given index
+	# NOTE: attributes are the most numerous items, so their views aren't kept
+	def getAttr (self, i):
+		return _ATTR_VIEWS[self.attrKind[i]](self, i);
+
+	# get a view for the link with the given index
+	# NOTE: links aren't kept either
+	def getLink (self, i):
+		return LinkView(self, i);
+
+	# Model API --------------------------
+
+	# all the entities
+	@property
+	def entities (self):
+		return [self.getEntity(i) for i in xrange(len(self.entName))];
+
+	# all the relationships
+	@property
+	def relationships (self):
+		return [self.getRel(i) for i in xrange(len(self.relName))];
+
+	# compact models can't be changed
+	def add (self, item):
+		raise TypeError, "Cannot add to a compact model"
+
+	__add__ = add;
+
+	# helper function (private) - verify that a given entity is valid
+	def _check_entity_arg (self, entity):
+		return isinstance(entity, _EntityView) and (entity._model is self);
+
+	# Get the entity or relationship with the given name (or None if not found)
+	def getItem (self, name):
+		itemId = self._itemIds.get(name);
+		if itemId is None:
+			return None;
+		elif itemId & 1:
+			return self.getRel(itemId >> 1);
+		else:
+			return self.getEntity(itemId >> 1);
+
+	# Get the position of the given entity/relationship in the list of entities/relationships (or None if it isn't in the model)
+	def getItemIndex (self, item):
+		if isinstance(item, (_EntityView, _RelView)) and (item._model is self):
+			return item._index;
+		return None;
+
+	# Get a list of the (direct) super-entities for a given entity
+	def getEntitySuperclasses (self, entity):
+		# verify that we've got a valid entity
+		if self._check_entity_arg(entity) == False:
+			raise TypeError, "Not a valid entity to get superclasses for"
+
+		i = entity._index;
+		return [self.getEntity(self.supEntity[j]) for j in xrange(self.entSupers[i], self.entSupers[i + 1])];
+
+	# Get a list of the relationships which involve the given entity
+	def getEntityRelationships (self, entity):
+		# verify that we've got a valid entity
+		if self._check_entity_arg(entity) == False:
+			raise TypeError, "Not a valid entity to find relationship participations for"
+
+		i = entity._index;
+		return [self.getRel(self.partRel[j]) for j in xrange(self.entRels[i], self.entRels[i + 1])];
+
+###############################
+# VIEWS
+#
+# Each view is a subclass of the dbcsTypes class it stands in for (so that
+# isinstance() checks still work), with properties in place of the fields,
+# which read from the tables of the model.
+# NOTE: the views can't be used to change the model
+
+# helper - raise the error for trying to change a compact model
+def _read_only (self, item):
+	raise TypeError, "Cannot add to an item of a compact model"
+
+# ------------
+
+# Entity
+class _EntityView (object):
+	__slots__ = ()
+
+	# Constructor
+	def __init__ (self, model, index):
+		self._model = model;
+		self._index = index;
+
+	@property
+	def name (self):
+		m = self._model;
+		return m.strings[m.entName[self._index]];
+
+	@property
+	def model (self):
+		return self._model;
+
+	@property
+	def key (self):
+		a = self._model.entKey[self._index];
+		if a == NO_ITEM:
+			return None;
+		return self._model.getAttr(a);
+
+	@property
+	def attributes (self):
+		m = self._model;
+		i = self._index;
+		return [m.getAttr(a) for a in xrange(m.entAttrs[i], m.entAttrs[i + 1])];
+
+	@property
+	def specialisations (self):
+		m = self._model;
+		i = self._index;
+		return [m.getSpec(s) for s in xrange(m.entSpecs[i], m.entSpecs[i + 1])];
+
+	add = __add__ = _read_only;
+
+class EntityView (_EntityView, Entity):
+	__slots__ = ['_model', '_index']
+
+class WeakEntityView (_EntityView, WeakEntity):
+	__slots__ = ['_model', '_index']
+
+	@property
+	def identifying_rel (self):
+		r = self._model.entIdRel[self._index];
+		if r == NO_ITEM:
+			return None;
+		return self._model.getRel(r);
+
+# Specialisation
+class _SpecView (object):
+	__slots__ = ()
+
+	# Constructor
+	def __init__ (self, model, index):
+		self._model = model;
+		self._index = index;
+
+	@property
+	def role (self):
+		s = self._model.specRole[self._index];
+		if s == NO_ITEM:
+			return None;
+		return self._model.strings[s];
+
+	@property
+	def total (self):
+		return bool(self._model.specTotal[self._index]);
+
+	@property
+	def parent_entity (self):
+		return self._model.getEntity(self._model.specParent[self._index]);
+
+	@property
+	def derived_entities (self):
+		m = self._model;
+		i = self._index;
+		return [m.getEntity(m.subEntity[k]) for k in xrange(m.specSubs[i], m.specSubs[i + 1])];
+
+	@property
+	def _derived_set (self):
+		return set(self.derived_entities);
+
+	add = __add__ = _read_only;
+
+class SpecView (_SpecView, Specialisation):
+	__slots__ = ['_model', '_index']
+
+class DisjointSpecView (_SpecView, DisjointSpec):
+	__slots__ = ['_model', '_index']
+
+class OverlapSpecView (_SpecView, OverlapSpec):
+	__slots__ = ['_model', '_index']
+
+# Relationship
+class _RelView (object):
+	__slots__ = ()
+
+	# Constructor
+	def __init__ (self, model, index):
+		self._model = model;
+		self._index = index;
+
+	@property
+	def name (self):
+		m = self._model;
+		return m.strings[m.relName[self._index]];
+
+	@property
+	def links (self):
+		m = self._model;
+		i = self._index;
+		return [m.getLink(l) for l in xrange(m.relLinks[i], m.relLinks[i + 1])];
+
+	@property
+	def attributes (self):
+		m = self._model;
+		i = self._index;
+		return [m.getAttr(a) for a in xrange(m.relAttrs[i], m.relAttrs[i + 1])];
+
+	add = __add__ = _read_only;
+
+class RelView (_RelView, Rel):
+	__slots__ = ['_model', '_index']
+
+class IdentifyingRelView (_RelView, IdentifyingRel):
+	__slots__ = ['_model', '_index']
+
+# Link
+class LinkView (Link):
+	__slots__ = ['_model', '_index']
+
+	# Constructor
+	def __init__ (self, model, index):
+		self._model = model;
+		self._index = index;
+
+	@property
+	def role_name (self):
+		m = self._model;
+		return m.strings[m.linkRole[self._index]];
+
+	@property
+	def entity (self):
+		e = self._model.linkEntity[self._index];
+		if e == NO_ITEM:
+			return None;
+		return self._model.getEntity(e);
+
+	@property
+	def structCon (self):
+		m = self._model;
+		return m.constraints[m.linkCon[self._index]];
+
+# Attribute
+class _AttrView (object):
+	__slots__ = ()
+
+	# Constructor
+	def __init__ (self, model, index):
+		self._model = model;
+		self._index = index;
+
+	@property
+	def name (self):
+		m = self._model;
+		return m.strings[m.attrName[self._index]];
+
+	@property
+	def key (self):
+		return bool(self._model.attrKey[self._index]);
+
+	@property
+	def components (self):
+		m = self._model;
+		i = self._index;
+		return [m.getAttr(a) for a in xrange(m.attrComps[i], m.attrComps[i + 1])];
+
+	add = __add__ = _read_only;
+
+class AttrView (_AttrView, Attr):
+	__slots__ = ['_model', '_index']
+
+class DerivedAttrView (_AttrView, DerivedAttr):
+	__slots__ = ['_model', '_index']
+
+class MultiAttrView (_AttrView, MultiAttr):
+	__slots__ = ['_model', '_index']
+
+# ------------
+
+# view classes to use for each kind of item
+_ATTR_VIEWS = {
+	ATTR_NORMAL  : AttrView,
+	ATTR_DERIVED : DerivedAttrView,
+	ATTR_MULTI   : MultiAttrView,
+}
+
+_SPEC_VIEWS = {
+	SPEC_PLAIN    : SpecView,
+	SPEC_DISJOINT : DisjointSpecView,
+	SPEC_OVERLAP  : OverlapSpecView,
+}
+
+###############################
+# CONVERSION
+
+# helper - get the kind of an attribute
+def _attr_kind (attr):
+	if isinstance(attr, MultiAttr):
+		return ATTR_MULTI;
+	elif isinstance(attr, DerivedAttr):
+		return ATTR_DERIVED;
+	else:
+		return ATTR_NORMAL;
+
+# helper - get the kind of a specialisation
+def _spec_kind (spec):
+	if isinstance(spec, DisjointSpec):
+		return SPEC_DISJOINT;
+	elif isinstance(spec, OverlapSpec):
+		return SPEC_OVERLAP;
+	else:
+		return SPEC_PLAIN;
+
+# Get a compact version of the given model
+# NOTE: the model should be finished first, since the compact version can't be changed.
+#		Everything it refers to must be in the model too.
+def compactModel (model):
+	cm = CompactModel(model.name, model.description, model.authors);
+
+	# strings and constraints
+	stringIds = {};
+	def string (s):
+		sid = stringIds.get(s);
+		if sid is None:
+			sid = stringIds[s] = len(cm.strings);
+			cm.strings.append(s);
+		return sid;
+
+	conIds = {};
+	def constraint (con):
+		cid = conIds.get(con);
+		if cid is None:
+			cid = conIds[con] = len(cm.constraints);
+			cm.constraints.append(con);
+		return cid;
+
+	# indices of the items (only needed while converting)
+	entityIds = dict([(entity, i) for i, entity in enumerate(model.entities)]);
+	relIds = dict([(rel, i) for i, rel in enumerate(model.relationships)]);
+
+	def entityIndex (entity):
+		if entity is None:
+			return NO_ITEM;
+		elif entity not in entityIds:
+			raise ValueError, "Entity '%s' isn't in model '%s', so it can't be compacted" % (entity.name, model.name)
+		return entityIds[entity];
+
+	# attributes get added to the table one owner at a time, so that the attributes
+	# of each owner end up next to each other (with components added after all of them)
+	attrs = [];
+	def addAttributes (offsets, attributes):
+		offsets.append(len(attrs));
+		attrs.extend(attributes);
+
+	# entities --------------------------
+
+	for entity in model.entities:
+		cm.entName.append(string(entity.name));
+		cm.entWeak.append(isinstance(entity, WeakEntity));
+
+		# key is one of the attributes
+		cm.entKey.append(NO_ITEM);
+		for i, attr in enumerate(entity.attributes):
+			if attr is entity.key:
+				cm.entKey[-1] = len(attrs) + i;
+				break;
+		addAttributes(cm.entAttrs, entity.attributes);
+
+		if isinstance(entity, WeakEntity) and (entity.identifying_rel is not None):
+			cm.entIdRel.append(relIds[entity.identifying_rel]);
+		else:
+			cm.entIdRel.append(NO_ITEM);
+
+		# specialisations
+		cm.entSpecs.append(len(cm.specKind));
+		for spec in entity.specialisations:
+			cm.specKind.append(_spec_kind(spec));
+			cm.specParent.append(entityIndex(spec.parent_entity));
+			if spec.role:
+				cm.specRole.append(string(spec.role));
+			else:
+				cm.specRole.append(NO_ITEM);
+			cm.specTotal.append(bool(spec.total));
+
+			cm.specSubs.append(len(cm.subEntity));
+			for dEntity in spec.derived_entities:
+				cm.subEntity.append(entityIndex(dEntity));
+
+		# indexes
+		cm.entSupers.append(len(cm.supEntity));
+		for superclass in model.getEntitySuperclasses(entity):
+			cm.supEntity.append(entityIndex(superclass));
+
+		cm.entRels.append(len(cm.partRel));
+		for rel in model.getEntityRelationships(entity):
+			cm.partRel.append(relIds[rel]);
+
+	# these are all offsets, so they end with the end of the table
+	# NOTE: relationship attributes come straight after the entity ones
+	cm.entAttrs.append(len(attrs));
+	cm.entSpecs.append(len(cm.specKind));
+	cm.specSubs.append(len(cm.subEntity));
+	cm.entSupers.append(len(cm.supEntity));
+	cm.entRels.append(len(cm.partRel));
+
+	# relationships ---------------------
+
+	for rel in model.relationships:
+		cm.relName.append(string(rel.name));
+		cm.relIdent.append(isinstance(rel, IdentifyingRel));
+		addAttributes(cm.relAttrs, rel.attributes);
+
+		cm.relLinks.append(len(cm.linkEntity));
+		for link in rel.links:
+			cm.linkEntity.append(entityIndex(link.entity));
+			cm.linkCon.append(constraint(link.structCon));
+			cm.linkRole.append(string(link.role_name));
+
+	cm.relAttrs.append(len(attrs));
+	cm.relLinks.append(len(cm.linkEntity));
+
+	# attributes ------------------------
+
+	# NOTE: the table grows as the components get added to the end, so
+	#		the components of each attribute end up next to each other
+	a = 0;
+	while a < len(attrs):
+		attr = attrs[a];
+		cm.attrName.append(string(attr.name));
+		cm.attrKind.append(_attr_kind(attr));
+		cm.attrKey.append(bool(attr.key));
+		addAttributes(cm.attrComps, attr.components);
+		a += 1;
+
+	cm.attrComps.append(len(attrs));
+
+	cm._reset_views();
+	return cm;
@@ -0,0 +1,520 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Long-running daemon which validates/renders dbcs files for clients (see
+# dbcsClient), keeping the models it has loaded (along with their indexes,
+# and the results of validating them) in memory between requests. Models are
+# only loaded again when their files change.
+#
+# Clients talk to the daemon over a Unix domain socket, with each request and
+# response being a single line of JSON. Requests give the name of a command to
+# run and its arguments (i.e. {"command": "validate", "file": "/abs/path.dbcs"}),
+# and responses always have an 'ok' field, along with either the results or an
+# 'error' message. Each connection is for a single request.
+#
+# Each connection gets a thread of its own for reading the request and sending
+# the response back, so that a client which is slow to send its request can't
+# hold up the others. The requests themselves are still handled one at a time
+# though, since they share the model cache (and capture everything printed).
+
+import sys
+import os
+import time
+import json
+import inspect
+import signal
+import socket
+import threading
+import traceback
+import SocketServer
+
+from cStringIO import StringIO
+from collections import OrderedDict
+from optparse import OptionParser
+
+import dbcsLoader
+import dbcsValidate
+import dbcsReport
+import dbcs2Graph
+import dbcsRender
+import dbcsPartition
+import dbcsProfile
+import dbcsClient
+
+###############################
+# MODEL CACHE
+
+# max number of models to keep in memory (by default)
+MAX_MODELS = 32;
+
+# A model loaded from a file, along with things worked out from it
+class CacheEntry:
+	__slots__ = [
+		'stamp',		# (mtime, size) of the file when the model was loaded
+		'model',		# the model
+		'results',		# report format -> (passed, output) from validating the model
+	]
+
+	# Constructor
+	def __init__ (self, stamp, model):
+		self.stamp = stamp;
+		self.model = model;
+		self.results = {};
+
+# helper - get the stamp of a file, for telling if it has changed (or None if it doesn't exist)
+def _get_stamp (fileN):
+	try:
+		st = os.stat(fileN);
+	except OSError:
+		return None;
+	return (st.st_mtime, st.st_size);
+
+# Models loaded from files, with the least recently used ones being thrown away once there are too many
+class ModelCache:
+	__slots__ = [
+		'maxModels',	# max number of models to keep
+		'entries',		# (fileN, restricted) -> CacheEntry (in order of use, oldest first)
+		'hits',			# number of times a model could be reused
+		'misses',		# number of times a model had to be loaded
+	]
+
+	# Constructor
+	def __init__ (self, maxModels=MAX_MODELS):
+		self.maxModels = max(1, maxModels);
+		self.entries = OrderedDict();
+		self.hits = 0;
+		self.misses = 0;
+
+	# get the model for the given file, loading it (again) if it hasn't been loaded yet or has changed
+	#	restricted: only allow the dbcs mini-language in the file (see dbcsLoader.readDBCS)
+	# < returns: CacheEntry for the model (or None if it couldn't be loaded)
+	def get (self, fileN, restricted=False, profiler=None):
+		profiler = profiler or dbcsProfile.NULL_PROFILER;
+		key = (fileN, restricted);
+		stamp = _get_stamp(fileN);
+
+		# reuse the model if the file hasn't changed
+		entry = self.entries.pop(key, None);
+		if (entry is not None) and (stamp is not None) and (entry.stamp == stamp):
+			self.entries[key] = entry;
+			self.hits += 1;
+			profiler.count("daemon.cache_hits");
+			return entry;
+
+		# (re)load it
+		# NOTE: the stamp is from before loading, so any changes made while loading get picked up next time
+		self.misses += 1;
+		profiler.begin("load");
+		model = dbcsLoader.readDBCS(fileN, restricted);
+		profiler.end("load");
+		if model is None:
+			return None;
+
+		entry = CacheEntry(stamp, model);
+		self.entries[key] = entry;
+		while len(self.entries) > self.maxModels:
+			self.entries.popitem(False);
+		return entry;
+
+	# throw away the model for the given file
+	def forget (self, fileN, restricted=False):
+		return self.entries.pop((fileN, restricted), None) is not None;
+
+###############################
+# DAEMON
+
+# helper - run a function with everything it prints being captured
+# < returns: (result, captured output), with the result being None if the function failed
+def _run_captured (fn, *args):
+	oldStreams = (sys.stdout, sys.stderr);
+	out = StringIO();
+	sys.stdout = sys.stderr = out;
+	try:
+		try:
+			result = fn(*args);
+		except Exception:
+			traceback.print_exc();
+			result = None;
+	finally:
+		sys.stdout, sys.stderr = oldStreams;
+
+	return (result, out.getvalue());
+
+# helper - check that the arguments in a request can be passed to the function for its command
+# < returns: description of what is wrong with them (or None if they're fine)
+def _check_args (fn, args):
+	spec = inspect.getargspec(fn);
+	names = spec.args[1:]; # skip 'self'
+	required = names[:len(names) - len(spec.defaults or [])];
+
+	unknown = [name for name in args if name not in names];
+	if unknown:
+		return "unknown argument(s) %s" % (", ".join(sorted(unknown)));
+	missing = [name for name in required if name not in args];
+	if missing:
+		return "missing argument(s) %s" % (", ".join(missing));
+	return None;
+
+# helper - convert the strings in a request (which JSON gives as unicode) into byte strings
+# NOTE: file names need to be in the filesystem encoding, since they get combined
+#		with the (byte string) contents of the files when checking for changes
+def _encode_arg (value, encoding):
+	if isinstance(value, unicode):
+		return value.encode(encoding);
+	elif isinstance(value, list):
+		return [_encode_arg(item, encoding) for item in value];
+	else:
+		return value;
+
+# The work done by the daemon for each command
+# NOTE: each command is a method named cmd_<command>, which gets the arguments from
+#		the request, and returns a dict of results to send back
+class Daemon:
+	__slots__ = [
+		'cache',		# ModelCache of the models loaded
+		'jobs',			# max number of GraphViz renders to run at once
+		'verbose',		# print a line for each request handled
+		'stopping',		# has the daemon been asked to stop
+		'startTime',	# time the daemon was started
+		'requests',		# number of requests handled
+		'lock',			# lock held while handling a request, so that only one gets handled at a time
+	]
+
+	# Constructor
+	def __init__ (self, maxModels=MAX_MODELS, jobs=0, verbose=False):
+		self.cache = ModelCache(maxModels);
+		self.jobs = jobs;
+		self.verbose = verbose;
+		self.stopping = False;
+		self.startTime = time.time();
+		self.requests = 0;
+		self.lock = threading.Lock();
+
+	# handle a request (waiting for any other request being handled to finish first)
+	# < returns: the response to send back
+	def handle (self, request):
+		self.lock.acquire();
+		try:
+			return self._handle(request);
+		finally:
+			self.lock.release();
+
+	# helper for handle()
+	def _handle (self, request):
+		startTime = time.time();
+
+		if not isinstance(request, dict):
+			request = {};
+		command = _encode_arg(request.pop('command', None), "utf-8");
+
+		fn = getattr(self, "cmd_%s" % (command), None);
+		encoding = sys.getfilesystemencoding() or "utf-8";
+		try:
+			request = dict((_encode_arg(name, encoding), _encode_arg(value, encoding)) for name, value in request.iteritems());
+			badArgs = fn and _check_args(fn, request);
+		except UnicodeError:
+			badArgs = "arguments can't be converted to the filesystem encoding (%s)" % (encoding);
+		if fn is None:
+			response = {'ok': False, 'error': "Unknown command '%s'" % (command)};
+		elif badArgs:
+			response = {'ok': False, 'error': "Bad request for '%s' (%s)" % (command, badArgs)};
+		else:
+			try:
+				response = fn(**request);
+				response['ok'] = True;
+			except Exception, e:
+				response = {'ok': False, 'error': "%s: %s" % (e.__class__.__name__, e)};
+
+		self.requests += 1;
+		if self.verbose:
+			sys.stderr.write("[%s] %s %s (%.3fs)%s\n" % (time.strftime("%H:%M:%S"), command,
+					request.get('file', ""), time.time() - startTime, ("" if response['ok'] else " - " + response['error'])));
+		return response;
+
+	# Commands ---------------------------
+
+	# check that the daemon is running
+	def cmd_ping (self):
+		return {'pid': os.getpid()};
+
+	# get info about the daemon
+	def cmd_stats (self):
+		return {
+			'pid': os.getpid(),
+			'uptime': time.time() - self.startTime,
+			'requests': self.requests,
+			'models': [fileN for fileN, restricted in self.cache.entries],
+			'hits': self.cache.hits,
+			'misses': self.cache.misses,
+		};
+
+	# stop the daemon (once this request has been answered)
+	def cmd_stop (self):
+		self.stopping = True;
+		return {};
+
+	# throw away the model for a file (i.e. if it depends on other files which have changed)
+	def cmd_forget (self, file, restricted=False):
+		file = dbcsLoader.changeExtension(file, "dbcs");
+		return {'forgotten': self.cache.forget(file, restricted)};
+
+	# validate a file
+	#	report: name of report format (see dbcsReport)
+	#	profile: send back the times taken for each phase
+	def cmd_validate (self, file, report="text", restricted=False, profile=False):
+		if report not in dbcsReport.REPORTERS:
+			raise ValueError, "Unknown report format '%s'" % (report)
+
+		file = dbcsLoader.changeExtension(file, "dbcs");
+		profiler = dbcsProfile.makeProfiler(profile);
+		result, output = _run_captured(self._validate, file, report, restricted, profiler);
+		passed, reportText = result or (False, "");
+		return {'passed': passed, 'output': output, 'report': reportText, 'profile': self._get_profile(profiler)};
+
+	# helper for cmd_validate() - validate the model (with everything printed being captured)
+	# < returns: (passed, report text)
+	def _validate (self, fileN, reportFormat, restricted, profiler):
+		# the text report just gets printed with everything else
+		if reportFormat == dbcsReport.TextReporter.name:
+			reportStream = None;
+		else:
+			reportStream = StringIO();
+
+		reporter = dbcsReport.makeReporter(reportFormat, reportStream);
+		reporter.begin();
+		reporter.beginFile(fileN);
+
+		try:
+			print("$ Loading schema description...");
+			entry = self.cache.get(fileN, restricted, profiler);
+			if entry is None:
+				reporter.fileError(fileN, "Couldn't load model");
+				passed = False;
+			else:
+				passed = self._validate_model(entry, fileN, reportFormat, restricted, reporter, profiler);
+		except Exception, e:
+			traceback.print_exc();
+			reporter.fileError(fileN, "%s: %s" % (e.__class__.__name__, e));
+			passed = False;
+
+		reporter.endFile(fileN, passed);
+		reporter.end();
+
+		if reportStream:
+			return (passed, reportStream.getvalue());
+		return (passed, "");
+
+	# helper for _validate() - validate the model, or replay the results from last time if it hasn't changed
+	def _validate_model (self, entry, fileN, reportFormat, restricted, reporter, profiler):
+		# same model as last time?
+		# NOTE: the results are only reused for text reports, since other reports
+		#		are written as they go, and can't be replayed into a new reporter
+		if reportFormat == dbcsReport.TextReporter.name:
+			result = entry.results.get(reportFormat);
+			if result is not None:
+				passed, output = result;
+				profiler.count("daemon.result_hits");
+				sys.stdout.write(output);
+				return passed;
+
+		# capture the output of the checks (including the errors found), so that it can be replayed next time
+		oldStreams = (sys.stdout, sys.stderr);
+		sys.stdout = sys.stderr = out = StringIO();
+		try:
+			passed = dbcsValidate.checkSchema(fileN, entry.model, dbcsValidate.modes[0], restricted, reporter, profiler);
+		finally:
+			sys.stdout, sys.stderr = oldStreams;
+
+		output = out.getvalue();
+		sys.stdout.write(output);
+		if reportFormat == dbcsReport.TextReporter.name:
+			entry.results[reportFormat] = (passed, output);
+		return passed;
+
+	# render a file
+	#	engine, formats, timeout: how to render it (as for dbcs2Graph)
+	#	partition, areas, minSize: split the model into parts to draw separately (see dbcs2Graph.convertPartitions)
+	#	focus: (entity name, depth) to only draw the part of the model around an entity (see dbcs2Graph.convertFocus)
+	# NOTE: only outputs which aren't up to date get rendered (as for 'dbcs2Graph -i')
+	def cmd_render (self, file, engine="neato", formats=["png"], timeout=None, restricted=False,
+					partition=None, areas=None, minSize=2, focus=None, profile=False):
+		if (engine not in dbcs2Graph.gv_engines) or (engine == dbcs2Graph.BUILTIN_ENGINE):
+			raise ValueError, "Unknown GraphViz engine '%s'" % (engine)
+		for format in formats:
+			if format not in dbcs2Graph.formats:
+				raise ValueError, "Unknown output format '%s'" % (format)
+
+		# partitioning
+		if partition:
+			if partition not in dbcsPartition.partitionModes:
+				raise ValueError, "Unknown partitioning mode '%s'" % (partition)
+			if areas:
+				areas = dbcsPartition.readAreas(areas);
+
+			if "svg" in formats:
+				linkFormat = "svg";
+			else:
+				linkFormat = formats[0];
+			partitioning = (partition, areas, minSize, linkFormat);
+		else:
+			partitioning = None;
+
+		if focus:
+			focus = tuple(focus);
+
+		file = dbcsLoader.changeExtension(file, "dbcs");
+		profiler = dbcsProfile.makeProfiler(profile);
+		scheduler = dbcsRender.RenderScheduler(self.jobs, profiler=profiler);
+		succeeded, output = _run_captured(self._render, scheduler, file, engine, formats, timeout, restricted,
+				partitioning, focus, profiler);
+
+		rendered = [job.fileP for job in scheduler.finished if job.succeeded()];
+		failed = [job.fileP for job in scheduler.finished if not job.succeeded()];
+		return {'succeeded': bool(succeeded) and not failed, 'output': output,
+				'rendered': rendered, 'failed': failed, 'profile': self._get_profile(profiler)};
+
+	# helper for cmd_render() - write the .dot file(s) and render them (with everything printed being captured)
+	# < returns: whether the model could be loaded and converted
+	def _render (self, scheduler, fileN, engine, formats, timeout, restricted, partitioning, focus, profiler):
+		print("$ Loading schema description...");
+		entry = self.cache.get(fileN, restricted, profiler);
+		if entry is None:
+			return False;
+
+		dbcs2Graph.queueGraphRenders(scheduler, engine, formats, fileN, entry.model, timeout, True, focus, partitioning, profiler);
+		scheduler.wait();
+		scheduler.printSummary(sys.stdout);
+		return True;
+
+	# helper - get the data recorded by a profiler (if profiling was on)
+	def _get_profile (self, profiler):
+		if profiler.enabled:
+			return profiler.getData();
+		return None;
+
+# -----------
+
+# max time (in seconds) to wait for a client to send its request
+REQUEST_TIMEOUT = 5.0;
+
+# Handler for a client's connection, answering its request
+# NOTE: the connection gets closed once the request has been answered
+class RequestHandler (SocketServer.StreamRequestHandler):
+	timeout = REQUEST_TIMEOUT;
+
+	def handle (self):
+		daemon = self.server.daemon;
+
+		try:
+			request = dbcsClient.readMessage(self.rfile);
+		except ValueError, e:
+			dbcsClient.writeMessage(self.wfile, {'ok': False, 'error': "Bad request (%s)" % (e)});
+			return;
+		except socket.timeout:
+			return; # client took too long, so let the others have a go
+		if request is None:
+			return; # client has gone (i.e. was just checking that the daemon is running)
+
+		dbcsClient.writeMessage(self.wfile, daemon.handle(request));
+
+# Server listening on a Unix domain socket, with a thread for each connection
+# NOTE: the threads aren't daemon threads, so that responses which are still being sent
+#		(i.e. to the 'stop' request) don't get cut off when the daemon exits
+class DaemonServer (SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+	# max time (in seconds) to wait for a connection before checking whether the daemon has been stopped
+	timeout = 0.5;
+
+	# Constructor
+	#	socketN: filename of the socket to listen on
+	def __init__ (self, socketN, daemon):
+		self.daemon = daemon;
+
+		# only the user running the daemon can connect to it
+		oldMask = os.umask(0077);
+		try:
+			SocketServer.UnixStreamServer.__init__(self, socketN, RequestHandler);
+		finally:
+			os.umask(oldMask);
+
+	# handle requests until a client asks the daemon to stop
+	def run (self):
+		while not self.daemon.stopping:
+			self.handle_request();
+
+# helper - is there a daemon listening on the given socket already?
+def _is_running (socketN):
+	try:
+		client = dbcsClient.Client(socketN);
+	except socket.error:
+		return False;
+	client.close();
+	return True;
+
+# run the daemon until it is asked to stop
+#	socketN: filename of the socket to listen on
+def runDaemon (socketN, daemon):
+	# clean up after a daemon which didn't stop properly
+	if os.path.exists(socketN):
+		if _is_running(socketN):
+			raise RuntimeError, "A daemon is already listening on %s" % (socketN)
+		os.remove(socketN);
+
+	server = DaemonServer(socketN, daemon);
+	try:
+		# stop cleanly when killed too
+		signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0));
+
+		server.run();
+	finally:
+		server.server_close();
+		os.remove(socketN);
+
+###############################
+
+def main ():
+	# always print version info first...
+	print("DataBase Conceptual Schema (EER) Daemon");
+	print("Copyright 2010, Joshua Leung (aligorith@gmail.com)\n");
+
+	# set up option parser for managing the commandline args
+	usage = "usage: %prog [-S socket] [-m max models] [-j jobs] [-v] [--compact]";
+	parser = OptionParser(usage);
+	parser.add_option("-S", "--socket", dest="socket",
+			default=dbcsClient.getDefaultSocket(), type="string",
+			help="Socket to listen on (defaults to %default)")
+	parser.add_option("-m", "--max-models", dest="maxModels",
+			default=MAX_MODELS, type="int",
+			help="Max number of models to keep in memory (with the least recently used ones being dropped)")
+	parser.add_option("-j", "--jobs", dest="jobs",
+			default=0, type="int",
+			help="Max number of GraphViz renders to run at once (defaults to the number of CPU's)")
+	parser.add_option("-v", "--verbose", dest="verbose",
+			default=False, action="store_true",
+			help="Print a line for each request handled (to stderr)")
+	parser.add_option("--compact", dest="compact",
+			default=False, action="store_true",
+			help="Keep models in a compact form (taking much less memory), for very large schemas")
+
+	# parse commandline options
+	(options, args) = parser.parse_args()
+
+	if not hasattr(socket, 'AF_UNIX'):
+		parser.error("Unix domain sockets aren't available on this platform");
+
+	# load models in compact form
+	dbcsLoader.USE_COMPACT_MODELS = options.compact;
+
+	print("$ Listening on %s ..." % (options.socket));
+	sys.stdout.flush();
+	try:
+		runDaemon(options.socket, Daemon(options.maxModels, options.jobs, options.verbose));
+	except (RuntimeError, socket.error), e:
+		sys.stderr.write("ERROR: %s\n" % (e));
+		sys.exit(1);
+	except KeyboardInterrupt:
+		pass;
+
+	print("$ Stopped");
+
+if __name__ == '__main__':
+	main();
@@ -0,0 +1,119 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Fingerprints of models and validity checks, for working out whether
+# results derived from them (i.e. cached validation results) are still valid
+
+import types
+import inspect
+import hashlib
+
+from dbcsTypes import *
+
+###############################
+# MODEL FINGERPRINTS
+
+# NOTE: signatures only include the names of other items that are referred to,
+#		so that a change to one item doesn't change the signatures of everything
+#		that refers to it
+
+# get the signature of an attribute (and its components)
+def attributeSignature (attr):
+	return (attr.__class__.__name__, attr.name, attr.key,
+			tuple([attributeSignature(comp) for comp in attr.components]));
+
+# get the signature of an entity
+def entitySignature (entity):
+	sig = [entity.__class__.__name__, entity.name]
+
+	if entity.key is not None:
+		sig.append(entity.key.name);
+	else:
+		sig.append(None);
+
+	sig.append(tuple([attributeSignature(attr) for attr in entity.attributes]));
+	sig.append(tuple([superclass.name for superclass in entity.model.getEntitySuperclasses(entity)]));
+	sig.append(tuple([(spec.__class__.__name__, spec.role, spec.total,
+					   tuple([dEntity.name for dEntity in spec.derived_entities]))
+					  for spec in entity.specialisations]));
+
+	if isinstance(entity, WeakEntity) and (entity.identifying_rel is not None):
+		sig.append(entity.identifying_rel.name);
+
+	return tuple(sig);
+
+# get the signature of a relationship
+def relationshipSignature (rel):
+	links = [];
+	for link in rel.links:
+		if link.entity is not None:
+			entityName = link.entity.name;
+		else:
+			entityName = None;
+		links.append((entityName, link.structCon, link.role_name));
+
+	return (rel.__class__.__name__, rel.name, tuple(links),
+			tuple([attributeSignature(attr) for attr in rel.attributes]));
+
+# get the signature (digest) of an entity or relationship (or None for no item)
+def itemSignature (item):
+	if isinstance(item, Entity):
+		return hashlib.sha1(repr(entitySignature(item))).digest();
+	elif isinstance(item, Rel):
+		return hashlib.sha1(repr(relationshipSignature(item))).digest();
+	else:
+		return None;
+
+# get a fingerprint (hex digest) for the structure of the model
+# NOTE: two models with the same fingerprint are the same as far as any checks are concerned
+def modelFingerprint (model):
+	h = hashlib.sha1();
+	h.update(repr((model.name, model.description, model.authors)));
+
+	for entity in model.entities:
+		h.update(repr(entitySignature(entity)));
+	h.update("\0");
+	for rel in model.relationships:
+		h.update(repr(relationshipSignature(rel)));
+
+	return h.hexdigest();
+
+###############################
+# CODE FINGERPRINTS
+
+# Cache of fingerprints for classes (since their code won't change while running)
+_class_fingerprints = {};
+
+# helper - get the signature of a code object (ignoring line numbers, so that
+# edits elsewhere in the file don't count as changes)
+def _code_signature (code):
+	parts = [code.co_code, repr(code.co_names), repr(code.co_varnames)];
+	for const in code.co_consts:
+		if isinstance(const, types.CodeType):
+			parts.append(_code_signature(const));
+		else:
+			parts.append(repr(const));
+
+	return hashlib.sha1("\0".join(parts)).hexdigest();
+
+# get a fingerprint (hex digest) for the code of a class (and the classes it inherits from)
+# NOTE: only the methods and class variables are included, so anything else that
+#		the methods call should be covered by a version number class variable instead
+def classFingerprint (cls):
+	fingerprint = _class_fingerprints.get(cls);
+	if fingerprint:
+		return fingerprint;
+
+	h = hashlib.sha1();
+	for base in inspect.getmro(cls):
+		h.update(base.__name__ + "\0");
+
+		for name in sorted(base.__dict__):
+			value = base.__dict__[name];
+			if isinstance(value, types.FunctionType):
+				h.update(name + "\0" + _code_signature(value.func_code));
+			elif not name.startswith('__'):
+				h.update(name + "\0" + repr(value));
+
+	fingerprint = _class_fingerprints[cls] = h.hexdigest();
+	return fingerprint;
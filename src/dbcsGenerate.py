@@ -0,0 +1,204 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Generator for synthetic .dbcs files of any size, for testing and
+# benchmarking the toolkit on schemas much bigger than the examples
+
+import sys
+import random
+
+from optparse import OptionParser
+
+###############################
+# SETTINGS
+
+# structural constraints that links can be given
+STRUCT_CONS = ["PARTIAL_SINGLE", "PARTIAL_MANY", "TOTAL_SINGLE", "TOTAL_MANY"];
+
+# Parameters for a generated schema
+class SchemaParams:
+	__slots__ = [
+		'entities',			# number of entities (including subclasses and weak entities)
+		'relationships',	# number of relationships (not including identifying relationships)
+		'depth',			# max depth of specialisation hierarchies (0 for no specialisations)
+		'compositeDepth',	# max depth of composite attributes (0 for no composite attributes)
+		'weakRatio',		# fraction of entities which are weak entities
+		'specRatio',		# fraction of entities which are subclasses (when depth > 0)
+		'attributes',		# number of (non-key) attributes per entity
+		'seed',				# seed for random number generator (the same seed gives the same schema)
+	]
+
+	# Constructor
+	def __init__ (self, entities=100, relationships=None, depth=2, compositeDepth=1,
+				  weakRatio=0.1, specRatio=0.2, attributes=4, seed=0):
+		self.entities = entities;
+		if relationships is None:
+			self.relationships = entities; # roughly one per entity
+		else:
+			self.relationships = relationships;
+		self.depth = depth;
+		self.compositeDepth = compositeDepth;
+		self.weakRatio = weakRatio;
+		self.specRatio = specRatio;
+		self.attributes = attributes;
+		self.seed = seed;
+
+	# get a short description of the parameters (i.e. for naming files/results)
+	def getName (self):
+		return "gen_n%d_m%d_d%d_c%d_w%g_s%d" % (self.entities, self.relationships, self.depth,
+				self.compositeDepth, self.weakRatio, self.seed);
+
+###############################
+# GENERATOR
+
+# helper - get the code for an attribute
+#	depth: how many more levels of composite attributes can be nested inside this one
+def _attr_code (rng, name, depth):
+	r = rng.random();
+
+	if (depth > 0) and (r < 0.2):
+		# composite, with 2-3 components
+		components = [_attr_code(rng, "%s_%d" % (name, i), depth - 1) for i in xrange(rng.randint(2, 3))];
+		return 'Attr("%s", components=[%s])' % (name, ", ".join(components));
+	elif r < 0.3:
+		return 'MultiAttr("%s")' % (name);
+	elif r < 0.4:
+		return 'DerivedAttr("%s")' % (name);
+	else:
+		return 'Attr("%s")' % (name);
+
+# write a generated .dbcs file to the given stream
+#	params: SchemaParams for the schema to generate
+def generateSchema (stream, params):
+	rng = random.Random(params.seed);
+	w = stream.write;
+
+	w("# Generated schema - %s\n" % params.getName());
+	w('model = Model("%s", "Generated schema", ["dbcsGenerate"])\n' % params.getName());
+
+	# entities ----------------------------
+
+	strong = [];		# indices of (non-weak) entities which can own weak entities
+	specParents = [];	# indices of entities which can have more subclasses (i.e. not too deep)
+	specDepth = {};		# entity index -> depth in specialisation hierarchy
+	specs = {};			# entity index -> name of specialisation variable for its subclasses
+
+	for i in xrange(params.entities):
+		w("\n");
+		r = rng.random();
+
+		if specParents and (params.depth > 0) and (r < params.specRatio):
+			# subclass of some earlier entity (inheriting its key)
+			parent = rng.choice(specParents);
+			if parent not in specs:
+				specs[parent] = "s%d" % parent;
+				if rng.random() < 0.5:
+					w('s%d = DisjointSpec(e%d, "Kind")\n' % (parent, parent));
+				else:
+					w('s%d = OverlapSpec(e%d, total=False)\n' % (parent, parent));
+
+			w('e%d = Entity(model, "E%d", [%s])\n' % (i, i, specs[parent]));
+
+			specDepth[i] = specDepth[parent] + 1;
+			if specDepth[i] < params.depth:
+				specParents.append(i);
+			strong.append(i);
+		elif strong and (r < params.specRatio + params.weakRatio):
+			# weak entity, identified by some earlier entity
+			owner = rng.choice(strong);
+
+			w('e%d = WeakEntity(model, "E%d")\n' % (i, i));
+			w('e%d += Attr("Part", key=True)\n' % (i));
+			w('IdentifyingRel(model, "IDENTIFIES_E%d", [Link(e%d, PARTIAL_MANY), Link(e%d, TOTAL_SINGLE)])\n' % (i, owner, i));
+		else:
+			# normal entity
+			w('e%d = Entity(model, "E%d")\n' % (i, i));
+			w('e%d += Attr("Id", key=True)\n' % (i));
+
+			specDepth[i] = 0;
+			specParents.append(i);
+			strong.append(i);
+
+		for j in xrange(params.attributes):
+			w('e%d += %s\n' % (i, _attr_code(rng, "A%d" % j, params.compositeDepth)));
+
+	# relationships -----------------------
+
+	if params.entities:
+		w("\n");
+
+		for i in xrange(params.relationships):
+			# mostly binary, with the odd ternary one
+			if rng.random() < 0.1:
+				degree = 3;
+			else:
+				degree = 2;
+
+			participants = [rng.randrange(params.entities) for k in xrange(degree)];
+			if len(set(participants)) < degree:
+				# recursive, so links need role names to tell them apart
+				links = ['Link(e%d, %s, "role%d")' % (e, rng.choice(STRUCT_CONS), k) for k,e in enumerate(participants)];
+			else:
+				links = ['Link(e%d, %s)' % (e, rng.choice(STRUCT_CONS)) for e in participants];
+
+			if rng.random() < 0.2:
+				w('r%d = Rel(model, "R%d", [%s])\n' % (i, i, ", ".join(links)));
+				w('r%d += Attr("Since")\n' % (i));
+			else:
+				w('Rel(model, "R%d", [%s])\n' % (i, ", ".join(links)));
+
+# write a generated .dbcs file
+def generateFile (fileN, params):
+	f = open(fileN, 'w');
+	try:
+		generateSchema(f, params);
+	finally:
+		f.close();
+
+###############################
+
+def main ():
+	# set up option parser for managing the commandline args
+	usage = "usage: %prog [-n entities] [-m relationships] [-d depth] [-c depth] [-w ratio] [-s ratio] [-a attributes] [--seed seed] [-o file]";
+	parser = OptionParser(usage);
+	parser.add_option("-n", "--entities", dest="entities",
+			default=100, type="int",
+			help="Number of entities")
+	parser.add_option("-m", "--relationships", dest="relationships",
+			default=None, type="int",
+			help="Number of relationships (defaults to the number of entities)")
+	parser.add_option("-d", "--depth", dest="depth",
+			default=2, type="int",
+			help="Max depth of specialisation hierarchies")
+	parser.add_option("-c", "--composite-depth", dest="compositeDepth",
+			default=1, type="int",
+			help="Max depth of composite attributes")
+	parser.add_option("-w", "--weak-ratio", dest="weakRatio",
+			default=0.1, type="float",
+			help="Fraction of entities which are weak entities")
+	parser.add_option("-s", "--spec-ratio", dest="specRatio",
+			default=0.2, type="float",
+			help="Fraction of entities which are subclasses of other entities")
+	parser.add_option("-a", "--attributes", dest="attributes",
+			default=4, type="int",
+			help="Number of non-key attributes per entity")
+	parser.add_option("--seed", dest="seed",
+			default=0, type="int",
+			help="Seed for the random choices (the same seed gives the same schema)")
+	parser.add_option("-o", "--output", dest="output",
+			default=None, type="string",
+			help="File to write the schema to (defaults to stdout)")
+
+	# parse commandline options
+	(options, args) = parser.parse_args()
+
+	params = SchemaParams(options.entities, options.relationships, options.depth, options.compositeDepth,
+						  options.weakRatio, options.specRatio, options.attributes, options.seed);
+
+	if options.output:
+		generateFile(options.output, params);
+	else:
+		generateSchema(sys.stdout, params);
+
+if __name__ == '__main__':
+	main();
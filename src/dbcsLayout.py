@@ -0,0 +1,572 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Built-in layout engine, for producing diagrams without GraphViz.
+#
+# The graph of entities/relationships/attributes is laid out in-process using
+# a force-directed (spring-electrical) method, and then drawn directly as SVG
+# using the same Chen-style shapes as the GraphViz version. NumPy is used to
+# vectorise the layout iterations when it is available, otherwise a (much slower)
+# pure-Python version is used, which is still fine for small diagrams.
+
+import math
+import random
+
+from xml.sax.saxutils import escape, quoteattr
+
+try:
+	import numpy
+except ImportError:
+	numpy = None;
+
+from dbcsTypes import *
+
+##################################
+# GRAPH
+
+# Kinds of nodes
+NODE_ENTITY = "entity";
+NODE_REL = "rel";
+NODE_ATTR = "attr";
+NODE_SPEC = "spec";
+
+# approximate width of a character in the labels (at the font size used)
+CHAR_WIDTH = 7.0;
+
+# number of pixels per unit of edge length (i.e. the 'len' used for GraphViz)
+LENGTH_SCALE = 72.0;
+
+# A node in the graph to lay out
+class LayoutNode:
+	__slots__ = [
+		'name',			# identifier of node (as used in the .dot version)
+		'kind',			# type of node (NODE_*)
+		'label',		# text to show on node
+
+		'width',		# size of node
+		'height',
+
+		'double',		# draw with a double border
+		'dashed',		# draw with a dashed border
+		'underline',	# underline the label (for keys)
+
+		'x',			# position of the centre of the node (after layout)
+		'y',
+	]
+
+	# Constructor
+	def __init__ (self, name, kind, label):
+		self.name = name;
+		self.kind = kind;
+		self.label = label;
+
+		# size depends on the shape used
+		textWidth = len(label) * CHAR_WIDTH;
+		if kind == NODE_ENTITY:
+			self.width, self.height = max(54.0, textWidth + 24.0), 36.0;
+		elif kind == NODE_REL:
+			self.width, self.height = max(72.0, textWidth * 1.6 + 24.0), 44.0;
+		elif kind == NODE_ATTR:
+			self.width, self.height = max(48.0, textWidth * 1.2 + 16.0), 28.0;
+		else:
+			self.width, self.height = 24.0, 24.0;
+
+		self.double = False;
+		self.dashed = False;
+		self.underline = False;
+
+		self.x = 0.0;
+		self.y = 0.0;
+
+	# get the point where a line from the centre of the node towards (x,y) crosses its border
+	def getBoundaryPoint (self, x, y):
+		dx = x - self.x;
+		dy = y - self.y;
+		if (dx == 0) and (dy == 0):
+			return (self.x, self.y);
+
+		a = self.width / 2.0;
+		b = self.height / 2.0;
+
+		if self.kind == NODE_ENTITY:
+			# box
+			t = min(a / abs(dx) if dx else 1e9, b / abs(dy) if dy else 1e9);
+		elif self.kind == NODE_REL:
+			# diamond
+			t = 1.0 / ((abs(dx) / a) + (abs(dy) / b));
+		else:
+			# ellipse or circle
+			t = 1.0 / math.sqrt((dx / a) ** 2 + (dy / b) ** 2);
+
+		return (self.x + dx * t, self.y + dy * t);
+
+# A link between two nodes in the graph
+class LayoutEdge:
+	__slots__ = [
+		'a',			# indices of the nodes at either end
+		'b',
+		'length',		# ideal length of the edge (in the same units as GraphViz 'len')
+		'label',		# text to show on the middle of the edge (or None)
+
+		'double',		# draw as a pair of parallel lines (i.e. total specialisation)
+		'arrow',		# draw an arrow at the 'b' end
+	]
+
+	# Constructor
+	def __init__ (self, a, b, length, label=None, double=False, arrow=False):
+		self.a = a;
+		self.b = b;
+		self.length = length;
+		self.label = label;
+		self.double = double;
+		self.arrow = arrow;
+
+# The graph to lay out
+class LayoutGraph:
+	__slots__ = [
+		'title',		# lines of text for the title of the diagram
+		'nodes',		# list of nodes
+		'edges',		# list of edges
+		'index',		# node name -> index of node in list
+	]
+
+	# Constructor
+	def __init__ (self, title):
+		self.title = title;
+		self.nodes = [];
+		self.edges = [];
+		self.index = {};
+
+	# add a node, returning its index
+	def addNode (self, name, kind, label):
+		node = LayoutNode(name, kind, label);
+
+		self.index[name] = len(self.nodes);
+		self.nodes.append(node);
+		return node;
+
+	# add an edge between the nodes with the given names
+	def addEdge (self, aName, bName, length, label=None, double=False, arrow=False):
+		self.edges.append(LayoutEdge(self.index[aName], self.index[bName], length, label, double, arrow));
+
+# -----------
+
+# add the given attribute (and its components) to the graph
+def _addAttribute (graph, owner_name, attr):
+	# NOTE: names match those used in the .dot version
+	aName = "%s_a%s" % (owner_name, attr.name);
+
+	node = graph.addNode(aName, NODE_ATTR, attr.name);
+	if isinstance(attr, MultiAttr):
+		node.double = True;
+	elif isinstance(attr, DerivedAttr):
+		node.dashed = True;
+	elif attr.key:
+		node.underline = True;
+	graph.addEdge(owner_name, aName, 0.5);
+
+	for subAttr in attr.components:
+		_addAttribute(graph, aName, subAttr);
+
+# build the graph to lay out for the given model
+def buildGraph (model):
+	# title
+	title = [model.name];
+	if len(model.description):
+		title.append(model.description);
+	title.append("by %s" % (model.getAuthorsString()));
+
+	graph = LayoutGraph(title);
+
+	# entities and their attributes
+	for entity in model.entities:
+		node = graph.addNode(entity.name, NODE_ENTITY, entity.name);
+		node.double = isinstance(entity, WeakEntity);
+
+		for attr in entity.attributes:
+			_addAttribute(graph, entity.name, attr);
+
+	# specialisations
+	for entity in model.entities:
+		for i,spec in enumerate(entity.specialisations):
+			owner_name = entity.name;
+
+			# specialisation circle - only if it has more than 1 derived entity
+			if len(spec.derived_entities) > 1:
+				my_name = "%s_s%d" % (owner_name, i);
+
+				if isinstance(spec, DisjointSpec):
+					label = "d";
+				elif isinstance(spec, OverlapSpec):
+					label = "o";
+				else:
+					label = "";
+				graph.addNode(my_name, NODE_SPEC, label);
+				graph.addEdge(owner_name, my_name, 1.5, spec.role, double=spec.total);
+
+				owner_name = my_name;
+
+			for dEntity in spec.derived_entities:
+				graph.addEdge(owner_name, dEntity.name, 1.3, arrow=True);
+
+	# relationships, their attributes, and links to entities
+	for rel in model.relationships:
+		node = graph.addNode(rel.name, NODE_REL, rel.name);
+		node.double = isinstance(rel, IdentifyingRel);
+
+		for attr in rel.attributes:
+			_addAttribute(graph, rel.name, attr);
+
+		for link in rel.links:
+			graph.addEdge(link.entity.name, rel.name, 1.0, "(%s,%s)" % tuple(link.structCon));
+
+	return graph;
+
+##################################
+# LAYOUT
+
+# strength of the repulsion between all nodes
+REPULSION = 0.2;
+
+# fraction of the remaining 'temperature' (max distance nodes can move) kept after each iteration
+COOLING = 0.97;
+
+# max number of node pairs to work out the repulsion between at once (when using NumPy)
+# NOTE: this keeps the temporary arrays small enough to stay in the CPU cache, instead
+#		of taking memory proportional to n*n (i.e. gigabytes for a few thousand nodes)
+BLOCK_SIZE = 1 << 16;
+
+# get the ideal length (in pixels) of each edge, allowing for the sizes of the nodes on each end
+def _edgeLengths (graph):
+	nodes = graph.nodes;
+	lengths = [];
+	for edge in graph.edges:
+		a = nodes[edge.a];
+		b = nodes[edge.b];
+		lengths.append(edge.length * LENGTH_SCALE + (a.width + b.width) / 4.0);
+	return lengths;
+
+# get random starting positions for the nodes
+def _initialPositions (graph, seed):
+	rng = random.Random(seed);
+	size = math.sqrt(len(graph.nodes)) * LENGTH_SCALE;
+	return [(rng.random() * size, rng.random() * size) for node in graph.nodes];
+
+# lay out the graph, using NumPy
+def _layoutNumpy (graph, iterations, seed):
+	n = len(graph.nodes);
+
+	pos = numpy.array(_initialPositions(graph, seed), dtype=float);
+	xs = pos[:, 0].copy();
+	ys = pos[:, 1].copy();
+	src = numpy.array([edge.a for edge in graph.edges], dtype=int);
+	dst = numpy.array([edge.b for edge in graph.edges], dtype=int);
+	lengths = numpy.array(_edgeLengths(graph), dtype=float);
+
+	k2 = REPULSION * (numpy.mean(lengths) ** 2 if len(lengths) else LENGTH_SCALE ** 2);
+	temp = math.sqrt(n) * LENGTH_SCALE / 4.0;
+
+	# number of nodes to work out the repulsion on at once
+	rows = max(1, BLOCK_SIZE // max(n, 1));
+
+	dispX = numpy.empty(n);
+	dispY = numpy.empty(n);
+
+	for it in xrange(iterations):
+		# repulsion between all pairs of nodes: k^2/d along the line between them
+		# NOTE: x and y are done separately (and the temporaries reused in place),
+		#		since building an n*n*2 array of deltas each time is several times slower
+		for start in xrange(0, n, rows):
+			end = min(start + rows, n);
+
+			dx = xs[start:end, numpy.newaxis] - xs;
+			dy = ys[start:end, numpy.newaxis] - ys;
+
+			f = dx * dx;
+			f += dy * dy;
+			f += 1e-6;
+			numpy.divide(k2, f, f);
+
+			dx *= f;
+			dy *= f;
+			dx.sum(axis=1, out=dispX[start:end]);
+			dy.sum(axis=1, out=dispY[start:end]);
+
+		# springs along the edges, pulling them towards their ideal lengths
+		if len(src):
+			ex = xs[src] - xs[dst];
+			ey = ys[src] - ys[dst];
+			elen = numpy.sqrt(ex * ex + ey * ey) + 1e-6;
+			force = (elen - lengths) / elen;
+
+			dispX -= numpy.bincount(src, weights=ex * force, minlength=n);
+			dispX += numpy.bincount(dst, weights=ex * force, minlength=n);
+			dispY -= numpy.bincount(src, weights=ey * force, minlength=n);
+			dispY += numpy.bincount(dst, weights=ey * force, minlength=n);
+
+		# move nodes, but no further than the current temperature allows
+		dispLen = numpy.sqrt(dispX * dispX + dispY * dispY) + 1e-6;
+		scale = numpy.minimum(dispLen, temp) / dispLen;
+		xs += dispX * scale;
+		ys += dispY * scale;
+		temp *= COOLING;
+
+	return [(float(x), float(y)) for x, y in zip(xs, ys)];
+
+# lay out the graph, using plain Python
+def _layoutPython (graph, iterations, seed):
+	n = len(graph.nodes);
+
+	pos = _initialPositions(graph, seed);
+	xs = [p[0] for p in pos];
+	ys = [p[1] for p in pos];
+	edges = [(edge.a, edge.b, length) for edge, length in zip(graph.edges, _edgeLengths(graph))];
+
+	if edges:
+		k2 = REPULSION * (sum([e[2] for e in edges]) / len(edges)) ** 2;
+	else:
+		k2 = REPULSION * LENGTH_SCALE ** 2;
+	temp = math.sqrt(n) * LENGTH_SCALE / 4.0;
+
+	for it in xrange(iterations):
+		dx = [0.0] * n;
+		dy = [0.0] * n;
+
+		# repulsion between all pairs of nodes
+		for i in xrange(n):
+			xi = xs[i];
+			yi = ys[i];
+			for j in xrange(i + 1, n):
+				ddx = xi - xs[j];
+				ddy = yi - ys[j];
+				f = k2 / (ddx * ddx + ddy * ddy + 1e-6);
+				dx[i] += ddx * f;
+				dy[i] += ddy * f;
+				dx[j] -= ddx * f;
+				dy[j] -= ddy * f;
+
+		# springs along the edges
+		for a, b, length in edges:
+			ddx = xs[a] - xs[b];
+			ddy = ys[a] - ys[b];
+			dlen = math.sqrt(ddx * ddx + ddy * ddy) + 1e-6;
+			f = (dlen - length) / dlen;
+			dx[a] -= ddx * f;
+			dy[a] -= ddy * f;
+			dx[b] += ddx * f;
+			dy[b] += ddy * f;
+
+		# move nodes, but no further than the current temperature allows
+		for i in xrange(n):
+			dlen = math.sqrt(dx[i] * dx[i] + dy[i] * dy[i]) + 1e-6;
+			f = min(dlen, temp) / dlen;
+			xs[i] += dx[i] * f;
+			ys[i] += dy[i] * f;
+		temp *= COOLING;
+
+	return zip(xs, ys);
+
+# move nodes apart until none of them overlap
+# NOTE: each overlapping pair is pushed apart along the direction in which they
+#		overlap the least, which keeps the overall shape of the layout
+def _removeOverlaps (graph, positions, maxPasses=100):
+	nodes = graph.nodes;
+	xs = [p[0] for p in positions];
+	ys = [p[1] for p in positions];
+
+	# widest node, for working out how far along the x-axis two nodes can overlap
+	maxWidth = max([node.width for node in nodes]);
+
+	for it in xrange(maxPasses):
+		moved = False;
+
+		# sweep along the x-axis, only checking each node against the ones
+		# close enough to it along the x-axis that they could overlap
+		# NOTE: the order goes out of date as nodes get moved during a pass, but
+		#		any pass where something moved gets followed by another (with a fresh
+		#		order), so the last pass always sees all the overlaps that are left
+		order = sorted(xrange(len(nodes)), key=xs.__getitem__);
+
+		for oi in xrange(len(order)):
+			i = order[oi];
+			reach = (nodes[i].width + maxWidth) / 2.0 + 4.0;
+
+			for oj in xrange(oi + 1, len(order)):
+				j = order[oj];
+				dx = xs[j] - xs[i];
+				if dx >= reach:
+					break;
+				dy = ys[j] - ys[i];
+
+				# gaps needed between centres (with a bit of padding)
+				overlapX = (nodes[i].width + nodes[j].width) / 2.0 + 4.0 - abs(dx);
+				overlapY = (nodes[i].height + nodes[j].height) / 2.0 + 4.0 - abs(dy);
+
+				if (overlapX > 0) and (overlapY > 0):
+					# push each node half of the way
+					if overlapX < overlapY:
+						shift = (overlapX / 2.0) * (1 if dx >= 0 else -1);
+						xs[i] -= shift;
+						xs[j] += shift;
+					else:
+						shift = (overlapY / 2.0) * (1 if dy >= 0 else -1);
+						ys[i] -= shift;
+						ys[j] += shift;
+					moved = True;
+
+		if not moved:
+			break;
+
+	return zip(xs, ys);
+
+# -----------
+
+# Lay out the graph, setting the positions of its nodes
+#	iterations: number of iterations of the force-directed method to perform
+#	seed: seed for the random starting positions (the same seed gives the same layout)
+#	useNumpy: use the NumPy version (if None, it is used when it's available)
+def layoutGraph (graph, iterations=200, seed=0, useNumpy=None):
+	if len(graph.nodes) == 0:
+		return;
+
+	if useNumpy is None:
+		useNumpy = (numpy is not None);
+
+	if useNumpy:
+		positions = _layoutNumpy(graph, iterations, seed);
+	else:
+		positions = _layoutPython(graph, iterations, seed);
+
+	# spread things out so that nothing overlaps
+	positions = _removeOverlaps(graph, positions);
+
+	for node, (x, y) in zip(graph.nodes, positions):
+		node.x = x;
+		node.y = y;
+
+##################################
+# SVG OUTPUT
+
+# colours of the nodes (the same as the GraphViz version)
+FILL_COLOURS = {
+	NODE_ENTITY : "#b2dfee",	# lightblue2
+	NODE_REL    : "#eee0e5",	# lavenderblush2
+	NODE_ATTR   : "#e0ffff",	# lightcyan1
+	NODE_SPEC   : "#f7f7f7",	# grey97
+}
+
+FONT = 'font-family="Times,serif" font-size="12"';
+MARGIN = 20.0;
+TITLE_LINE_HEIGHT = 16.0;
+
+# get the SVG for the outline of the node (offset outwards by 'inset' pixels, when -ve)
+def _nodeShape (node, inset=0.0):
+	x, y = node.x, node.y;
+	a = node.width / 2.0 - inset;
+	b = node.height / 2.0 - inset;
+
+	if node.kind == NODE_ENTITY:
+		return '<rect x="%.1f" y="%.1f" width="%.1f" height="%.1f"' % (x - a, y - b, a * 2, b * 2);
+	elif node.kind == NODE_REL:
+		return '<polygon points="%.1f,%.1f %.1f,%.1f %.1f,%.1f %.1f,%.1f"' % (x, y - b, x + a, y, x, y + b, x - a, y);
+	else:
+		return '<ellipse cx="%.1f" cy="%.1f" rx="%.1f" ry="%.1f"' % (x, y, a, b);
+
+# generate the SVG for the node
+def _emitNode (node):
+	style = ' fill="%s" stroke="black"' % FILL_COLOURS[node.kind];
+	if node.dashed:
+		style += ' stroke-dasharray="5,2"';
+	yield '%s%s/>\n' % (_nodeShape(node), style);
+
+	if node.double:
+		yield '%s fill="none" stroke="black"/>\n' % _nodeShape(node, 4.0);
+
+	if node.label:
+		decoration = ' text-decoration="underline"' if node.underline else '';
+		yield '<text x="%.1f" y="%.1f" text-anchor="middle" %s%s>%s</text>\n' % (node.x, node.y + 4.0, FONT, decoration, escape(node.label));
+
+# generate the SVG for the edge
+def _emitEdge (graph, edge):
+	a = graph.nodes[edge.a];
+	b = graph.nodes[edge.b];
+
+	# clip the line to the borders of the nodes
+	x1, y1 = a.getBoundaryPoint(b.x, b.y);
+	x2, y2 = b.getBoundaryPoint(a.x, a.y);
+
+	if edge.double:
+		# pair of parallel lines
+		dx, dy = x2 - x1, y2 - y1;
+		d = math.sqrt(dx * dx + dy * dy) or 1.0;
+		ox, oy = -dy / d * 1.5, dx / d * 1.5;
+		for s in (1, -1):
+			yield '<line x1="%.1f" y1="%.1f" x2="%.1f" y2="%.1f" stroke="black"/>\n' % (x1 + ox*s, y1 + oy*s, x2 + ox*s, y2 + oy*s);
+	else:
+		yield '<line x1="%.1f" y1="%.1f" x2="%.1f" y2="%.1f" stroke="black"/>\n' % (x1, y1, x2, y2);
+
+	if edge.arrow:
+		# arrowhead at the 'b' end
+		dx, dy = x2 - x1, y2 - y1;
+		d = math.sqrt(dx * dx + dy * dy) or 1.0;
+		ux, uy = dx / d, dy / d;
+		bx, by = x2 - ux * 10.0, y2 - uy * 10.0;
+		yield '<polygon points="%.1f,%.1f %.1f,%.1f %.1f,%.1f" fill="black"/>\n' % (x2, y2, bx - uy * 4.0, by + ux * 4.0, bx + uy * 4.0, by - ux * 4.0);
+
+	if edge.label:
+		yield '<text x="%.1f" y="%.1f" text-anchor="middle" %s>%s</text>\n' % ((x1 + x2) / 2.0, (y1 + y2) / 2.0 - 3.0, FONT, escape(edge.label));
+
+# generate the SVG text for the (laid out) graph
+def emitSVG (graph):
+	# bounds of the diagram
+	if graph.nodes:
+		minX = min([n.x - n.width / 2.0 for n in graph.nodes]);
+		maxX = max([n.x + n.width / 2.0 for n in graph.nodes]);
+		minY = min([n.y - n.height / 2.0 for n in graph.nodes]);
+		maxY = max([n.y + n.height / 2.0 for n in graph.nodes]);
+	else:
+		minX = maxX = minY = maxY = 0.0;
+
+	titleHeight = len(graph.title) * TITLE_LINE_HEIGHT;
+	width = (maxX - minX) + MARGIN * 2;
+	height = (maxY - minY) + MARGIN * 3 + titleHeight;
+
+	yield '<?xml version="1.0" encoding="UTF-8" standalone="no"?>\n';
+	yield '<svg xmlns="http://www.w3.org/2000/svg" width="%.0fpt" height="%.0fpt" viewBox="%.1f %.1f %.1f %.1f">\n' % (width, height, minX - MARGIN, minY - MARGIN, width, height);
+	yield '<title>%s</title>\n' % escape(graph.title[0]);
+	yield '<rect x="%.1f" y="%.1f" width="%.1f" height="%.1f" fill="white"/>\n' % (minX - MARGIN, minY - MARGIN, width, height);
+
+	# edges go under the nodes
+	for edge in graph.edges:
+		for chunk in _emitEdge(graph, edge):
+			yield chunk;
+
+	for node in graph.nodes:
+		yield '<g id=%s>\n' % quoteattr(node.name);
+		for chunk in _emitNode(node):
+			yield chunk;
+		yield '</g>\n';
+
+	# title
+	y = maxY + MARGIN * 2;
+	for line in graph.title:
+		yield '<text x="%.1f" y="%.1f" text-anchor="middle" %s>%s</text>\n' % ((minX + maxX) / 2.0, y, FONT, escape(line));
+		y += TITLE_LINE_HEIGHT;
+
+	yield '</svg>\n';
+
+# -----------
+
+# Get the SVG diagram for the model, laid out with the built-in engine
+def getSVGText (model, iterations=200, seed=0):
+	graph = buildGraph(model);
+	layoutGraph(graph, iterations, seed);
+	return "".join(emitSVG(graph));
+
+# Write an SVG diagram for the model, laid out with the built-in engine
+def renderSVG (model, fileN, iterations=200, seed=0):
+	f = open(fileN, 'w');
+	try:
+		f.write(getSVGText(model, iterations, seed));
+	finally:
+		f.close();
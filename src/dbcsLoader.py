@@ -5,49 +5,259 @@
 
 import sys
 import os
+import gc
 
-from dbcsTypes import *
+import imp
+import marshal
+import struct
+import hashlib
+import cPickle
+
+import dbcsTypes
+import dbcsSafeLoader
+import dbcsCompact
+
+###############################
+# LOADER NAMESPACES
+
+# Cached copy of the symbols which .dbcs files can use (i.e. everything that
+# 'from dbcsTypes import *' would give). This is only built once, and then 
+# copied for each file that gets loaded.
+_base_namespace = None;
+
+# Get a fresh namespace to evaluate a .dbcs file in
+# NOTE: each file gets its own namespace so that 'model' and the other variables
+#		defined by one file don't leak into (or stay alive for) later ones
+#	fileN: name of file that will be evaluated in the namespace
+def newNamespace (fileN):
+	global _base_namespace;
+	
+	# build the cached set of symbols on first use
+	if _base_namespace is None:
+		_base_namespace = {};
+		for name, value in vars(dbcsTypes).iteritems():
+			if not name.startswith('_'):
+				_base_namespace[name] = value;
+	
+	# copy, and add the per-file info
+	d = _base_namespace.copy();
+	d['__name__'] = "__dbcs__";
+	d['__file__'] = fileN;
+	
+	return d;
+
+###############################
+# SOURCE STAMPS
+
+# Get a 'stamp' identifying the given version of a .dbcs file, for checking 
+# whether cached data derived from it is still valid
+#	fileN: (absolute) name of the file the source came from
+#	source: contents of the file
+def getSourceStamp (fileN, source):
+	# cached data is only valid for this path, modification time, and contents
+	digest = hashlib.sha1(fileN + "\0" + source).digest();
+	return struct.pack("<d", os.path.getmtime(fileN)) + digest;
+
+###############################
+# BYTECODE CACHE
+
+# Compiled versions of the .dbcs files get stored in a cache folder next to them
+# (just like Python does for modules), so that unchanged files don't need to be 
+# parsed and compiled again each time they get loaded.
+USE_BYTECODE_CACHE = True;
+
+# identifies the cache file format and the Python version that wrote it
+# (marshalled code can't be shared between Python versions)
+_BYTECODE_MAGIC = "DBCC" + imp.get_magic();
+
+# write data to the given cache file, without ever failing
+# NOTE: the cache is just an optimisation, so if it can't be written (i.e. read-only 
+#		folders), we simply carry on without it
+def writeCacheFile (cacheN, data):
+	try:
+		# make sure the cache folder exists
+		cacheDir = os.path.dirname(cacheN);
+		if not os.path.isdir(cacheDir):
+			os.makedirs(cacheDir);
+		
+		# write to a temp file first, and then swap it in, so that other 
+		# processes never see half-written files
+		tempN = "%s.%d.tmp" % (cacheN, os.getpid());
+		f = open(tempN, 'wb');
+		try:
+			f.write(data);
+		finally:
+			f.close();
+		
+		if os.name == 'nt' and os.path.exists(cacheN):
+			os.remove(cacheN); # rename() can't overwrite on Windows
+		os.rename(tempN, cacheN);
+	except (IOError, OSError):
+		pass;
+
+# read the data from the given cache file (or None if it can't be read)
+def readCacheFile (cacheN):
+	try:
+		f = open(cacheN, 'rb');
+		try:
+			return f.read();
+		finally:
+			f.close();
+	except (IOError, OSError):
+		return None;
+
+# Get the compiled code for the given .dbcs file, using the cached version if possible
+# 	fileN: (absolute) name of the file the source came from
+#	source: contents of the file
+#	stamp: source stamp for the file (if already known)
+def compileDBCS (fileN, source, stamp=None):
+	# just compile if we're not caching
+	if not USE_BYTECODE_CACHE:
+		return compile(source, fileN, 'exec');
+	
+	# cached code is only valid for this version of the file
+	if stamp is None:
+		stamp = getSourceStamp(fileN, source);
+	header = _BYTECODE_MAGIC + stamp;
+	
+	# try to use the cached version first
+	cacheN = getCacheFilename(fileN, "dbcsc");
+	data = readCacheFile(cacheN);
+	
+	if data and data.startswith(header):
+		try:
+			return marshal.loads(data[len(header):]);
+		except (EOFError, ValueError, TypeError):
+			pass; # corrupted cache file, so just compile again
+	
+	# compile, and store the result for next time
+	code = compile(source, fileN, 'exec');
+	writeCacheFile(cacheN, header + marshal.dumps(code));
+	
+	return code;
+
+###############################
+# MODEL SNAPSHOTS
+
+# Finished models get saved as a (pickled) snapshot next to the .dbcs file, 
+# so that loading an unchanged file doesn't need to run the script again 
+# (i.e. thousands of constructor calls and name validations for big schemas).
+# NOTE: these are off by default (i.e. turned on using --snapshots), since unpickling 
+#		all the objects in a normal model is slower than just running the cached bytecode. 
+#		Compact models are just a few flat tables though, and load many times faster this way.
+# WARNING: loading a snapshot is as dangerous as running the script it came from,
+#		   so these shouldn't be used for untrusted files
+USE_MODEL_SNAPSHOTS = False;
+
+# identifies the snapshot format and the version of the types stored
+_SNAPSHOT_MAGIC = "DBCM%d.%d" % (cPickle.HIGHEST_PROTOCOL, dbcsTypes.MODEL_VERSION);
+
+# get the name of the snapshot file for the given .dbcs file
+# NOTE: compact models get snapshots of their own, so that switching back and forth doesn't keep replacing them
+def getSnapshotFilename (fileN):
+	if USE_COMPACT_MODELS:
+		return changeExtension(fileN, "dbcsmc");
+	return changeExtension(fileN, "dbcsm");
+
+# Get the model stored in the snapshot for the given .dbcs file (or None if there's no valid one)
+#	fileN: (absolute) name of the .dbcs file
+#	stamp: source stamp for the current version of the file
+def loadSnapshot (fileN, stamp):
+	data = readCacheFile(getSnapshotFilename(fileN));
+	header = _SNAPSHOT_MAGIC + stamp;
+	
+	if data and data.startswith(header):
+		try:
+			model = cPickle.loads(data[len(header):]);
+		except Exception:
+			return None; # corrupted or outdated snapshot, so the script needs to be run again
+		
+		if isinstance(model, dbcsTypes.Model):
+			return model;
+	return None;
+	
+# Save a snapshot of the model created by the given .dbcs file
+#	fileN: (absolute) name of the .dbcs file
+#	stamp: source stamp for the version of the file the model was created from
+#	model: the model created
+def saveSnapshot (fileN, stamp, model):
+	try:
+		data = cPickle.dumps(model, cPickle.HIGHEST_PROTOCOL);
+	except (cPickle.PicklingError, TypeError, RuntimeError):
+		return; # something in the model can't be saved (or is nested too deeply)
+	
+	writeCacheFile(getSnapshotFilename(fileN), _SNAPSHOT_MAGIC + stamp + data);
+
+###############################
+# COMPACT MODELS
+
+# Load models as compact models (see dbcsCompact), which take much less memory for very big schemas.
+# The items in these can't be changed once loaded though.
+USE_COMPACT_MODELS = False;
 
 ###############################
 # READ FUNCTIONS
 
 # Main API function for this, returning the created model
 #	fileN: name of file to load
-def readDBCS (fileN):
-	# FIXME: temp hack - just eval all into global dict... otherwise we get too many type conflicts that won't work :/ 
-	if False: # XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
- 		# create a new dict to hold the results of evaluating this file
-		d = {}
-		
-		# now, firstly import the dbcs types into this dict so that
-		# evaluating the file later will work
-		try:
-			execfile("dbcsTypes.py", d);
-		except:
-			# HACK: for convenience when running from same dir as the descriptions
-			execfile("engine/dbcsTypes.py", d);
-	else: # XXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXXX
-		d = globals();
-	
-	# secondly, 'execute' the file the user has given us into this dict
-	# too, but be prepared for errors:
+#	restricted: only evaluate the dbcs mini-language instead of running the file as
+#				a Python script (for untrusted files). No cached data is used for these.
+def readDBCS (fileN, restricted=False):
+	# check if the filename is valid before executing...
+	if not os.path.exists(fileN):
+		# file doesn't exist, so we shouldn't throw a nasty error...
+		sys.stderr.write("ERROR: invalid filename %s \n" % fileN);
+		return None
+	
+	# NOTE: absolute path is used, so that the cached data always refers to the same file
+	fileN = os.path.abspath(fileN);
+	
+	# 'execute' the file the user has given us, but be prepared for errors:
+	# NOTE: the garbage collector is paused while the model gets built, since it would otherwise
+	#		keep scanning all the (long-lived) items created so far, which takes longer than building them
+	gcEnabled = gc.isenabled();
+	gc.disable();
 	try:
-		# check if the filename is valid before executing...
-		if os.path.exists(fileN):
-			# file exists, so try to process it
-			execfile(fileN, d);
+		f = open(fileN, 'rb');
+		try:
+			source = f.read();
+		finally:
+			f.close();
+		
+		if restricted:
+			# evaluate the mini-language only
+			d = dbcsSafeLoader.evalDBCS(fileN, source);
 		else:
-			# file doesn't exist, so we shouldn't throw a nasty error...
-			sys.stderr.write("ERROR: invalid filename %s \n" % fileN);
-			return None
+			stamp = getSourceStamp(fileN, source);
+			
+			# an up-to-date snapshot of the model can be used instead of running the file
+			if USE_MODEL_SNAPSHOTS:
+				model = loadSnapshot(fileN, stamp);
+				if model is not None:
+					return model;
+			
+			# create a new dict to hold the results of evaluating this file, and run it
+			d = newNamespace(fileN);
+			exec compileDBCS(fileN, source, stamp) in d;
 	except:
 		sys.stderr.write("ERROR: an error in the input file %s was encountered while reading. Details follow...\n" % fileN);
 		# ...
 		raise; # XXX: we should try to nicely format the error to expose only what the user needs to know...
+	finally:
+		if gcEnabled:
+			gc.enable();
 		
 	# try to return the model created
-	if d.has_key('model'):
-		return d['model'];
+	model = d.get('model');
+	if isinstance(model, dbcsTypes.Model):
+		if USE_COMPACT_MODELS:
+			model = dbcsCompact.compactModel(model);
+			d = None; # let the original items go
+		
+		# save the model for next time
+		if USE_MODEL_SNAPSHOTS and not restricted:
+			saveSnapshot(fileN, stamp, model);
+		return model;
 	else:
 		sys.stderr.write("ERROR: no model with identifier 'model = Model(...)' was found\n");
 		return None;
@@ -58,5 +268,11 @@ def readDBCS (fileN):
 # change extension of the filename
 def changeExtension (fileN, newExt):
 	return os.path.splitext(fileN)[0] + "." + newExt;
+	
+# get the name of the cache file (with the given extension) for the given file
+# NOTE: cache files live in a __pycache__ folder alongside the file
+def getCacheFilename (fileN, cacheExt):
+	dirN, baseN = os.path.split(fileN);
+	return os.path.join(dirN, "__pycache__", os.path.splitext(baseN)[0] + "." + cacheExt);
 
 ###############################
@@ -0,0 +1,376 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Splitting up huge schemas into smaller parts which can be drawn separately
+# (since GraphViz takes forever to lay out thousands of entities as one graph,
+# and the result is unreadable anyway). Models can be split up into:
+#	- connected components (i.e. groups of items which aren't linked to each other at all)
+#	- specialisation hierarchies (with the entities around them)
+#	- subject areas given in a separate file (see readAreas())
+#
+# Each entity belongs to one part, with relationships going into the part that
+# most of their participants are in. Links to entities in other parts are
+# shown using 'stubs' for those entities (see dbcs2Graph.emitPartialGraph).
+#
+# The part of a model around a single entity can also be picked out, so that
+# only that needs to be drawn (see getNeighbourhood()).
+
+import re
+
+from dbcsTypes import *
+
+###############################
+# PARTITIONS
+
+# name of the part that everything left over goes into
+OTHER_NAME = "Other";
+
+# One part of a partitioned model
+class Partition (object):
+	__slots__ = [
+		'name',				# name of the part (i.e. for titles)
+		'key',				# identifier for the part (used in filenames and node names), unique within the model
+		'entities',			# entities in this part (in the order they are in the model)
+		'relationships',	# relationships in this part (in the order they are in the model)
+	]
+
+	# Constructor
+	def __init__ (self, name, entities=None):
+		self.name = name;
+		self.key = None;
+		self.entities = entities or [];
+		self.relationships = [];
+
+# helper function (private) - get an identifier for a part from its name
+# NOTE: anything which can't go in a filename gets replaced
+def _make_key (name):
+	return re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_") or "part";
+
+# helper function (private) - give each part a unique key, and put each relationship into a part
+def _finish_partitions (model, partitions):
+	# keys
+	# NOTE: "overview" is reserved for the diagram linking the parts together
+	used = set(["overview"]);
+	for part in partitions:
+		key = base = _make_key(part.name);
+		i = 2;
+		while key in used:
+			key = "%s_%d" % (base, i);
+			i += 1;
+		used.add(key);
+		part.key = key;
+
+	# relationships go into the part that most of their participants are in
+	# NOTE: ties go to the part with the earliest participant
+	partOf = getEntityPartitions(partitions);
+	for rel in model.relationships:
+		counts = {};
+		best = None;
+		for link in rel.links:
+			part = partOf.get(link.entity);
+			if part is None:
+				continue;
+
+			counts[part] = counts.get(part, 0) + 1;
+			if (best is None) or (counts[part] > counts[best]):
+				best = part;
+
+		if best is None:
+			# not linked to anything in the model, so it just goes in the first part
+			best = partitions[0];
+		best.relationships.append(rel);
+
+	return partitions;
+
+# get a dict of entity -> part that it is in
+def getEntityPartitions (partitions):
+	partOf = {};
+	for part in partitions:
+		for entity in part.entities:
+			partOf[entity] = part;
+	return partOf;
+
+# helper function (private) - get the entities that the given entity is linked to (including ones which aren't in the model)
+#	relationships: include links through relationships (otherwise only specialisations are followed)
+def _get_linked (model, entity, relationships):
+	linked = model.getEntitySuperclasses(entity);
+	for spec in entity.specialisations:
+		linked.extend(spec.derived_entities);
+	if relationships:
+		for rel in model.getEntityRelationships(entity):
+			linked.extend([link.entity for link in rel.links]);
+	return linked;
+
+# helper function (private) - get the groups of entities which are linked to each other
+#	relationships: include links through relationships (otherwise only specialisations are followed)
+# < returns: list of lists of entities (in model order)
+def _find_components (model, relationships):
+	order = dict([(entity, i) for i, entity in enumerate(model.entities)]);
+	seen = set();
+	components = [];
+
+	for entity in model.entities:
+		if entity in seen:
+			continue;
+
+		# find everything linked to this entity
+		seen.add(entity);
+		stack = [entity];
+		component = [];
+
+		while stack:
+			current = stack.pop();
+			component.append(current);
+
+			# linked entities (only the ones which are in the model)
+			for other in _get_linked(model, current, relationships):
+				if (other in order) and (other not in seen):
+					seen.add(other);
+					stack.append(other);
+
+		component.sort(key=order.get);
+		components.append(component);
+
+	return components;
+
+# helper function (private) - put the parts with less than 'minSize' entities together into one
+def _merge_small (partitions, minSize):
+	result = [];
+	other = None;
+
+	for part in partitions:
+		if len(part.entities) >= minSize:
+			result.append(part);
+		elif other is None:
+			other = Partition(OTHER_NAME, part.entities[:]);
+		else:
+			other.entities.extend(part.entities);
+
+	if other:
+		result.append(other);
+	return result;
+
+# -----------
+
+# Split the model into its connected components
+#	minSize: components with fewer entities than this all get put together in one part
+def partitionByComponents (model, minSize=2):
+	partitions = [Partition(component[0].name, component) for component in _find_components(model, True)];
+	return _finish_partitions(model, _merge_small(partitions, minSize));
+
+# Split the model into its specialisation hierarchies
+# NOTE: entities which aren't in any hierarchy go in with the hierarchy that they share the
+#		most relationships with (or into one part for all the leftovers)
+#	minSize: hierarchies with fewer entities than this all get put together in one part
+def partitionByHierarchies (model, minSize=2):
+	partitions = [];
+	partOf = {};
+	leftovers = [];
+
+	# hierarchies (named after their root entity)
+	for component in _find_components(model, False):
+		if len(component) == 1:
+			leftovers.append(component[0]);
+			continue;
+
+		root = component[0];
+		for entity in component:
+			if not model.getEntitySuperclasses(entity):
+				root = entity;
+				break;
+
+		part = Partition(root.name, component);
+		partitions.append(part);
+		for entity in component:
+			partOf[entity] = part;
+
+	# the rest go in with their neighbours
+	other = Partition(OTHER_NAME);
+	for entity in leftovers:
+		counts = {};
+		best = None;
+		for rel in model.getEntityRelationships(entity):
+			for link in rel.links:
+				part = partOf.get(link.entity);
+				if part is None:
+					continue;
+
+				counts[part] = counts.get(part, 0) + 1;
+				if (best is None) or (counts[part] > counts[best]):
+					best = part;
+
+		if best is None:
+			other.entities.append(entity);
+		else:
+			best.entities.append(entity);
+
+	# keep the entities of each part in model order
+	order = dict([(entity, i) for i, entity in enumerate(model.entities)]);
+	for part in partitions:
+		part.entities.sort(key=order.get);
+
+	partitions = _merge_small(partitions, minSize);
+	if other.entities:
+		if partitions and (partitions[-1].name == OTHER_NAME):
+			partitions[-1].entities.extend(other.entities);
+			partitions[-1].entities.sort(key=order.get);
+		else:
+			partitions.append(other);
+	return _finish_partitions(model, partitions);
+
+# Split the model into the given subject areas
+#	areas: list of (area name, list of entity names), i.e. from readAreas()
+# NOTE: entities which aren't in any area go into one part for all the leftovers
+def partitionByAreas (model, areas):
+	partitions = [];
+	partOf = {};
+
+	for name, entityNames in areas:
+		part = Partition(name);
+		for entityName in entityNames:
+			entity = model.getItem(validateERName(entityName));
+			if not isinstance(entity, Entity):
+				raise ValueError, "Subject area '%s' includes '%s', which isn't an entity in the model" % (name, entityName)
+			if entity in partOf:
+				raise ValueError, "Entity '%s' is in both the '%s' and '%s' subject areas" % (entity.name, partOf[entity].name, name)
+
+			partOf[entity] = part;
+		partitions.append(part);
+
+	# entities go in their areas in model order
+	other = Partition(OTHER_NAME);
+	for entity in model.entities:
+		partOf.get(entity, other).entities.append(entity);
+	if other.entities:
+		partitions.append(other);
+
+	# areas without any entities are left out
+	partitions = [part for part in partitions if part.entities];
+	return _finish_partitions(model, partitions);
+
+# -----------
+
+# Read a subject areas file
+# NOTE: each line gives the name of an area followed by the names of the entities in it,
+#		separated by commas and/or spaces. Areas can be given over several lines, and
+#		anything after a '#' is ignored. For example:
+#			Sales: CUSTOMER, ORDER, INVOICE
+#			Staff: EMPLOYEE DEPARTMENT
+# < returns: list of (area name, list of entity names)
+def readAreas (fileN):
+	areas = [];
+	areaIndex = {};
+
+	f = open(fileN, 'r');
+	try:
+		for lineNo, line in enumerate(f):
+			line = line.split('#', 1)[0].strip();
+			if not line:
+				continue;
+
+			if ':' not in line:
+				raise ValueError, "%s:%d: expected 'Area Name: ENTITY, ...'" % (fileN, lineNo + 1)
+			name, entityNames = line.split(':', 1);
+			name = name.strip();
+
+			i = areaIndex.get(name);
+			if i is None:
+				i = areaIndex[name] = len(areas);
+				areas.append((name, []));
+			areas[i][1].extend(entityNames.replace(',', ' ').split());
+	finally:
+		f.close();
+
+	return areas;
+
+# -----------
+
+# ways of partitioning models
+partitionModes = ["components", "hierarchies", "areas"];
+
+# Split the model into parts
+#	mode: one of partitionModes
+#	areas: subject areas (only for "areas" mode)
+#	minSize: min number of entities in each automatically found part
+# < returns: list of Partitions
+def partitionModel (model, mode, areas=None, minSize=2):
+	if not model.entities:
+		return [];
+
+	if mode == "components":
+		return partitionByComponents(model, minSize);
+	elif mode == "hierarchies":
+		return partitionByHierarchies(model, minSize);
+	elif mode == "areas":
+		if areas is None:
+			raise ValueError, "Subject areas are needed to partition by area"
+		return partitionByAreas(model, areas);
+	else:
+		raise ValueError, "Unknown partitioning mode '%s'" % (mode)
+
+# Get the part of the model around the given entity
+# NOTE: links are followed through relationships (including identifying ones) and specialisations,
+#		with only the relationships between entities in the neighbourhood being included
+#	entityName: name of the entity (which gets validated in the same way as the names in the model)
+#	depth: max number of links to follow from the entity
+# < returns: Partition with the entities and relationships in the neighbourhood
+def getNeighbourhood (model, entityName, depth=1):
+	entity = model.getItem(validateERName(entityName));
+	if not isinstance(entity, Entity):
+		raise ValueError, "'%s' isn't an entity in the model" % (entityName)
+
+	# find everything within 'depth' links
+	# NOTE: only the entities that get reached are visited (or even looked at), so this
+	#		doesn't depend on the size of the model (i.e. compact models only make views for these)
+	included = set([entity]);
+	frontier = [entity];
+	for i in xrange(depth):
+		reached = [];
+		for current in frontier:
+			for other in _get_linked(model, current, True):
+				if (other is not None) and (other not in included) and (model.getItem(other.name) is other):
+					included.add(other);
+					reached.append(other);
+		frontier = reached;
+
+	part = Partition("Around %s (depth %d)" % (entity.name, depth), sorted(included, key=model.getItemIndex));
+	part.key = "focus_%s_%d" % (_make_key(entity.name), depth);
+
+	# relationships which only link entities in the neighbourhood
+	relationships = set();
+	for current in part.entities:
+		for rel in model.getEntityRelationships(current):
+			if (rel not in relationships) and all([link.entity in included for link in rel.links]):
+				relationships.add(rel);
+
+	part.relationships = sorted(relationships, key=model.getItemIndex);
+	return part;
+
+# Count the links between items in different parts
+# < returns: dict of (index of part, index of other part) -> number of links (with the first index being the lower one)
+def getCrossLinks (model, partitions):
+	partIndex = dict([(part, i) for i, part in enumerate(partitions)]);
+	partOf = getEntityPartitions(partitions);
+	counts = {};
+
+	def addLink (i, entity):
+		other = partOf.get(entity);
+		if other is None:
+			return;
+		j = partIndex[other];
+		if i != j:
+			key = (min(i, j), max(i, j));
+			counts[key] = counts.get(key, 0) + 1;
+
+	for i, part in enumerate(partitions):
+		# relationships linking to entities in other parts
+		for rel in part.relationships:
+			for link in rel.links:
+				addLink(i, link.entity);
+
+		# superclasses in other parts
+		for entity in part.entities:
+			for parent in model.getEntitySuperclasses(entity):
+				addLink(i, parent);
+
+	return counts;
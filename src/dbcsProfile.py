@@ -0,0 +1,214 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Instrumentation for finding out where the time goes when processing
+# dbcs files (i.e. loading, each of the validity checks, writing the .dot
+# file, and the GraphViz renders), along with counts of what was produced.
+#
+# Everything gets passed a profiler (like the reporters), with a NullProfiler
+# that does nothing being used by default so that it costs nothing when off.
+
+import sys
+import time
+import json
+
+try:
+	import resource
+except ImportError:
+	resource = None; # i.e. on Windows
+
+###############################
+# TIMERS
+
+# get the CPU time (in seconds) used by this process so far
+if resource is not None:
+	def getCPUTime ():
+		usage = resource.getrusage(resource.RUSAGE_SELF);
+		return usage.ru_utime + usage.ru_stime;
+else:
+	def getCPUTime ():
+		return time.clock();
+
+###############################
+# PROFILERS
+
+# Records timings for the phases of processing, and counts of things produced
+class Profiler:
+	# are timings actually being recorded?
+	enabled = True;
+
+	__slots__ = [
+		'phases',		# phase name -> [calls, wall time, cpu time] (times in seconds)
+		'order',		# names of phases, in the order they were first seen
+		'counters',		# counter name -> value
+		'children',		# list of dicts with the resources used by each subprocess (i.e. GraphViz renders)
+		'stack',		# (name, wall time, cpu time) for the phases currently running
+	]
+
+	# Constructor
+	def __init__ (self):
+		self.phases = {};
+		self.order = [];
+		self.counters = {};
+		self.children = [];
+		self.stack = [];
+
+	# start/end timing a phase
+	# NOTE: phases can be nested, with the time for the inner ones counting towards the outer ones too
+	def begin (self, name):
+		self.stack.append((name, time.time(), getCPUTime()));
+
+	def end (self, name):
+		beginName, wall, cpu = self.stack.pop();
+		assert beginName == name, "Profiler phases ended out of order (%s, %s)" % (beginName, name);
+
+		self.add(name, time.time() - wall, getCPUTime() - cpu);
+
+	# add time taken for a phase
+	def add (self, name, wall, cpu, calls=1):
+		phase = self.phases.get(name);
+		if phase is None:
+			phase = self.phases[name] = [0, 0.0, 0.0];
+			self.order.append(name);
+
+		phase[0] += calls;
+		phase[1] += wall;
+		phase[2] += cpu;
+
+	# get a version of the given function which adds the time taken for each call to a phase
+	# NOTE: this is for functions which get called often, where begin/end would be too clumsy
+	def wrap (self, name, fn):
+		if fn is None:
+			return None;
+
+		def timed (*args):
+			wall = time.time();
+			cpu = getCPUTime();
+			try:
+				return fn(*args);
+			finally:
+				self.add(name, time.time() - wall, getCPUTime() - cpu);
+		return timed;
+
+	# add to a counter
+	def count (self, name, amount=1):
+		self.counters[name] = self.counters.get(name, 0) + amount;
+
+	# record the time and resources used by a finished render job (see dbcsRender)
+	def addJob (self, job):
+		name = "render:%s:%s" % (job.engine, job.format);
+		self.add(name, job.elapsed, job.cpuTime or 0.0);
+
+		child = {'name': name, 'file': job.fileP, 'wall': job.elapsed, 'cpu': job.cpuTime,
+				 'succeeded': job.succeeded()};
+		if job.rusage is not None:
+			child['utime'] = job.rusage.ru_utime;
+			child['stime'] = job.rusage.ru_stime;
+			child['maxrss'] = job.rusage.ru_maxrss;
+		self.children.append(child);
+
+	# ------------
+
+	# get all the data recorded, as a JSON-friendly dict
+	def getData (self):
+		return {
+			'phases': [{'name': name, 'calls': self.phases[name][0],
+						'wall': self.phases[name][1], 'cpu': self.phases[name][2]}
+					   for name in self.order],
+			'counters': self.counters,
+			'children': self.children,
+		}
+
+	# add the data recorded by another profiler (i.e. in a worker process)
+	#	data: dict from getData()
+	def merge (self, data):
+		for phase in data['phases']:
+			self.add(phase['name'], phase['wall'], phase['cpu'], phase['calls']);
+		for name, value in data['counters'].iteritems():
+			self.count(name, value);
+		self.children.extend(data['children']);
+
+	# ------------
+
+	# write out a report of what was recorded
+	#	format: one of profileFormats
+	def report (self, stream=None, format="table"):
+		stream = stream or sys.stderr;
+
+		if format == "json":
+			stream.write(json.dumps(self.getData(), sort_keys=True));
+			stream.write("\n");
+			return;
+
+		stream.write("$ Profile\n");
+		stream.write("   %-40s %8s %12s %12s\n" % ("Phase", "Calls", "Wall (ms)", "CPU (ms)"));
+		for name in self.order:
+			calls, wall, cpu = self.phases[name];
+			stream.write("   %-40s %8d %12.3f %12.3f\n" % (name, calls, wall * 1000.0, cpu * 1000.0));
+
+		if self.counters:
+			stream.write("\n   %-40s %12s\n" % ("Counter", "Value"));
+			for name in sorted(self.counters):
+				stream.write("   %-40s %12d\n" % (name, self.counters[name]));
+
+		if self.children:
+			stream.write("\n   %-40s %12s %12s %12s\n" % ("Subprocess", "User (ms)", "System (ms)", "Max RSS (kB)"));
+			for child in self.children:
+				if 'utime' in child:
+					stream.write("   %-40s %12.3f %12.3f %12d\n" % (child['file'],
+							child['utime'] * 1000.0, child['stime'] * 1000.0, child['maxrss']));
+				else:
+					stream.write("   %-40s %12s %12s %12s\n" % (child['file'], "-", "-", "-"));
+		stream.write("\n");
+
+# Profiler which doesn't record anything, for when profiling is off
+# NOTE: wrap() gives back the function as it was, so the hot paths don't get any slower
+class NullProfiler (Profiler):
+	enabled = False;
+
+	__slots__ = []
+
+	def begin (self, name):
+		pass;
+
+	def end (self, name):
+		pass;
+
+	def add (self, name, wall, cpu, calls=1):
+		pass;
+
+	def wrap (self, name, fn):
+		return fn;
+
+	def count (self, name, amount=1):
+		pass;
+
+	def addJob (self, job):
+		pass;
+
+	def report (self, stream=None, format="table"):
+		pass;
+
+# shared instance used when profiling is off
+NULL_PROFILER = NullProfiler();
+
+# ------------
+
+# profile report formats (default first)
+profileFormats = ["table", "json"];
+
+# Create a profiler
+#	enabled: is profiling on (otherwise, the shared NullProfiler is returned)
+def makeProfiler (enabled):
+	if enabled:
+		return Profiler();
+	return NULL_PROFILER;
+
+# Add the --profile options to a commandline option parser
+def addProfileOptions (parser):
+	parser.add_option("--profile", dest="profile",
+			default=False, action="store_true",
+			help="Report how long each phase (and each check) took, along with counts of what was produced (written to stderr)")
+	parser.add_option("--profile-format", dest="profileFormat",
+			default=profileFormats[0], type="choice", choices=profileFormats,
+			help="Format of the profile report (out of %s)" % profileFormats)
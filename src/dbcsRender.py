@@ -0,0 +1,319 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Scheduler for running GraphViz on batches of .dot files, with several
+# renders (i.e. for different files and/or formats) running at once
+
+import sys
+import os
+import time
+import tempfile
+import subprocess
+
+try:
+	from multiprocessing import cpu_count
+except ImportError:
+	cpu_count = None;
+
+import dbcsProfile
+
+##################################
+# JOBS
+
+# A single GraphViz render to perform
+class RenderJob:
+	__slots__ = [
+		# Settings
+		'engine',		# name of GraphViz engine to run (i.e. 'neato')
+		'format',		# output format (i.e. 'png')
+		'fileG',		# .dot file to render
+		'fileP',		# output file to produce
+		'timeout',		# max time (in seconds) to let the render run for (or None for no limit)
+
+		# Status
+		'process',		# running subprocess
+		'errFile',		# temp file that the subprocess' stderr gets written to
+		'startTime',	# time that the job was started
+		'elapsed',		# time taken for the job (seconds)
+		'cpuTime',		# CPU time used by the subprocess (seconds), or None if it isn't known
+		'rusage',		# resource usage of the subprocess (or None if it isn't known, i.e. on Windows)
+		'status',		# exit status of the subprocess (or None if it didn't finish)
+		'timedOut',		# was the job stopped for taking too long
+		'error',		# error message for failed jobs
+	]
+
+	# Constructor
+	def __init__ (self, engine, format, fileG, fileP, timeout=None):
+		self.engine = engine;
+		self.format = format;
+		self.fileG = fileG;
+		self.fileP = fileP;
+		self.timeout = timeout;
+
+		self.process = None;
+		self.errFile = None;
+		self.startTime = None;
+		self.elapsed = 0.0;
+		self.cpuTime = None;
+		self.rusage = None;
+		self.status = None;
+		self.timedOut = False;
+		self.error = None;
+
+	# get the command to run for this job
+	# NOTE: output is written using -o instead of redirecting stdout through a shell
+	def getCommand (self):
+		return [self.engine, "-T%s" % self.format, "-o%s" % self.fileP, self.fileG];
+
+	# did the job succeed?
+	def succeeded (self):
+		return (self.status == 0) and (self.error is None);
+
+	# start running the job
+	# < returns: False if the job couldn't be started
+	def start (self):
+		self.startTime = time.time();
+
+		try:
+			self.errFile = tempfile.TemporaryFile();
+			self.process = subprocess.Popen(self.getCommand(),
+					stdout=self.errFile, stderr=subprocess.STDOUT);
+		except (OSError, IOError), e:
+			# i.e. GraphViz isn't installed
+			self.error = "Couldn't run %s (%s)" % (self.engine, e);
+			self._cleanup();
+			return False;
+
+		return True;
+
+	# check whether the subprocess has finished (collecting its resource usage if it has)
+	#	block: wait for the subprocess to finish
+	# < returns: exit status of the subprocess (or None if it's still running)
+	def _wait (self, block=False):
+		if not hasattr(os, 'wait4'):
+			# resource usage isn't available here
+			if block:
+				return self.process.wait();
+			return self.process.poll();
+
+		if block:
+			options = 0;
+		else:
+			options = os.WNOHANG;
+		pid, status, rusage = os.wait4(self.process.pid, options);
+		if pid == 0:
+			return None;
+
+		# let the Popen object know that it's finished (since it didn't reap it itself)
+		if os.WIFSIGNALED(status):
+			self.process.returncode = -os.WTERMSIG(status);
+		else:
+			self.process.returncode = os.WEXITSTATUS(status);
+
+		self.rusage = rusage;
+		self.cpuTime = rusage.ru_utime + rusage.ru_stime;
+		return self.process.returncode;
+
+	# check on the progress of the job
+	# < returns: True if the job has finished
+	def poll (self):
+		self.elapsed = time.time() - self.startTime;
+
+		status = self._wait();
+		if status is not None:
+			# finished
+			self.status = status;
+			if status != 0:
+				self.error = "Failed with %d" % (status);
+
+				# include what the engine had to say about it
+				self.errFile.seek(0);
+				details = self.errFile.read().strip();
+				if details:
+					self.error += ": %s" % (details);
+		elif (self.timeout is not None) and (self.elapsed > self.timeout):
+			# taking too long, so stop it
+			try:
+				self.process.kill();
+				self._wait(True);
+			except OSError:
+				pass; # already finished
+
+			self.timedOut = True;
+			self.error = "Timed out after %.1f seconds" % (self.timeout);
+		else:
+			# still running
+			return False;
+
+		self._cleanup();
+		return True;
+
+	# release the resources used while running the job
+	def _cleanup (self):
+		if self.errFile:
+			self.errFile.close();
+			self.errFile = None;
+		self.process = None;
+
+# A render which is performed in-process by calling a function (i.e. the built-in layout engine)
+# NOTE: this has the same interface as RenderJob, so that the scheduler can treat them the same
+class FunctionJob:
+	__slots__ = [
+		# Settings
+		'engine',		# name of engine used
+		'format',		# output format
+		'fileP',		# output file to produce
+		'fn',			# function to call to perform the render (raising an error on failure)
+		
+		# Status
+		'elapsed',		# time taken for the job (seconds)
+		'cpuTime',		# CPU time used by the job (seconds)
+		'rusage',		# always None (the job doesn't have a process of its own)
+		'status',		# 0 if the job succeeded, 1 if not
+		'timedOut',		# always False (in-process jobs can't be stopped)
+		'error',		# error message for failed jobs
+	]
+	
+	# Constructor
+	def __init__ (self, engine, format, fileP, fn):
+		self.engine = engine;
+		self.format = format;
+		self.fileP = fileP;
+		self.fn = fn;
+		
+		self.elapsed = 0.0;
+		self.cpuTime = None;
+		self.rusage = None;
+		self.status = None;
+		self.timedOut = False;
+		self.error = None;
+		
+	# did the job succeed?
+	def succeeded (self):
+		return (self.status == 0) and (self.error is None);
+		
+	# run the job (to completion)
+	# < returns: False if the job failed
+	def start (self):
+		startTime = time.time();
+		startCPU = dbcsProfile.getCPUTime();
+		
+		try:
+			self.fn();
+			self.status = 0;
+		except Exception, e:
+			self.status = 1;
+			self.error = "Failed: %s" % (e);
+		
+		self.elapsed = time.time() - startTime;
+		self.cpuTime = dbcsProfile.getCPUTime() - startCPU;
+		return self.succeeded();
+		
+	# check on the progress of the job (it's always finished by the time it gets checked)
+	def poll (self):
+		return True;
+
+##################################
+# SCHEDULER
+
+# time (in seconds) to wait between checks on the running jobs
+POLL_INTERVAL = 0.05;
+
+# Runs render jobs, with a bounded number of them running at once
+class RenderScheduler:
+	__slots__ = [
+		'maxJobs',		# max number of jobs which can run at once
+		'verbose',		# print progress reports for each job
+		'profiler',		# dbcsProfile.Profiler to record the time/resources used by each job in
+
+		'queue',		# jobs waiting to run
+		'running',		# jobs currently running
+		'finished',		# jobs which have finished (successfully or not)
+		'callbacks',	# job -> function to call with the job once it has finished
+
+		'startTime',	# time that the first job was submitted
+	]
+
+	# Constructor
+	#	maxJobs: max number of jobs to run at once (defaults to the number of cpu's)
+	#	profiler: dbcsProfile.Profiler to record the jobs in (defaults to not recording them)
+	def __init__ (self, maxJobs=None, verbose=True, profiler=None):
+		if not maxJobs:
+			try:
+				maxJobs = cpu_count();
+			except (TypeError, NotImplementedError):
+				maxJobs = 1;
+		self.maxJobs = max(1, maxJobs);
+		self.verbose = verbose;
+		self.profiler = profiler or dbcsProfile.NULL_PROFILER;
+
+		self.queue = [];
+		self.running = [];
+		self.finished = [];
+		self.callbacks = {};
+
+		self.startTime = None;
+
+	# add a job to be run
+	#	callback: function to call with the job once it has finished (successfully or not)
+	def submit (self, job, callback=None):
+		if self.startTime is None:
+			self.startTime = time.time();
+
+		if callback:
+			self.callbacks[job] = callback;
+		self.queue.append(job);
+		self.poll();
+
+	# check on the running jobs, and start more if there's room
+	def poll (self):
+		# check on the running jobs
+		for job in self.running[:]:
+			if job.poll():
+				self.running.remove(job);
+				self._finish(job);
+
+		# start more jobs
+		while self.queue and (len(self.running) < self.maxJobs):
+			job = self.queue.pop(0);
+			if job.start():
+				self.running.append(job);
+			else:
+				self._finish(job);
+
+	# wait for all the jobs submitted to finish
+	def wait (self):
+		while self.queue or self.running:
+			self.poll();
+			if self.running:
+				time.sleep(POLL_INTERVAL);
+
+	# helper - record a finished job
+	def _finish (self, job):
+		self.finished.append(job);
+		self.profiler.addJob(job);
+
+		callback = self.callbacks.pop(job, None);
+		if callback:
+			callback(job);
+
+		if self.verbose:
+			if job.succeeded():
+				print("!! Rendered %s (%s, %.2fs)" % (job.fileP, job.engine, job.elapsed));
+			else:
+				print("!! Rendering %s failed! :( %s" % (job.fileP, job.error));
+
+	# print a summary of the jobs run
+	def printSummary (self, stream=sys.stdout):
+		failed = [job for job in self.finished if not job.succeeded()];
+		if self.startTime is not None:
+			totalTime = time.time() - self.startTime;
+		else:
+			totalTime = 0.0;
+
+		stream.write("$ Rendered %d of %d diagrams in %.2fs (%d at a time)\n" %
+				(len(self.finished) - len(failed), len(self.finished), totalTime, self.maxJobs));
+		for job in failed:
+			stream.write("X -- %s | %s\n" % (job.fileP, job.error));
+
+		return len(failed) == 0;
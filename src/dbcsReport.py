@@ -0,0 +1,210 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Reporters for the results of validating dbcs files. Errors are passed
+# to the reporter as soon as they're found, and get written out straight
+# away, so that the reports can be as big as needed without everything
+# needing to be kept around until the end (except for text reports, which
+# list the errors from each check under its heading).
+
+import sys
+import json
+
+from xml.sax.saxutils import escape, quoteattr
+
+###############################
+# BASE REPORTER
+
+# Base template for reporters
+# NOTE: the methods get called in the following order:
+#	begin()
+#	  beginFile()
+#	    error()*          - as errors are found by the checks (in any order)
+#	    endCheck()*       - once for each check, after the model has been checked
+#	    endModel()
+#	  endFile()           - (or fileError() then endFile() if the file couldn't be checked)
+#	end()
+class Reporter:
+	# name of the report format
+	name = "none";
+
+	__slots__ = [
+		'stream',		# stream to write the report to (None for the console)
+		'fileN',		# file currently being reported on
+	]
+
+	# Constructor
+	def __init__ (self, stream=None):
+		self.stream = stream;
+		self.fileN = None;
+
+	# start/end of the whole report
+	def begin (self):
+		pass;
+
+	def end (self):
+		pass;
+
+	# start/end of the report for one file
+	def beginFile (self, fileN):
+		self.fileN = fileN;
+
+	def endFile (self, fileN, passed):
+		self.fileN = None;
+
+	# file couldn't be loaded (or checked)
+	def fileError (self, fileN, message):
+		pass;
+
+	# error found by a check
+	def error (self, check, error):
+		pass;
+
+	# check has finished
+	def endCheck (self, check):
+		pass;
+
+	# all checks have finished
+	def endModel (self, passedTests, totalTests, failedTests):
+		pass;
+
+# ------------
+
+# helper - get the value to report for an error's debug info
+def _get_info (error):
+	if error.info is None:
+		return None;
+	return str(error.info);
+
+###############################
+# REPORTERS
+
+# Human-readable text (as printed by the validator all along)
+class TextReporter (Reporter):
+	name = "text";
+
+	__slots__ = [
+		'pending',		# check -> errors found by it, which get printed under its heading once it has finished
+	]
+
+	# Constructor
+	def __init__ (self, stream=None):
+		Reporter.__init__(self, stream);
+		self.pending = {};
+
+	# get the streams to write the progress/errors to
+	# NOTE: these are looked up each time, so that redirecting sys.stdout/stderr still works
+	def _out (self):
+		return self.stream or sys.stdout;
+
+	def _err (self):
+		return self.stream or sys.stderr;
+
+	# NOTE: the checks all run together during a single walk over the model, so errors
+	#		are held onto until their check finishes, to show them under its heading
+	def error (self, check, error):
+		self.pending.setdefault(check, []).append(error);
+
+	def endCheck (self, check):
+		out = self._out();
+		out.write("$$ Checking if %s ...\n" % check.check_id);
+
+		if not check.passed:
+			out.write("!! Some errors found ...\n");
+			out.flush();
+
+			err = self._err();
+			for error in self.pending.pop(check, []):
+				error.report(err);
+			err.flush();
+
+			out.write("!! ... carrying on ... \n\n");
+		else:
+			out.write("!! ... No sins here :) \n\n");
+
+	def endModel (self, passedTests, totalTests, failedTests):
+		self._out().write("\n$$ %d of %d tests passed. There were %d failure(s) to fix.\n\n" % (passedTests, totalTests, failedTests));
+
+# JSON Lines - one JSON object per line, for each error, check and file
+class JSONReporter (Reporter):
+	name = "json";
+
+	__slots__ = []
+
+	# write a record
+	def _write (self, record):
+		self.stream.write(json.dumps(record, sort_keys=True));
+		self.stream.write("\n");
+
+	def endFile (self, fileN, passed):
+		self._write({'type': "file", 'file': fileN, 'passed': passed});
+		Reporter.endFile(self, fileN, passed);
+
+	def fileError (self, fileN, message):
+		self._write({'type': "file_error", 'file': fileN, 'error': message});
+
+	def error (self, check, error):
+		self._write({'type': "error", 'file': self.fileN, 'check_id': check.check_id,
+					 'item': error.item_name, 'error': error.error, 'info': _get_info(error)});
+
+	def endCheck (self, check):
+		self._write({'type': "check", 'file': self.fileN, 'check_id': check.check_id,
+					 'passed': check.passed, 'errors': check.errorCount});
+
+# JUnit XML - a test suite for each file, with a test case for each check that passed
+# and for each error found (so that they can be written out as they're found)
+class JUnitReporter (Reporter):
+	name = "junit";
+
+	__slots__ = []
+
+	def begin (self):
+		self.stream.write('<?xml version="1.0" encoding="UTF-8"?>\n<testsuites>\n');
+
+	def end (self):
+		self.stream.write('</testsuites>\n');
+
+	def beginFile (self, fileN):
+		Reporter.beginFile(self, fileN);
+		self.stream.write('<testsuite name=%s>\n' % quoteattr(fileN));
+
+	def endFile (self, fileN, passed):
+		self.stream.write('</testsuite>\n');
+		Reporter.endFile(self, fileN, passed);
+
+	# write a test case
+	#	tag: tag for the failure details (or None if the test case passed)
+	def _write (self, name, tag=None, message=None, details=None):
+		self.stream.write('  <testcase classname=%s name=%s' % (quoteattr(self.fileN), quoteattr(name)));
+		if tag:
+			self.stream.write('>\n    <%s message=%s>%s</%s>\n  </testcase>\n' %
+					(tag, quoteattr(message), escape(details or ""), tag));
+		else:
+			self.stream.write('/>\n');
+
+	def fileError (self, fileN, message):
+		self._write("Load Schema", "error", message);
+
+	def error (self, check, error):
+		self._write("%s: %s" % (check.check_id, error.item_name), "failure", error.error, _get_info(error));
+
+	def endCheck (self, check):
+		if check.passed:
+			self._write(check.check_id);
+
+# ------------
+
+# report formats available
+REPORTERS = {
+	TextReporter.name  : TextReporter,
+	JSONReporter.name  : JSONReporter,
+	JUnitReporter.name : JUnitReporter,
+}
+
+# names of report formats (default first)
+reportFormats = [TextReporter.name, JSONReporter.name, JUnitReporter.name];
+
+# Create a reporter for the named report format
+#	stream: stream to write the report to (only the text report can be written to the console, using None)
+def makeReporter (name, stream=None):
+	return REPORTERS[name](stream);
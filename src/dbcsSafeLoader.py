@@ -0,0 +1,297 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Restricted loader for dbcs descriptions. Instead of running the file as
+# a Python script, the file is parsed, and the model is built straight from
+# the parsed statements. Only the constructs used by the dbcs mini-language
+# are allowed (i.e. creating the model and its items, assigning them to
+# variables, and adding items to each other). Anything else is rejected, so
+# this is safe to use for untrusted files.
+
+import sys
+import re
+import ast
+
+import dbcsTypes
+
+###############################
+# ALLOWED SYMBOLS
+
+# types which can be created by the file
+CONSTRUCTORS = [
+	'Model',
+
+	'Entity',
+	'WeakEntity',
+
+	'Specialisation',
+	'DisjointSpec',
+	'OverlapSpec',
+
+	'Rel',
+	'IdentifyingRel',
+	'Link',
+
+	'Attr',
+	'DerivedAttr',
+	'MultiAttr',
+]
+
+# constants which can be used by the file
+CONSTANTS = [
+	'MANY',
+
+	'PARTIAL_SINGLE',
+	'PARTIAL_MANY',
+	'TOTAL_SINGLE',
+	'TOTAL_MANY',
+]
+
+# Cached copy of the symbols which can be used (see newSymbols())
+_base_symbols = None;
+
+# Get a fresh dict of the predefined symbols, for a file to define its variables in
+def newSymbols ():
+	global _base_symbols;
+
+	# build the cached set of symbols on first use
+	if _base_symbols is None:
+		_base_symbols = {'True' : True, 'False' : False, 'None' : None};
+		for name in CONSTRUCTORS + CONSTANTS:
+			_base_symbols[name] = getattr(dbcsTypes, name);
+
+	return _base_symbols.copy();
+
+###############################
+# INTERPRETER
+
+# types which items can be added to with '+' or '+=' (see their add() methods)
+ADDABLE = (
+	dbcsTypes.Model,
+	dbcsTypes.Entity,
+	dbcsTypes.Specialisation,
+	dbcsTypes.Rel,
+	dbcsTypes.Attr,
+)
+
+# Interpreter for the statements in a dbcs file, which builds the model directly
+# from the parsed file, only allowing the constructs of the dbcs mini-language
+# NOTE: only calls to the dbcs types, plain variables, literals and adding items
+#		to other items are supported, so the file can't run any code of its own
+#		(or build up huge values, since strings and lists can't be added together)
+class Interpreter:
+	__slots__ = [
+		'fileN',		# name of file being evaluated (for error reports)
+		'lines',		# lines of the source (for error reports)
+		'symbols',		# variables defined so far (including the predefined ones)
+	]
+
+	# Constructor
+	def __init__ (self, fileN, source):
+		self.fileN = fileN;
+		self.lines = source.splitlines();
+		self.symbols = newSymbols();
+
+	# Report an unsupported construct
+	def error (self, node, msg):
+		# get the offending line to show along with the error
+		lineno = getattr(node, 'lineno', 0);
+		if 0 < lineno <= len(self.lines):
+			text = self.lines[lineno - 1];
+		else:
+			text = None;
+
+		raise SyntaxError(msg, (self.fileN, lineno, getattr(node, 'col_offset', 0), text));
+
+	# Statements -----------------------------
+
+	# run all the statements in the file
+	def run (self, tree):
+		for stmt in tree.body:
+			method = self._stmt_handlers.get(type(stmt));
+			if method is None:
+				self.error(stmt, "Only assignments and constructor calls are allowed in a restricted dbcs file");
+
+			try:
+				method(self, stmt);
+			except (ValueError, TypeError, AttributeError), e:
+				# errors from the dbcs types, which need to say where they came from
+				raise e.__class__, "%s, line %d: %s" % (self.fileN, stmt.lineno, e), sys.exc_info()[2]
+			except RuntimeError:
+				# ran out of stack while evaluating (i.e. 'a + a + a ...' with thousands of terms)
+				self.error(stmt, "Statement is nested too deeply");
+
+	# var = value
+	def _assign (self, stmt):
+		value = self.eval(stmt.value);
+
+		for target in stmt.targets:
+			self._store(target, value);
+
+	# var += value
+	def _augassign (self, stmt):
+		if type(stmt.op) is not ast.Add:
+			self.error(stmt, "Only '+=' can be used to modify variables");
+
+		item = self._name(stmt.target);
+		self._store(stmt.target, self._add(stmt, item, self.eval(stmt.value)));
+
+	# value on its own (i.e. 'Rel(...)' which registers itself with the model)
+	def _expr (self, stmt):
+		# NOTE: plain strings here are just docstrings, so are allowed too
+		self.eval(stmt.value);
+
+	# pass
+	def _pass (self, stmt):
+		pass;
+
+	# helper - assignment to a variable
+	def _store (self, target, value):
+		if type(target) is not ast.Name:
+			self.error(target, "Values can only be assigned to plain variables");
+		if (target.id in _base_symbols) or target.id.startswith('__'):
+			self.error(target, "Predefined name '%s' cannot be reassigned" % (target.id));
+
+		self.symbols[target.id] = value;
+
+	# helper - add an item to another (i.e. an attribute to an entity)
+	def _add (self, node, item, other):
+		if not isinstance(item, ADDABLE):
+			self.error(node, "'+' can only be used to add items to the model, entities, relationships, specialisations or attributes");
+		return item.add(other);
+
+	_stmt_handlers = {
+		ast.Assign    : _assign,
+		ast.AugAssign : _augassign,
+		ast.Expr      : _expr,
+		ast.Pass      : _pass,
+	}
+
+	# Expressions ----------------------------
+
+	# evaluate an expression
+	def eval (self, node):
+		method = self._expr_handlers.get(type(node));
+		if method is None:
+			self.error(node, "Unsupported expression in restricted dbcs file");
+		return method(self, node);
+
+	# Type(args, key=value)
+	def _call (self, node):
+		# only the predefined types can be created
+		func = node.func;
+		if (type(func) is not ast.Name) or (func.id not in _constructors):
+			self.error(node, "Only dbcs types (%s) can be called" % ", ".join(CONSTRUCTORS));
+		if node.starargs or node.kwargs:
+			self.error(node, "*args and **kwargs cannot be used");
+
+		args = [self.eval(arg) for arg in node.args];
+		if node.keywords:
+			kwargs = dict([(kw.arg, self.eval(kw.value)) for kw in node.keywords]);
+			return _constructors[func.id](*args, **kwargs);
+		return _constructors[func.id](*args);
+
+	# var
+	def _name (self, node):
+		try:
+			return self.symbols[node.id];
+		except KeyError:
+			self.error(node, "Name '%s' is not defined" % (node.id));
+
+	# a + b
+	def _binop (self, node):
+		if type(node.op) is not ast.Add:
+			self.error(node, "Only '+' can be used to add items together");
+		return self._add(node, self.eval(node.left), self.eval(node.right));
+
+	# -value
+	def _unaryop (self, node):
+		if (type(node.op) is not ast.USub) or (type(node.operand) is not ast.Num):
+			self.error(node, "Only numbers can be negated");
+		return -node.operand.n;
+
+	# constants
+	def _str (self, node):
+		return node.s;
+
+	def _num (self, node):
+		return node.n;
+
+	# [a, b, ...] or (a, b, ...)
+	def _list (self, node):
+		return [self.eval(elt) for elt in node.elts];
+
+	def _tuple (self, node):
+		return tuple([self.eval(elt) for elt in node.elts]);
+
+	_expr_handlers = {
+		ast.Call    : _call,
+		ast.Name    : _name,
+		ast.BinOp   : _binop,
+		ast.UnaryOp : _unaryop,
+		ast.Str     : _str,
+		ast.Num     : _num,
+		ast.List    : _list,
+		ast.Tuple   : _tuple,
+	}
+
+# types which can be created by the file (name -> type)
+_constructors = dict([(name, getattr(dbcsTypes, name)) for name in CONSTRUCTORS]);
+
+###############################
+# SIZE LIMITS
+
+# max number of operators and brackets allowed in a single statement
+# NOTE: chains of operators (i.e. 'a + a + a ...') or calls/attributes (i.e. 'a.b.c ...')
+#		become deeply nested trees once parsed, and the Python parser crashes (instead of
+#		raising an error) on huge ones, so these need to be caught before parsing
+MAX_STATEMENT_OPS = 10000;
+
+# strings and comments (skipped), and the things which are counted for MAX_STATEMENT_OPS
+_scan_re = re.compile(r'''"""(?:[^\\]|\\.)*?"""|\'\'\'(?:[^\\]|\\.)*?\'\'\'|"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*'|#[^\n]*|\\\n|''' +
+					  r'''(\n)|([(\[{])|([)\]}])|([-+*/%&|^~<>=.]+)''', re.S);
+
+# Check that the given source isn't too big to be parsed safely (see MAX_STATEMENT_OPS)
+# NOTE: this only does a quick scan of the source, so statements are only assumed to
+#		end at newlines outside of brackets (which errs on the side of counting too much)
+def checkSourceSize (fileN, source):
+	depth = 0;
+	ops = 0;
+
+	for m in _scan_re.finditer(source):
+		newline, opening, closing, operators = m.groups();
+		if newline:
+			if depth == 0:
+				ops = 0;
+			continue;
+		elif opening:
+			depth += 1;
+			ops += 1;
+		elif closing:
+			depth = max(0, depth - 1);
+			continue;
+		elif operators:
+			ops += len(operators);
+		else:
+			continue; # string or comment
+
+		if ops > MAX_STATEMENT_OPS:
+			lineno = source.count("\n", 0, m.start()) + 1;
+			raise SyntaxError("Statement is too long (more than %d operators and brackets)" % (MAX_STATEMENT_OPS),
+							  (fileN, lineno, 0, None));
+
+###############################
+# PUBLIC API
+
+# Evaluate the given dbcs source, returning the variables it defined
+#	fileN: name of file the source came from
+#	source: contents of the file
+def evalDBCS (fileN, source):
+	# parse, and build the model from the parsed statements
+	# NOTE: the file never gets compiled or run as Python code
+	checkSourceSize(fileN, source);
+	tree = ast.parse(source, fileN);
+
+	interpreter = Interpreter(fileN, source);
+	interpreter.run(tree);
+	return interpreter.symbols;
@@ -9,6 +9,10 @@ from dbcsUtils import *
 ###############################
 # CONSTANTS
 
+# version of the type definitions below
+# NOTE: bump this whenever the classes change, so that saved model snapshots get rebuilt
+MODEL_VERSION = 6;
+
 # cardinality
 MANY = 'N' # XXX
 
@@ -20,9 +24,13 @@ TOTAL_MANY  	= (1, MANY);
 
 ###############################
 # TYPE DEFINES
+#
+# NOTE: these are all new-style classes, since __slots__ are ignored for old-style
+#		ones (leaving every item with a dict of its own). Subclasses need to declare
+#		__slots__ too (even if they don't add anything), or they get a dict again.
 
 # The container for everything we do
-class Model:
+class Model (object):
 	__slots__ = [
 		# Simple MetaData 
 		'name', 
@@ -31,7 +39,14 @@ class Model:
 		
 		# Data in the model
 		'entities',
-		'relationships'
+		'relationships',
+		
+		# Lookup indexes (kept up to date as items get added)
+		'_items',			# name -> entity/relationship
+		'_positions',		# entity/relationship -> index in the list of entities/relationships
+		'_superclasses',	# entity -> list of direct superclass entities
+		'_participations',	# entity -> list of relationships it participates in
+		'_closure',			# SpecialisationClosure of the specialisation hierarchy (or None when it needs rebuilding)
 	]
 	
 	# Constructor 
@@ -44,17 +59,50 @@ class Model:
 		# init lists for user data defined later
 		self.entities = [];
 		self.relationships = [];
+		
+		# init indexes
+		self._items = {};
+		self._positions = {};
+		self._superclasses = {};
+		self._participations = {};
+		self._closure = None;
+
+	# helper function (private) - make sure that the name of the given item isn't taken yet
+	# NOTE: entities and relationships share a namespace, since they all end up as nodes in the graph
+	def _check_unique_name (self, item):
+		if item.name in self._items:
+			raise ValueError, "Model already has an item named '%s'" % (item.name)
+		self._items[item.name] = item;
 
 	# Add item
 	def add (self, item):
 		# entity?
 		if isinstance(item, Entity):
-			# TODO: check if exists yet before adding...
+			self._check_unique_name(item);
+			self._positions[item] = len(self.entities);
 			self.entities.append(item);
+			
+			# register in indexes
+			self._superclasses[item] = [];
+			self._participations[item] = [];
+			self._closure = None;
 		# relationship?
 		elif isinstance(item, Rel):
-			# TODO: check if exists yet before adding...
+			self._check_unique_name(item);
+			self._positions[item] = len(self.relationships);
 			self.relationships.append(item);
+			
+			# register in indexes
+			for link in item.links:
+				# only entities from this model can be looked up later
+				rels = self._participations.get(link.entity);
+				if rels is None:
+					continue;
+				
+				# recursive relationships link to the same entity more than once,
+				# but should only be listed once per entity
+				if (len(rels) == 0) or (rels[-1] is not item):
+					rels.append(item);
 		else:
 			raise TypeError, "Cannot add unrecognised type to Model"
 			
@@ -92,6 +140,29 @@ class Model:
 		else:
 			return "";
 			
+	# Index Maintenance (private) ----------
+	
+	# record that 'entity' has been added as a subclass of 'parent'
+	# NOTE: called by Specialisation.add()
+	def _register_subclass (self, parent, entity):
+		supers = self._superclasses.get(entity);
+		if supers is None:
+			# entity isn't in this model (yet), so there's nothing to index
+			return;
+		
+		# an entity may be in several specialisations of the same parent,
+		# but the parent should only be listed once
+		if parent not in supers:
+			supers.append(parent);
+			self._closure = None; # hierarchy has changed
+	
+	# helper function (private) - get the closure of the specialisation hierarchy
+	# NOTE: this only gets (re)built when it's needed after the hierarchy has changed
+	def _get_closure (self):
+		if self._closure is None:
+			self._closure = SpecialisationClosure(self);
+		return self._closure;
+			
 	# Useful Getters -----------------------
 	
 	# helper function (private) - verify that a given entity is valid
@@ -100,7 +171,16 @@ class Model:
 		if isinstance(entity, Entity) == False:
 			return False;
 		# secondly, check that entity belongs to this model
-		return (entity in self.entities);
+		# NOTE: every entity in the model has an entry in the superclass index
+		return (entity in self._superclasses);
+		
+	# Get the entity or relationship with the given name (or None if not found)
+	def getItem (self, name):
+		return self._items.get(name);
+	
+	# Get the position of the given entity/relationship in the list of entities/relationships (or None if it isn't in the model)
+	def getItemIndex (self, item):
+		return self._positions.get(item);
 	
 	# Get a list of the (direct) super-entities for a given entity
 	def getEntitySuperclasses (self, entity):
@@ -108,17 +188,8 @@ class Model:
 		if self._check_entity_arg(entity) == False:
 			raise TypeError, "Not a valid entity to get superclasses for"
 		
-		# find superclass entities (there may be more than 1)
-		matches = [];
-		
-		for e in self.entities:
-			for spec in e.specialisations:
-				if spec.hasSubclass(entity):
-					matches.append(e);
-					break; # only need the first occurance
-		
-		# return the list of matches
-		return matches;
+		# return a copy of the list of matches, so that the index can't get modified
+		return self._superclasses[entity][:];
 		
 	# Get a list of the relationships which involve the given entity
 	def getEntityRelationships (self, entity):
@@ -126,28 +197,189 @@ class Model:
 		if self._check_entity_arg(entity) == False:
 			raise TypeError, "Not a valid entity to find relationship participations for"
 		
-		# find relationships which use this entity in relationships
-		matches = [];
+		# return a copy of the list of matches, so that the index can't get modified
+		return self._participations[entity][:];
+		
+	# Get a list of all the super-entities (direct or not) for a given entity
+	def getEntityAncestors (self, entity):
+		# verify that we've got a valid entity
+		if self._check_entity_arg(entity) == False:
+			raise TypeError, "Not a valid entity to get ancestors for"
+		
+		return self._get_closure().getAncestors(entity);
+		
+	# Get a list of all the sub-entities (direct or not) for a given entity
+	def getEntityDescendants (self, entity):
+		# verify that we've got a valid entity
+		if self._check_entity_arg(entity) == False:
+			raise TypeError, "Not a valid entity to get descendants for"
+		
+		return self._get_closure().getDescendants(entity);
+		
+	# Is the given entity a (direct or indirect) subclass of 'ancestor'?
+	def isSubclassOf (self, entity, ancestor):
+		return self._get_closure().isSubclass(entity, ancestor);
+		
+	# Get a list of the entities in the specialisation cycle that the given entity is part of
+	# (or an empty list if it isn't part of one)
+	def getSpecialisationCycle (self, entity):
+		return self._get_closure().getCycle(entity);
+		
+	# Get a list of the specialisation cycles in the model (each being a list of the entities in it)
+	def getSpecialisationCycles (self):
+		return [cycle[:] for cycle in self._get_closure().cycles];
+
+# -----------
+
+# helper - get the indices of the bits set in the given bitset (in ascending order)
+def _bit_indices (bits):
+	while bits:
+		low = bits & -bits;
+		yield low.bit_length() - 1;
+		bits ^= low;
+
+# Transitive closure of the specialisation hierarchy in a model, giving constant time
+# answers to "is X a subclass of Y", and quick lists of ancestors/descendants
+# NOTE: only entities in specialisations get an index, and the ancestors/descendants
+#		of each of these are stored as bitsets (longs) of these indices
+class SpecialisationClosure (object):
+	__slots__ = [
+		'entities',		# index -> entity (for entities which have superclasses or subclasses)
+		'indices',		# entity -> index
+		'ancestors',	# index -> bitset of (direct or indirect) superclasses
+		'descendants',	# index -> bitset of (direct or indirect) subclasses
+		'cycles',		# list of lists of entities which are (indirectly) subclasses of themselves
+		'_cycle_of',	# entity -> list of entities in the cycle it is part of
+	]
+	
+	# Constructor - build the closure for the given model
+	def __init__ (self, model):
+		# index the entities which take part in specialisations (in the order they are in the model)
+		self.entities = [];
+		self.indices = {};
+		
+		superclasses = dict([(entity, model.getEntitySuperclasses(entity)) for entity in model.entities]);
+		
+		hasSubclasses = set();
+		for supers in superclasses.itervalues():
+			hasSubclasses.update(supers);
 		
-		for rel in self.relationships:
-			# add all matching links
-			matches += [link.entity for link in rel.links if link.entity == entity];
+		for entity in model.entities:
+			if superclasses[entity] or (entity in hasSubclasses):
+				self.indices[entity] = len(self.entities);
+				self.entities.append(entity);
 		
-		# return the list of matches
-		return matches;
+		n = len(self.entities);
+		parents = [[self.indices[sup] for sup in superclasses[entity] if sup in self.indices]
+				   for entity in self.entities];
+		
+		# work down from the top of each hierarchy (Kahn's algorithm), with each entity's
+		# ancestors being its parents plus all of their ancestors
+		children = [[] for i in xrange(n)];
+		waiting = [len(ps) for ps in parents];	# number of parents that haven't been done yet
+		for i, ps in enumerate(parents):
+			for p in ps:
+				children[p].append(i);
+		
+		ancestors = [0] * n;
+		ready = [i for i in xrange(n) if waiting[i] == 0];
+		
+		while ready:
+			i = ready.pop();
+			bits = ancestors[i] | (1 << i);
+			
+			for c in children[i]:
+				ancestors[c] |= bits;
+				waiting[c] -= 1;
+				if waiting[c] == 0:
+					ready.append(c);
+		
+		# anything left over is part of a cycle (or below one), so these have to be walked one by one
+		for i in xrange(n):
+			if waiting[i]:
+				bits = 0;
+				stack = parents[i][:];
+				
+				while stack:
+					p = stack.pop();
+					if bits & (1 << p):
+						continue;
+					bits |= (1 << p);
+					
+					if waiting[p]:
+						stack.extend(parents[p]);
+					else:
+						bits |= ancestors[p]; # done already
+				
+				ancestors[i] = bits;
+		
+		self.ancestors = ancestors;
+		
+		# descendants are the other way around
+		self.descendants = [0] * n;
+		for i in xrange(n):
+			for a in _bit_indices(ancestors[i]):
+				self.descendants[a] |= (1 << i);
+		
+		# entities which are their own ancestors are in cycles, which are made up of all
+		# the entities which are both ancestors and descendants of each other
+		self.cycles = [];
+		self._cycle_of = {};
+		
+		for i in xrange(n):
+			entity = self.entities[i];
+			if (ancestors[i] & (1 << i)) and (entity not in self._cycle_of):
+				cycle = [self.entities[j] for j in _bit_indices(ancestors[i] & self.descendants[i])];
+				self.cycles.append(cycle);
+				
+				for member in cycle:
+					self._cycle_of[member] = cycle;
+	
+	# get the entities for the given bitset
+	def _get_entities (self, bits):
+		return [self.entities[i] for i in _bit_indices(bits)];
+	
+	# get list of (direct or indirect) superclasses of the entity
+	def getAncestors (self, entity):
+		i = self.indices.get(entity);
+		if i is None:
+			return [];
+		return self._get_entities(self.ancestors[i]);
+	
+	# get list of (direct or indirect) subclasses of the entity
+	def getDescendants (self, entity):
+		i = self.indices.get(entity);
+		if i is None:
+			return [];
+		return self._get_entities(self.descendants[i]);
+	
+	# is the entity a (direct or indirect) subclass of 'ancestor'
+	def isSubclass (self, entity, ancestor):
+		i = self.indices.get(entity);
+		j = self.indices.get(ancestor);
+		if (i is None) or (j is None):
+			return False;
+		return bool((self.ancestors[i] >> j) & 1);
+	
+	# get list of the entities in the cycle that the entity is part of (if any)
+	def getCycle (self, entity):
+		return self._cycle_of.get(entity, [])[:];
 
 # -----------
 
 # An entity type
-class Entity:
+class Entity (object):
 	__slots__ = [
 		# Simple MetaData
 		'name',
+		'model',			# model that entity belongs to
 		
 		# Data held by the entity
 		'key',				# key attribute (primary key for normal entities, partial for weak)
 		'attributes',		# non-key attributes
 		'specialisations',	# specialisations (i.e. subclasses) of this Entity
+		
+		'_attr_names',		# names of attributes (for catching duplicates)
 	]
 	
 	# Constructor
@@ -161,11 +393,13 @@ class Entity:
 		self.key = None;
 			# attributes for this entity
 		self.attributes = []
+		self._attr_names = set();
 			# specialisations
 		self.specialisations = []
 		
 		# Registration to rest of DB --------
 		# Add entity to the model
+		self.model = model;
 		model.add(self);
 		
 		# Add entity to the specialistions that it is derived from
@@ -176,7 +410,9 @@ class Entity:
 	def add (self, item):
 		# check if the data that's being added is some form of Attribute
 		if isinstance(item, Attr):
-			# TODO: check if exists yet before adding...
+			if item.name in self._attr_names:
+				raise ValueError, "Entity '%s' already has an attribute named '%s'" % (self.name, item.name)
+			self._attr_names.add(item.name);
 			self.attributes.append(item);
 			
 			# if this attribute is tagged as being a key...
@@ -190,7 +426,9 @@ class Entity:
 					pass;
 		# check if we're adding a specialisation
 		elif isinstance(item, Specialisation):
-			# TODO: check if exists yet before adding...
+			# NOTE: entities only have a handful of specialisations, so a linear check is fine
+			if item in self.specialisations:
+				raise ValueError, "Specialisation has already been added to Entity '%s'" % (self.name)
 			self.specialisations.append(item);
 		else:
 			raise TypeError, "Cannot add unrecognised type to Entity"
@@ -221,13 +459,14 @@ class WeakEntity (Entity):
 # -----------
 
 # Specialisation
-class Specialisation:
+class Specialisation (object):
 	__slots__ = [
 		'role',				# attribute or whatever which determines which specialisation to take 
 		'total',			# total or partial specialisation (defaults to total)
 		
 		'parent_entity',	# parent entity (i.e. superclass of the subclasses)
 		'derived_entities',	# list of entities derived from the parent (i.e. subclasses) 
+		'_derived_set',		# set of derived entities (for catching duplicates)
 	]
 
 	# Constructor 
@@ -242,6 +481,7 @@ class Specialisation:
 		
 		# prepare the list for the derived entities
 		self.derived_entities = [];
+		self._derived_set = set();
 		
 		# attribute or so which determines how this is determined
 		if role:
@@ -256,8 +496,13 @@ class Specialisation:
 	def add (self, item):
 		# check if the data that's being added is some form of Attribute
 		if isinstance(item, Entity):
-			# TODO: check if exists yet before adding...
+			if item in self._derived_set:
+				raise ValueError, "Entity '%s' is already a subclass in this specialisation of '%s'" % (item.name, self.parent_entity.name)
+			self._derived_set.add(item);
 			self.derived_entities.append(item);
+			
+			# let the model know about the new superclass of this entity
+			self.parent_entity.model._register_subclass(self.parent_entity, item);
 		else:
 			raise TypeError, "Cannot add unrecognised type to Specialisation"
 			
@@ -268,44 +513,46 @@ class Specialisation:
 	__add__ = add;
 	
 	# Does specialisation have the given entity as a subclass
+	#	recursive: also check for the entity being a subclass of one of the subclasses (and so on)
 	def hasSubclass (self, entity, recursive=False):
-		# check each specialisation if it has the entity as a direct subclass
-		for dEntity in self.derived_entities:
-			# check if match
-			if dEntity != entity:
-				# no match, so do recursive if necessary...
-				if recursive:
-					for spec in dEntity.specialisations:
-						if spec.hasSubclass(entity):
-							return True;
-			else:
-				# match found
-				return True;
-				
+		# direct subclass?
+		if entity in self._derived_set:
+			return True;
+		
+		# otherwise, is it below one of the subclasses?
+		# NOTE: the model keeps the closure of the whole hierarchy, so this doesn't need to walk it
+		if recursive:
+			model = self.parent_entity.model;
+			for dEntity in self.derived_entities:
+				if model.isSubclassOf(entity, dEntity):
+					return True;
+		
 		# everything fell through, so not a subclass...
 		return False;
 		
 # Disjoint Specialisation
 # NOTE: for now, just a complete copy of the parent
 class DisjointSpec (Specialisation):
-	pass;
+	__slots__ = []
 
 # Overlapping Specialisation
 # NOTE: for now, just a complete copy of the parent
 class OverlapSpec (Specialisation):
-	pass;
+	__slots__ = []
 
 # -----------
 
 # Relationship
-class Rel:
+class Rel (object):
 	__slots__ = [
 		# MetaData 
 		'name',
 		
 		# Data held by the entity
 		'links',
-		'attributes'
+		'attributes',
+		
+		'_attr_names',		# names of attributes (for catching duplicates)
 	]	
 	
 	# Constructor 
@@ -318,6 +565,7 @@ class Rel:
 		self.links = links;
 		# Create list of attributes
 		self.attributes = [];
+		self._attr_names = set();
 		
 		# Registration to rest of DB --------
 		# Add relationship to the model
@@ -327,7 +575,9 @@ class Rel:
 	def add (self, item):
 		# check if the data that's being added is some form of Attribute
 		if isinstance(item, Attr):
-			# TODO: check if exists yet before adding...
+			if item.name in self._attr_names:
+				raise ValueError, "Relationship '%s' already has an attribute named '%s'" % (self.name, item.name)
+			self._attr_names.add(item.name);
 			self.attributes.append(item);
 		else:
 			raise TypeError, "Cannot add unrecognised type to Relationship"
@@ -342,6 +592,8 @@ class Rel:
 # NOTE: this is really just a direct copy of Relationship...
 # TODO: need to override the constructor to validate constraints!
 class IdentifyingRel (Rel):
+	__slots__ = []
+	
 	# Constructor 
 	def __init__ (self, model, name, links):
 		# call parent constructor first to do the basics...
@@ -361,7 +613,7 @@ class IdentifyingRel (Rel):
 			raise ValueError, "No unidentified Weak Entity is identified by IdentifyingRel '%s'" % (self.name)
 	
 # Link
-class Link:
+class Link (object):
 	__slots__ = [
 		'role_name',			# name of the role played 
 		'entity',				# entity that this link attaches to
@@ -380,18 +632,20 @@ class Link:
 # -----------
 
 # Attribute
-class Attr:
+class Attr (object):
 	__slots__ = [
 		# MetaData
 		'name',			# name of attribute
-		'key'			# is attribute a Primary or Partial key (to be checked against the entity)
+		'key',			# is attribute a Primary or Partial key (to be checked against the entity)
 		
 		# Composite attributes only (but compound can be used in conjunction with others)
-		'components'	# attributes which form the composite
+		'components',	# attributes which form the composite
+		
+		'_attr_names',	# names of component attributes (for catching duplicates)
 	]
 	
 	# Constructor
-	def __init__ (self, name, components=[], key=False):
+	def __init__ (self, name, components=None, key=False):
 		# validate attribute name
 		self.name = validateAttrName(name);
 		
@@ -399,14 +653,21 @@ class Attr:
 		self.key = key;
 		
 		# store the components
+		# NOTE: each attribute needs its own list, since components can get added later
 		# TODO: should verify that they're all valid...
-		self.components = components;
+		self.components = [];
+		self._attr_names = set();
+		if components:
+			for item in components:
+				self.add(item);
 		
 	# Add some attribute (to make composite)
 	def add (self, item):
 		# check if the data that's being added is some form of Attribute
 		if isinstance(item, Attr):
-			# TODO: check if exists yet before adding...
+			if item.name in self._attr_names:
+				raise ValueError, "Attribute '%s' already has a component named '%s'" % (self.name, item.name)
+			self._attr_names.add(item.name);
 			self.components.append(item);
 		else:
 			raise TypeError, "Cannot add unrecognised type to Composite Attribute"
@@ -421,11 +682,11 @@ class Attr:
 # Derived Attribute
 # NOTE: this is simply a copy of the basic Attribute type for now
 class DerivedAttr (Attr):
-	pass;
+	__slots__ = []
 	
 # MultiValued Attribute
 # NOTE: this is simply a copy of the basic Attribute type for now
 class MultiAttr (Attr):
-	pass;
+	__slots__ = []
 
 ###############################
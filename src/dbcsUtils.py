@@ -3,47 +3,77 @@
 #
 # Assorted functions to validate input
 
-# Validate entity and relationship names
-def validateERName (name):
-	# make sure it is a string first
-	name = str(name);
-	newName = "";
-	
-	# for each character, make sure it is valid
-	# TODO: we can probably do this in a more efficient way without
-	# 		making a copy of the string, but oh well...
-	for ch in name:
-		# if x is an alphanumeric character, convert to uppercase and add
+###############################
+# NAME VALIDATION
+#
+# Names are cleaned up using translation tables (i.e. str.translate()), instead of
+# being rebuilt one character at a time:
+#	- alphanumeric characters are kept (changing their case as needed)
+#	- spaces and underscores become underscores
+#	- everything else gets dropped
+#
+# The results are remembered too, so that each distinct name only gets cleaned up once,
+# with every item/attribute using that name sharing the same (interned) string.
+
+# helper function (private) - build the translation table and characters to drop for names
+#	upper: convert letters to uppercase (otherwise they're converted to lowercase)
+# < returns: (table, deletechars) for str.translate()
+def _make_name_table (upper):
+	table = [];
+	deleteChars = [];
+
+	for i in xrange(256):
+		ch = chr(i);
+
 		if ch.isalnum():
-			newName += ch.upper();
-		# if x is a space or underscore, add an underscore
+			if upper:
+				table.append(ch.upper());
+			else:
+				table.append(ch.lower());
 		elif ch in (' ', '_'):
-			newName += '_';
-	
-	# return the new name
+			table.append('_');
+		else:
+			table.append(ch);
+			deleteChars.append(ch);
+
+	return ("".join(table), "".join(deleteChars));
+
+_ER_TABLE, _ER_DELETE = _make_name_table(True);
+_ATTR_TABLE, _ATTR_DELETE = _make_name_table(False);
+
+# max number of names to remember the validated versions of
+# NOTE: these get forgotten once there are too many, so that long-running processes
+#		don't hang on to every name they've ever seen
+MAX_VALID_NAMES = 100000;
+
+_valid_er_names = {};		# raw name -> validated entity/relationship name
+_valid_attr_names = {};		# raw name -> validated attribute name
+
+# Validate entity and relationship names
+def validateERName (name):
+	newName = _valid_er_names.get(name);
+	if newName is None:
+		# all uppercase
+		# NOTE: make sure it is a string first
+		newName = intern(str(name).translate(_ER_TABLE, _ER_DELETE));
+
+		if len(_valid_er_names) >= MAX_VALID_NAMES:
+			_valid_er_names.clear();
+		_valid_er_names[name] = newName;
 	return newName;
-	
+
 # Validate attribute names
 def validateAttrName (name):
-	# make sure it is a string first
-	name = str(name);
-	newName = "";
-	
-	# for each character, make sure it is valid
-	# TODO: we can probably do this in a more efficient way without
-	# 		making a copy of the string, but oh well...
-	for ch in name:
-		# if x is an alphanumeric character add
-		if ch.isalnum():
-			# if first character, capitalise, others are all lower...
-			if len(newName) == 0:
-				newName += ch.upper();
-			else:
-				newName += ch.lower();
-		# if x is a space or underscore, add an underscore
-		elif ch in (' ', '_'):
-			newName += '_';
-	
-	# return the new name
+	newName = _valid_attr_names.get(name);
+	if newName is None:
+		# all lowercase, except for the first character (if it is alphanumeric)
+		# NOTE: make sure it is a string first
+		newName = str(name).translate(_ATTR_TABLE, _ATTR_DELETE);
+		if newName[:1].isalnum():
+			newName = newName[0].upper() + newName[1:];
+		newName = intern(newName);
+
+		if len(_valid_attr_names) >= MAX_VALID_NAMES:
+			_valid_attr_names.clear();
+		_valid_attr_names[name] = newName;
 	return newName;
-	
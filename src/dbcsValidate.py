@@ -10,11 +10,25 @@
 
 import sys
 import os
+import shutil
+import tempfile
+import traceback
+import cPickle
 
 from optparse import OptionParser
+from cStringIO import StringIO
+
+try:
+	from multiprocessing import Pool, Array
+except ImportError:
+	Pool = None;
 
 from dbcsTypes import *
 import dbcsLoader
+import dbcsWatch
+import dbcsReport
+import dbcsFingerprint
+import dbcsProfile
 
 ###########################
 # BASE TYPES
@@ -47,37 +61,94 @@ class ValidityCheck:
 	check_id = "Validity Check";
 	description = "Description of what check does";
 	
+	# version of the check, for invalidating cached results (see ResultCache)
+	# NOTE: changes to the check's own methods are picked up automatically, so this only
+	#		needs to be bumped when something else that the check relies on changes
+	check_version = 1;
+	
 	# instance variables
 	__slots__ = [
-		# errors found
+		# errors found (only when there's no sink to pass them on to)
 		'errors',
+		# number of errors found
+		'errorCount',
+		# function (check, error) to pass errors on to as soon as they're found (instead of keeping them)
+		'sink',
+		# ResultCache keeping track of what the results depend on (when checking incrementally)
+		'tracker',
 		# was test successful
 		'passed'
 	]
 	
 	# constructor - perform the test on the given model
-	def __init__ (self, model):
+	#	model: model to check, or None to leave the check to be run by walkModel() later
+	#	sink: function (check, error) to pass errors on to as soon as they're found
+	def __init__ (self, model=None, sink=None):
 		# init the needed data
 		self.errors = [];
+		self.errorCount = 0;
+		self.sink = sink;
+		self.tracker = None;
+		self.passed = True;
 		
 		# perform the tests
-		self.checkValid(model);
-		
-		# set the status of whether the test was passed
-		# 	by definition, this can only happen when there are no errors!
-		self.passed = (len(self.errors) == 0);
+		if model is not None:
+			self.checkValid(model);
+			self.finish(model);
 		
 	# test procedure to perform on model
-	# OVERRIDE THIS IN SUBCLASSES
+	# NOTE: by default, this walks the model calling the per-item callbacks below,
+	#		but checks can still OVERRIDE THIS IN SUBCLASSES to do their own thing
 	def checkValid (self, model):
+		walkModel(model, [self]);
+		
+	# set the status of whether the test was passed, once all the checking is done
+	def finish (self, model):
+		# 	by definition, this can only happen when there are no errors!
+		self.passed = (self.errorCount == 0);
+		
+	# Per-item callbacks (called by walkModel() for each item in the model)
+	# OVERRIDE THESE IN SUBCLASSES (only the ones which get overridden get called)
+	
+	# entity in the model
+	def on_entity (self, model, entity):
+		pass;
+		
+	# specialisation of an entity
+	def on_specialisation (self, model, entity, spec):
 		pass;
 		
+	# relationship in the model
+	def on_relationship (self, model, rel):
+		pass;
+		
+	# link between a relationship and an entity
+	#	i: index of the link in the relationship
+	def on_link (self, model, rel, i, link):
+		pass;
+		
+	# attribute of an entity/relationship, or a component of a composite attribute
+	#	owner: entity/relationship/attribute which the attribute belongs to
+	def on_attribute (self, model, owner, attr):
+		pass;
+		
+	# Record that the results for the item being checked also depend on the given items
+	# (so that they get checked again if any of those items change too, when checking incrementally)
+	# NOTE: the item being checked itself is always included
+	def depends (self, *items):
+		if self.tracker:
+			self.tracker.depends(items);
+		
 	# Add some errors found
 	def add (self, item):
 		# check if the data that's being added is an error message
 		if isinstance(item, ModelError):
-			# add error to the errors found
-			self.errors.append(item);
+			# add error to the errors found (or pass it on straight away)
+			self.errorCount += 1;
+			if self.sink:
+				self.sink(self, item);
+			else:
+				self.errors.append(item);
 		else:
 			raise TypeError, "Cannot add unrecognised type to Entity"
 			
@@ -101,31 +172,30 @@ class Test_Entity_Keys (ValidityCheck):
 	check_id = "Entity has Primary or Partial Key"
 	description = "Does every entity have a single primary key, or a single partial for a weak entity"
 	
-	# API callback for check
-	def checkValid (self, model):
-		# check each entity
-		for entity in model.entities:
-			# check that the entity has a key attribute
-			if entity.key is None:
-				# get superclasses to check if can inherit key from them
-				supers = model.getEntitySuperclasses(entity);
-				
-				# TODO: weak entities should probably have a partial key
-				# in addition to the identifying relationship (i.e. which gives
-				# them a key which partially identifies them)
-				
-				# do we really have any errors?
-				if len(supers) == 0:
-					# without any superclasses to inherit a key from, 
-					# there must be a key attribute 
-					self += ModelError(model, entity.name, "Missing key attribute", None);
-				elif len(supers) > 1:
-					# review this case:
-					#	there is more than one superclass, but that means there are no multiple
-					#	keys, so maybe this should have been tackled as a union instead?!
-					#	However, our superclass check only does direct superclases, so perhaps
-					#	some cases will be wrongly caught by such a test...
-					pass;
+	# API callback for check - check each entity
+	def on_entity (self, model, entity):
+		# check that the entity has a key attribute
+		if entity.key is None:
+			# get superclasses to check if can inherit key from them
+			supers = model.getEntitySuperclasses(entity);
+			self.depends(*supers);
+			
+			# TODO: weak entities should probably have a partial key
+			# in addition to the identifying relationship (i.e. which gives
+			# them a key which partially identifies them)
+			
+			# do we really have any errors?
+			if len(supers) == 0:
+				# without any superclasses to inherit a key from, 
+				# there must be a key attribute 
+				self += ModelError(model, entity.name, "Missing key attribute", None);
+			elif len(supers) > 1:
+				# review this case:
+				#	there is more than one superclass, but that means there are no multiple
+				#	keys, so maybe this should have been tackled as a union instead?!
+				#	However, our superclass check only does direct superclases, so perhaps
+				#	some cases will be wrongly caught by such a test...
+				pass;
 
 # Weak Entity
 class Test_WeakEntity_ID (ValidityCheck):
@@ -133,13 +203,11 @@ class Test_WeakEntity_ID (ValidityCheck):
 	check_id = "Weak Entity is Identified";
 	description = "Does every weak entity have a single identifying relationship"
 	
-	# API callback for check
-	def checkValid (self, model):
-		# find a weak entity
-		for entity in model.entities:
-			# if this is a weak entity, perform checks
-			if isinstance(entity, WeakEntity):
-				self._check_entity(model, entity);
+	# API callback for check - find a weak entity
+	def on_entity (self, model, entity):
+		# if this is a weak entity, perform checks
+		if isinstance(entity, WeakEntity):
+			self._check_entity(model, entity);
 			
 	def _check_entity (self, model, entity):
 		# weak entity must be identified 
@@ -147,6 +215,7 @@ class Test_WeakEntity_ID (ValidityCheck):
 			self += ModelError(model, entity.name, "Weak Entity has no identifying relationship", None);
 			return;
 		rel = entity.identifying_rel;
+		self.depends(rel);
 		
 		# check how it relates to the other entities
 		for i,link in enumerate(rel.links):
@@ -169,34 +238,374 @@ class Test_Relationship_Degrees (ValidityCheck):
 	check_id = "Relationship has Participants"
 	description = "Does every relationship have sufficient and valid participants"
 	
-	# API callback for check
-	def checkValid (self, model):
-		# check each relationship
+	# API callback for check - check each relationship
+	# NOTE: the links are checked here instead of in on_link(), since the number of valid ones is needed
+	def on_relationship (self, model, rel):
+		# check if at least 2 links are valid, and/or detect invalid links
+		validLinks = 0;
+		for i,link in enumerate(rel.links):
+			# link entity cannot be none, otherwise is an error
+			if link.entity is None:
+				debugInfo = "i=%d" % (i);
+				self += ModelError(model, rel.name, "Relationship link has missing participant", debugInfo);
+			# structural constraint must exist, and have 2 elements (which must be +ve ints, or 'N')
+			elif link.structCon is None:
+				debugInfo = "i=%d" % (i);
+				self += ModelError(model, rel.name, "Relationship link has missing structural constraint", debugInfo);
+			elif (len(link.structCon) != 2) or \
+					(type(link.structCon[0]) is not int) or \
+					((type(link.structCon[1]) is not int) and (link.structCon[1] != 'N')):
+				debugInfo = "i=%d, structCon=%s" % (i, link.structCon);
+				self += ModelError(model, rel.name, "Relationship link has structural constraint of that isn't of the form (min,max), where min/max are integers", debugInfo); 
+			# otherwise, link is ok...
+			else:
+				validLinks += 1;
+		
+		# does the relationship have at least 2 valid links?
+		if validLinks < 2:
+			debugInfo = "validLinks=%d/%d" % (validLinks, len(rel.links));
+			self += ModelError(model, rel.name, "Relationship does not have at least 2 valid links", debugInfo);
+
+# Check that no entity is (directly or indirectly) a subclass of itself
+class Test_Specialisation_Cycles (ValidityCheck):
+	# check id
+	check_id = "Specialisations have no Cycles"
+	description = "Is every specialisation hierarchy free of cycles (i.e. no entity is a subclass of itself)"
+	
+	# API callback for check - check each entity
+	def on_entity (self, model, entity):
+		# a cycle can be made by changes anywhere above this entity
+		self.depends(*model.getEntityAncestors(entity));
+		
+		# report each cycle once, for the first entity in it
+		cycle = model.getSpecialisationCycle(entity);
+		if cycle and (cycle[0] is entity):
+			debugInfo = "cycle=%s" % ("->".join([member.name for member in cycle]));
+			self += ModelError(model, entity.name, "Entity is a subclass of itself (specialisation cycle)", debugInfo);
+
+###########################
+# Model Walker
+
+# helper - get the given callback of a check (or None if it hasn't been overridden)
+def _get_callback (check, name):
+	if getattr(check.__class__, name).im_func is getattr(ValidityCheck, name).im_func:
+		return None;
+	return getattr(check, name);
+
+# helper - call the attribute callback for the given attributes (and their components)
+def _walk_attributes (model, owner, attributes, attrFn):
+	for attr in attributes:
+		attrFn(model, owner, attr);
+		if attr.components:
+			_walk_attributes(model, attr, attr.components, attrFn);
+
+# run the given checks over the model, in a single pass over the items in the model
+#	checks: list of check instances (i.e. created with no model, so that they haven't run yet)
+#	tracker: ResultCache to reuse the results for unchanged items from (and to record the new ones in)
+#	profiler: dbcsProfile.Profiler to record the time taken by each check in
+# NOTE: the callbacks for each entity (along with its specialisations and attributes) or
+#		relationship (along with its links and attributes) are the units that results are kept for
+def walkModel (model, checks, tracker=None, profiler=None):
+	profiler = profiler or dbcsProfile.NULL_PROFILER;
+	base = ValidityCheck.checkValid.im_func;
+	entityVisitors = [];
+	relVisitors = [];
+	
+	for check in checks:
+		# the time taken by each check's callbacks is added up when profiling
+		# NOTE: the callbacks are only wrapped when profiling, so this costs nothing otherwise
+		phase = "check:%s" % (check.check_id);
+		
+		if check.__class__.checkValid.im_func is not base:
+			# checks which do their own thing just get run on their own (as a single unit)
+			if (tracker is None) or tracker.begin(check, None):
+				profiler.wrap(phase, check.checkValid)(model);
+				if tracker:
+					tracker.end(check, None);
+		else:
+			# only bother calling the callbacks which are used
+			entityFn = profiler.wrap(phase, _get_callback(check, 'on_entity'));
+			specFn   = profiler.wrap(phase, _get_callback(check, 'on_specialisation'));
+			relFn    = profiler.wrap(phase, _get_callback(check, 'on_relationship'));
+			linkFn   = profiler.wrap(phase, _get_callback(check, 'on_link'));
+			attrFn   = profiler.wrap(phase, _get_callback(check, 'on_attribute'));
+			
+			if entityFn or specFn or attrFn:
+				entityVisitors.append((check, entityFn, specFn, attrFn));
+			if relFn or linkFn or attrFn:
+				relVisitors.append((check, relFn, linkFn, attrFn));
+	
+	# entities
+	if entityVisitors:
+		for entity in model.entities:
+			for check, entityFn, specFn, attrFn in entityVisitors:
+				if tracker and not tracker.begin(check, entity):
+					continue; # results from last time are still valid
+				
+				if entityFn:
+					entityFn(model, entity);
+				if specFn:
+					for spec in entity.specialisations:
+						specFn(model, entity, spec);
+				if attrFn:
+					_walk_attributes(model, entity, entity.attributes, attrFn);
+				
+				if tracker:
+					tracker.end(check, entity);
+	
+	# relationships
+	if relVisitors:
 		for rel in model.relationships:
-			# check if at least 2 links are valid, and/or detect invalid links
-			validLinks = 0;
-			for i,link in enumerate(rel.links):
-				# link entity cannot be none, otherwise is an error
-				if link.entity is None:
-					debugInfo = "i=%d" % (i);
-					self += ModelError(model, rel.name, "Relationship link has missing participant", debugInfo);
-				# structural constraint must exist, and have 2 elements (which must be +ve ints, or 'N')
-				elif link.structCon is None:
-					debugInfo = "i=%d" % (i);
-					self += ModelError(model, rel.name, "Relationship link has missing structural constraint", debugInfo);
-				elif (len(link.structCon) != 2) or \
-						(type(link.structCon[0]) is not int) or \
-						((type(link.structCon[1]) is not int) and (link.structCon[1] != 'N')):
-					debugInfo = "i=%d, structCon=%s" % (i, link.structCon);
-					self += ModelError(model, rel.name, "Relationship link has structural constraint of that isn't of the form (min,max), where min/max are integers", debugInfo); 
-				# otherwise, link is ok...
-				else:
-					validLinks += 1;
+			for check, relFn, linkFn, attrFn in relVisitors:
+				if tracker and not tracker.begin(check, rel):
+					continue; # results from last time are still valid
+				
+				if relFn:
+					relFn(model, rel);
+				if linkFn:
+					for i,link in enumerate(rel.links):
+						linkFn(model, rel, i, link);
+				if attrFn:
+					_walk_attributes(model, rel, rel.attributes, attrFn);
+				
+				if tracker:
+					tracker.end(check, rel);
+
+###########################
+# Result Cache
+
+# Cache validation results between runs (for files which haven't changed)
+# NOTE: this is off by default (see --cache), since working out the signatures of the items
+#		costs more than running the basic checks does. It only pays off for expensive checks.
+USE_RESULT_CACHE = False;
+
+# identifies the cache format
+_RESULT_CACHE_MAGIC = "DBCV3.%d" % (cPickle.HIGHEST_PROTOCOL);
+
+# Results of the checks run on a .dbcs file the last time it was validated
+# NOTE: results are kept for each item that each check was run on (see walkModel()), along with
+#		signatures of the items that they depended on. Results are only reused when the check 
+#		hasn't changed (fingerprint of its code), and neither have any of the items they depended on.
+#
+#		The file starts with a summary of all the errors found last time, so that when the
+#		.dbcs file hasn't changed at all, these can just be replayed (see replay()) without
+#		loading the results for each item, or walking the model.
+class ResultCache:
+	__slots__ = [
+		'cacheN',		# name of file that the results are stored in
+		'model',		# model being checked
+		'stamp',		# source stamp of the .dbcs file the model was loaded from
+		'unchanged',	# the file hasn't changed since last time (so neither have any of the items)
+		
+		'summary',		# (check name -> check fingerprint, list of (check name, item_name, error, info) errors
+						#	in the order they were found) from last time
+		'pending',		# unpickler to load the results for each item from (until they're needed)
+		'results',		# check name -> (check fingerprint, units) from last time, where units are
+						#	item name -> (tuple of (item name, signature) depended on, list of (item_name, error, info) errors)
+						# NOTE: the item name is None for checks which aren't run item by item
+		'newResults',	# results found this time (as above)
+		'errorLog',		# errors found this time (as for summary)
+		'signatures',	# item name -> signature of the item in the model (as they're needed)
+		
+		'keys',			# check -> check name
+		'active',		# check -> (units from last time, units for this time)
+		'current',		# (set of item names depended on, list of errors) for the item being checked (or None)
+		'dirty',		# results have changed since they were loaded
+	]
+	
+	# Constructor - load the cached results for the given file/model
+	def __init__ (self, fileN, model):
+		fileN = os.path.abspath(fileN);
+		self.cacheN = dbcsLoader.getCacheFilename(fileN, "dbcsv");
+		self.model = model;
+		
+		self.summary = None;
+		self.pending = None;
+		self.results = {};
+		self.newResults = {};
+		self.errorLog = [];
+		self.signatures = {};
+		self.keys = {};
+		self.active = {};
+		self.current = None;
+		
+		# NOTE: the model can't have changed if the file hasn't, in which case 
+		#		there's no need to work out the signatures of the items
+		source = dbcsLoader.readCacheFile(fileN);
+		if source is not None:
+			self.stamp = dbcsLoader.getSourceStamp(fileN, source);
+		else:
+			self.stamp = None;
+		
+		# load the summary of the results from last time
+		# NOTE: the results for each item are only loaded if they're needed (see _load_results())
+		stamp = None;
+		
+		data = dbcsLoader.readCacheFile(self.cacheN);
+		if data and data.startswith(_RESULT_CACHE_MAGIC):
+			try:
+				f = StringIO(data);
+				f.seek(len(_RESULT_CACHE_MAGIC));
+				unpickler = cPickle.Unpickler(f);
+				
+				stamp, self.summary = unpickler.load();
+				self.pending = unpickler;
+			except Exception:
+				stamp = None; # corrupted or out of date, so just start again
+		
+		self.unchanged = (self.stamp is not None) and (stamp == self.stamp);
+		self.dirty = not self.unchanged;
+	
+	# helper - load the results for each item from last time (if they haven't been already)
+	def _load_results (self):
+		if self.pending:
+			try:
+				results = self.pending.load();
+				if isinstance(results, dict):
+					self.results = results;
+			except Exception:
+				pass; # corrupted, so everything just gets checked again
+			self.pending = None;
+	
+	# helper - get the key and fingerprint for a check
+	def _check_key (self, check):
+		return (check.__name__,
+				"%s:%s" % (check.check_version, dbcsFingerprint.classFingerprint(check)));
+	
+	# get the signature of the named item in the model (or of the whole model, for None)
+	def getSignature (self, name):
+		try:
+			return self.signatures[name];
+		except KeyError:
+			if name is None:
+				sig = dbcsFingerprint.modelFingerprint(self.model);
+			else:
+				sig = dbcsFingerprint.itemSignature(self.model.getItem(name));
+			
+			self.signatures[name] = sig;
+			return sig;
+	
+	# Checks --------------------------------
+	
+	# reuse all the errors found last time (if nothing has changed at all)
+	#	checks: check instances (which haven't been run yet)
+	# < returns: False if the checks need to be run (see startCheck())
+	def replay (self, checks):
+		if not (self.unchanged and self.summary):
+			return False;
+		
+		fingerprints, errors = self.summary;
+		for check in checks:
+			key, fingerprint = self._check_key(check.__class__);
+			if fingerprints.get(key) != fingerprint:
+				return False; # check has changed
+			self.keys[check] = key;
+		
+		checksByKey = dict([(key, check) for check, key in self.keys.iteritems()]);
+		for key, item_name, error, info in errors:
+			check = checksByKey.get(key);
+			if check:
+				check += ModelError(self.model, item_name, error, info);
+		return True;
+	
+	# get ready for the given check to be run (reusing the results from last time where possible)
+	def startCheck (self, check):
+		self._load_results();
+		key, fingerprint = self._check_key(check.__class__);
+		self.keys[check] = key;
+		
+		entry = self.results.get(key);
+		if entry and (entry[0] == fingerprint):
+			units = entry[1];
+		else:
+			units = {}; # check has changed, so everything needs checking again
+		
+		newUnits = {};
+		self.newResults[key] = (fingerprint, newUnits);
+		self.active[check] = (units, newUnits);
+		check.tracker = self;
+	
+	# start checking the given item
+	#	item: item being checked (or None for the whole model)
+	# < returns: False if the results from last time are still valid (and have been added to the check)
+	def begin (self, check, item):
+		if item is not None:
+			name = item.name;
+		else:
+			name = None;
+		units, newUnits = self.active[check];
+		
+		# reuse the results from last time if nothing that they depended on has changed
+		unit = units.get(name);
+		if unit:
+			if self.unchanged:
+				valid = True;
+			else:
+				valid = True;
+				for depName, sig in unit[0]:
+					if self.getSignature(depName) != sig:
+						valid = False;
+						break;
 			
-			# does the relationship have at least 2 valid links?
-			if validLinks < 2:
-				debugInfo = "validLinks=%d/%d" % (validLinks, len(rel.links));
-				self += ModelError(model, rel.name, "Relationship does not have at least 2 valid links", debugInfo);
+			if valid:
+				newUnits[name] = unit;
+				for item_name, error, info in unit[1]:
+					check += ModelError(self.model, item_name, error, info);
+				return False;
+		
+		# the item needs checking again, so start keeping track of what it depends on
+		self.current = (set([name]), []);
+		return True;
+	
+	# finish checking the given item
+	def end (self, check, item):
+		if item is not None:
+			name = item.name;
+		else:
+			name = None;
+		units, newUnits = self.active[check];
+		
+		deps, errors = self.current;
+		self.current = None;
+		
+		newUnits[name] = (tuple([(depName, self.getSignature(depName)) for depName in sorted(deps)]), errors);
+		self.dirty = True;
+	
+	# record that the item being checked depends on the given items
+	def depends (self, items):
+		if self.current:
+			for item in items:
+				self.current[0].add(item.name);
+	
+	# record an error found by the given check (for the item being checked)
+	def record (self, check, error):
+		self.errorLog.append((self.keys[check], error.item_name, error.error, error.info));
+		if self.current:
+			self.current[1].append((error.item_name, error.error, error.info));
+	
+	# Saving --------------------------------
+	
+	# write the results to disk (if they've changed)
+	def save (self):
+		if not self.dirty:
+			return;
+		
+		# NOTE: results for checks which weren't run this time are kept for next time
+		self._load_results();
+		results = self.results.copy();
+		results.update(self.newResults);
+		
+		# the summary only covers the checks run this time
+		fingerprints = dict([(key, entry[0]) for key, entry in self.newResults.iteritems()]);
+		
+		try:
+			data = (cPickle.dumps((self.stamp, (fingerprints, self.errorLog)), cPickle.HIGHEST_PROTOCOL) +
+					cPickle.dumps(results, cPickle.HIGHEST_PROTOCOL));
+		except (cPickle.PicklingError, TypeError):
+			return; # debug info that can't be saved, so just check again next time
+		
+		dbcsLoader.writeCacheFile(self.cacheN, _RESULT_CACHE_MAGIC + data);
+		self.dirty = False;
 
 ###########################
 # Public API 
@@ -207,52 +616,88 @@ BASIC_TESTS = [
 	#Test_Entity_Descriptive,
 	Test_Relationship_Degrees,
 	Test_WeakEntity_ID,
+	Test_Specialisation_Cycles,
 ]
 
 # ------------
 
 # validate the provided model, checking that it passes
 # the given integrity checks
-def validateModel (model, checks):
+#	reporter: dbcsReport.Reporter to report the results to (defaults to printing them)
+#	cache: ResultCache with results from last time, for the items which don't need checking again
+#	profiler: dbcsProfile.Profiler to record the time taken by each check in
+# < returns: True if all the checks passed
+def validateModel (model, checks, reporter=None, cache=None, profiler=None):
 	# statistics
 	failedTests = 0;
 	passedTests = 0;
 	totalTests = len(checks);
 	
-	# run each test, and see if it passes
-	for check in checks:
-		# verify that this is a valid check
-		if ValidityCheck in check.__bases__:
-			print("$$ Checking if %s ..." % check.check_id);
-			try:
-				# try to get result for test
-				testResult = check(model);
-				
-				# check if passed or not
-				if testResult.passed == False:
-					print("!! Some errors found ...");
-					failedTests += 1; # TODO: make this report the total number of errors instead?
-					
-					# dump the errors to stderr for now
-					# TODO: later on, we could dump to a specified file instead
-					for error in testResult:
-						error.report(sys.stderr);
-					print("!! ... carrying on ... \n");
-				else:
-					print("!! ... No sins here :) \n");
-					passedTests += 1;
-			except:
-				sys.stderr.write("ERROR: An error occurred while trying to perform this validity test. Details follow... \n");
-				# ...
-				raise;
-				
+	if reporter is None:
+		reporter = dbcsReport.TextReporter();
+	
+	# verify that these are valid checks
+	checks = [check for check in checks if ValidityCheck in check.__bases__];
+	
+	# errors get reported as they're found (and recorded in the cache)
+	if cache:
+		def sink (testResult, error):
+			cache.record(testResult, error);
+			reporter.error(testResult, error);
+	else:
+		sink = reporter.error;
+	
+	testResults = [check(sink=sink) for check in checks];
+	
+	# when nothing has changed, the errors from last time just get reported again
+	replayed = cache and cache.replay(testResults);
+	if cache and not replayed:
+		for testResult in testResults:
+			cache.startCheck(testResult);
+	
+	# run all the tests together, in a single pass over the model
+	# NOTE: with a cache, only the items which have changed (or depend on things which have) get checked again
+	try:
+		if not replayed:
+			walkModel(model, testResults, cache, profiler);
+		for testResult in testResults:
+			testResult.finish(model);
+			if profiler:
+				profiler.count("errors:%s" % (testResult.check_id), testResult.errorCount);
+	except:
+		sys.stderr.write("ERROR: An error occurred while trying to perform the validity tests. Details follow... \n");
+		# ...
+		raise;
+	
+	# save the new results for next time
+	if cache:
+		cache.save();
+	
+	# report whether each test passed
+	for testResult in testResults:
+		reporter.endCheck(testResult);
+		
+		# check if passed or not
+		if testResult.passed == False:
+			failedTests += 1; # TODO: make this report the total number of errors instead?
+		else:
+			passedTests += 1;
+			
 	# report statistics of testing
-	print("\n$$ %d of %d tests passed. There were %d failure(s) to fix.\n" % (passedTests, totalTests, failedTests))
+	reporter.endModel(passedTests, totalTests, failedTests);
+	
+	return (failedTests == 0);
 
 ###########################
 
 # create a graph for the specified file
-def processSchema (fileN, mode):
+#	restricted: only allow the dbcs mini-language in the file (see dbcsLoader.readDBCS)
+#	reporter: dbcsReport.Reporter to report the results to (defaults to printing them)
+#	profiler: dbcsProfile.Profiler to record the time taken for each phase in
+# < returns: (model, passed) - the model loaded from the file (or None if it couldn't be loaded),
+#			  and whether it passed all the checks
+def processSchema (fileN, mode, restricted=False, reporter=None, profiler=None):
+	profiler = profiler or dbcsProfile.NULL_PROFILER;
 	print("$ Loading schema description...")
 	
 	# make sure filename is of the form *.dbcs
@@ -260,9 +705,27 @@ def processSchema (fileN, mode):
 	fileN = dbcsLoader.changeExtension(fileN, "dbcs");
 	
 	# get the model used by the file
-	model = dbcsLoader.readDBCS(fileN);
+	profiler.begin("load");
+	model = dbcsLoader.readDBCS(fileN, restricted);
+	profiler.end("load");
 	if model is None:
-		return False;
+		if reporter:
+			reporter.fileError(fileN, "Couldn't load model");
+		return (None, False);
+	
+	profiler.count("model.entities", len(model.entities));
+	profiler.count("model.relationships", len(model.relationships));
+	
+	return (model, checkSchema(fileN, model, mode, restricted, reporter, profiler));
+
+# validate the model loaded from the given file
+#	restricted: the file is untrusted (so the result cache isn't used for it)
+#	reporter: dbcsReport.Reporter to report the results to (defaults to printing them)
+#	profiler: dbcsProfile.Profiler to record the time taken for each phase in
+# < returns: whether the model passed all the checks
+def checkSchema (fileN, model, mode, restricted=False, reporter=None, profiler=None):
+	profiler = profiler or dbcsProfile.NULL_PROFILER;
+	fileN = dbcsLoader.changeExtension(fileN, "dbcs");
 	
 	# get checks to use
 	# FIXME: currently, can only use 'basic'
@@ -270,13 +733,190 @@ def processSchema (fileN, mode):
 	#	checks = BASIC_TESTS;
 	checks = BASIC_TESTS;
 	
+	# results from last time can be reused if nothing has changed
+	# NOTE: the cache isn't used for untrusted files, since it gets unpickled
+	if USE_RESULT_CACHE and not restricted:
+		profiler.begin("cache");
+		cache = ResultCache(fileN, model);
+		profiler.end("cache");
+	else:
+		cache = None;
+	
 	# perform the checking
 	print("$ Validating Schema...")
-	validateModel(model, checks);
+	profiler.begin("validate");
+	passed = validateModel(model, checks, reporter, cache, profiler);
+	profiler.end("validate");
 	
 	print("!! Done... :)");
 	
-	return True;
+	return passed;
+
+# -----------
+
+# helper for validateFiles() - validate one of the files
+# < returns: whether the file passed
+def _validate_file (fileN, mode, restricted, reporter, profiler):
+	# print info on file we're handling
+	print("$ Processing file ===> %s ..." % fileN);
+	reporter.beginFile(fileN);
+	
+	try:
+		passed = processSchema(fileN, mode, restricted, reporter, profiler)[1];
+	except Exception, e:
+		# errors in the file shouldn't stop the rest of the files getting checked
+		traceback.print_exc();
+		reporter.fileError(fileN, "%s: %s" % (e.__class__.__name__, e));
+		passed = False;
+	
+	reporter.endFile(fileN, passed);
+	
+	# insert linebreak before next file for clarity
+	print("\n"); 
+	return passed;
+
+# how often (in seconds) to check that the worker handling a file is still alive
+WORKER_POLL_TIME = 0.5;
+
+# shared array with the pid of the worker handling each file (see _init_worker)
+_owners = None;
+
+# helper for validateFiles() - set up a worker process
+#	owners: shared array for the workers to record which files they've picked up in
+def _init_worker (owners):
+	global _owners;
+	_owners = owners;
+
+# helper for validateFiles() - validate a file in a worker process
+# NOTE: all output is captured, so that it can be shown in order (instead of all mixed together),
+#		with the report going to a temp file (so that it doesn't need to be kept in memory)
+# < returns: (fileN, passed, stdout text, stderr text, report filename or None, profile data or None)
+def _validate_worker (args):
+	index, fileN, mode, restricted, reportFormat, useReportFile, profile, useCache = args;
+	if _owners is not None:
+		_owners[index] = os.getpid();
+	profiler = dbcsProfile.makeProfiler(profile);
+	
+	oldStreams = (sys.stdout, sys.stderr);
+	sys.stdout = StringIO();
+	sys.stderr = StringIO();
+	try:
+		# NOTE: the setting isn't inherited when workers don't get forked
+		global USE_RESULT_CACHE;
+		USE_RESULT_CACHE = useCache;
+		
+		if useReportFile:
+			reportFile = tempfile.NamedTemporaryFile(suffix=".report", delete=False);
+			reportN = reportFile.name;
+		else:
+			reportFile = reportN = None; # report just gets printed with the rest
+		
+		try:
+			reporter = dbcsReport.makeReporter(reportFormat, reportFile);
+			passed = _validate_file(fileN, mode, restricted, reporter, profiler);
+		finally:
+			if reportFile:
+				reportFile.close();
+		
+		if profiler.enabled:
+			profile = profiler.getData();
+		else:
+			profile = None;
+		
+		return (fileN, passed, sys.stdout.getvalue(), sys.stderr.getvalue(), reportN, profile);
+	finally:
+		sys.stdout, sys.stderr = oldStreams;
+
+# helper for validateFiles() - add the report written by a worker to the main one
+def _copy_report (reportN, stream):
+	try:
+		f = open(reportN, 'r');
+		try:
+			shutil.copyfileobj(f, stream);
+		finally:
+			f.close();
+	finally:
+		os.remove(reportN);
+
+# helper for validateFiles() - wait for the worker handling a file to finish
+# NOTE: when a worker dies (i.e. the interpreter crashes on the file), the pool quietly
+#		replaces it, and the result for the file it had would otherwise never arrive
+# < returns: result from _validate_worker(), or None if the worker died while handling the file
+def _wait_worker (pool, result, owners, index):
+	while not result.ready():
+		result.wait(WORKER_POLL_TIME);
+		pid = owners[index];
+		if pid and not result.ready():
+			alive = [worker.pid for worker in list(pool._pool) if worker.exitcode is None];
+			if pid not in alive:
+				# give the result a moment to turn up, in case it was sent just before the worker died
+				result.wait(WORKER_POLL_TIME);
+				if not result.ready():
+					return None;
+	return result.get();
+
+# validate a batch of files, spreading them over several worker processes
+#	jobs: number of worker processes to use (defaults to the number of cpu's)
+#	reporter: dbcsReport.Reporter to report the results to (defaults to printing them)
+#	profiler: dbcsProfile.Profiler to record the time taken for each phase in
+#			  (when several workers are used, the times from each of them get added together)
+# < returns: list of (fileN, passed) for each file, in the order they were given
+def validateFiles (fileNs, mode, restricted=False, jobs=0, reporter=None, profiler=None):
+	results = [];
+	
+	if reporter is None:
+		reporter = dbcsReport.TextReporter();
+	profiler = profiler or dbcsProfile.NULL_PROFILER;
+	
+	if (jobs == 1) or (len(fileNs) <= 1) or (Pool is None):
+		# just do them one by one then
+		for fileN in fileNs:
+			results.append((fileN, _validate_file(fileN, mode, restricted, reporter, profiler)));
+	else:
+		# each file gets loaded and checked in one of the workers, with the reports
+		# being printed in order as soon as they (and all the ones before) are ready
+		useReportFile = (reporter.stream is not None);
+		tasks = [(index, fileN, mode, restricted, reporter.name, useReportFile, profiler.enabled, USE_RESULT_CACHE) for index, fileN in enumerate(fileNs)];
+		owners = Array('i', len(tasks), lock=False);
+		
+		pool = Pool(jobs or None, _init_worker, (owners,));
+		try:
+			pending = [pool.apply_async(_validate_worker, (task,)) for task in tasks];
+			for index, fileN in enumerate(fileNs):
+				output = _wait_worker(pool, pending[index], owners, index);
+				if output is None:
+					# the file counts as failed, with the rest of the batch still being checked
+					sys.stderr.write("X Worker process died while checking %s\n" % (fileN));
+					reporter.beginFile(fileN);
+					reporter.fileError(fileN, "Worker process died while checking the file");
+					reporter.endFile(fileN, False);
+					results.append((fileN, False));
+					continue;
+				
+				fileN, passed, out, err, reportN, profile = output;
+				sys.stdout.write(out);
+				sys.stdout.flush();
+				sys.stderr.write(err);
+				if reportN:
+					_copy_report(reportN, reporter.stream);
+				if profile:
+					profiler.merge(profile);
+				results.append((fileN, passed));
+			pool.close();
+		finally:
+			pool.terminate();
+			pool.join();
+	
+	return results;
+
+# print summary of the results for a batch of files
+def printBatchSummary (results, stream=None):
+	stream = stream or sys.stdout;
+	failed = [fileN for fileN, passed in results if not passed];
+	
+	stream.write("$ %d of %d files passed validation\n" % (len(results) - len(failed), len(results)));
+	for fileN in failed:
+		stream.write("X -- %s\n" % (fileN));
 
 ###########################
 
@@ -285,40 +925,133 @@ modes = ["basic"]
 
 # -----------
 
+# Add the options for which checks to run and how to report them to a commandline option parser
+# NOTE: these are shared with the other tools which validate files (i.e. dbcs.py)
+def addReportOptions (parser):
+	parser.add_option("-m", "--modes", dest="mode", 
+			default="basic", type="string",
+			help="Set of tests to perform (out of %s)" % modes)
+	parser.add_option("-r", "--report", dest="report",
+			default=dbcsReport.reportFormats[0], type="choice", choices=dbcsReport.reportFormats,
+			help="Format of report for the files given (out of %s)" % dbcsReport.reportFormats)
+	parser.add_option("-o", "--output", dest="output",
+			default=None, type="string",
+			help="File to write the report to (defaults to stdout)")
+	parser.add_option("--cache", dest="cache",
+			default=False, action="store_true",
+			help="Keep the results for each file (in __pycache__), and only check the items which have changed since last time")
+
+# Get the set of tests to perform from the parsed commandline options (see addReportOptions)
+def getMode (options):
+	if (options.mode) and (options.mode in modes):
+		mode = options.mode;
+	else:
+		mode = modes[0]; # default to 'basic' again
+	return mode;
+
+# Get the stream that the report should be written to, from the parsed commandline options (see addReportOptions)
+# NOTE: for reports other than text ones, everything else that gets printed goes to stderr instead
+# < returns: the stream (or None if the report just gets printed along with everything else)
+def openReportStream (options):
+	if options.output:
+		reportStream = open(options.output, 'w');
+	elif options.report != dbcsReport.TextReporter.name:
+		# keep the report on stdout on its own, by sending everything else to stderr instead
+		reportStream = sys.stdout;
+		sys.stdout = sys.stderr;
+	else:
+		reportStream = None; # printed along with everything else
+	return reportStream;
+
+# -----------
+
 def main ():
-	# always print version info first...
-	# TODO: we should have a way to supress this for super-scripts...
-	print("DataBase Conceptual Schema (EER) Validator");
-	print("Copyright 2010, Joshua Leung (aligorith@gmail.com)\n");
+	global USE_RESULT_CACHE;
 	
 	# set up option parser for managing the commandline args
-	usage = "usage: %prog [-m modename] [file1 [file2 [...]]]";
+	usage = "usage: %prog [-m modename] [-j jobs] [-r format] [-o file] [-s] [-w] [--cache] [--compact] [--snapshots] [--profile] [file1 [file2 [...]]]";
 	parser = OptionParser(usage);
-	parser.add_option("-m", "--modes", dest="mode", 
-			default="basic", type="string",
-			help="Set of tests to perform (out of %s)" % modes)
+	parser.add_option("-j", "--jobs", dest="jobs",
+			default=0, type="int",
+			help="Number of files to validate at once, when given several files (defaults to the number of CPU's)")
+	parser.add_option("-s", "--safe", dest="restricted",
+			default=False, action="store_true",
+			help="Only allow the dbcs mini-language in files, instead of running them as Python scripts (for untrusted files)")
+	parser.add_option("-w", "--watch", dest="watch",
+			default=False, action="store_true",
+			help="Keep watching the given files/directories (or the current directory), and validate them again when they change")
+	parser.add_option("--compact", dest="compact",
+			default=False, action="store_true",
+			help="Load models in a compact form (taking much less memory), for very large schemas")
+	parser.add_option("--snapshots", dest="snapshots",
+			default=False, action="store_true",
+			help="Save loaded models next to the files (as .dbcsm files), to load them faster while they're unchanged (mostly worthwhile along with --compact)")
+	addReportOptions(parser);
+	dbcsProfile.addProfileOptions(parser);
 	
 	# parse commandline options
 	(options, args) = parser.parse_args()
 	
-	# mode to use
-	if (options.mode) and (options.mode in modes):
-		mode = options.mode;
-	else:
-		mode = modes[0]; # default to 'basic' again
+	# load models in compact form
+	dbcsLoader.USE_COMPACT_MODELS = options.compact;
+	
+	# save snapshots of loaded models
+	dbcsLoader.USE_MODEL_SNAPSHOTS = options.snapshots;
+	# keep results between runs
+	USE_RESULT_CACHE = options.cache;
+	
+	reportStream = openReportStream(options);
+	
+	# always print version info first...
+	# TODO: we should have a way to supress this for super-scripts...
+	print("DataBase Conceptual Schema (EER) Validator");
+	print("Copyright 2010, Joshua Leung (aligorith@gmail.com)\n");
+	
+	mode = getMode(options);
 	
 	# parse filename arguments
-	if len(args) >= 1:
-		# argv[0] = scriptname...
-		for fileN in sys.argv[1:]:
-			# print info on file we're handling
+	if options.watch:
+		reporter = dbcsReport.makeReporter(options.report, reportStream);
+		reporter.begin();
+		
+		# revalidate files as they change
+		def process (fileN):
 			print("$ Processing file ===> %s ..." % fileN);
+			profiler = dbcsProfile.makeProfiler(options.profile);
 			
-			# convert the file, then perform tests on it
-			processSchema(fileN, mode);
+			reporter.beginFile(fileN);
+			passed = processSchema(fileN, mode, options.restricted, reporter, profiler)[1];
+			reporter.endFile(fileN, passed);
+			if reportStream:
+				reportStream.flush(); # don't keep whoever is reading the report waiting
 			
-			# insert linebreak before next file for clarity
-			print("\n"); 
+			profiler.report(format=options.profileFormat);
+			print("");
+		
+		dbcsWatch.Watcher(dbcsWatch.getWatchPaths(args), process).run();
+		
+		reporter.end();
+		if options.output:
+			reportStream.close();
+	elif len(args) >= 1:
+		reporter = dbcsReport.makeReporter(options.report, reportStream);
+		reporter.begin();
+		profiler = dbcsProfile.makeProfiler(options.profile);
+		
+		# NOTE: options have already been stripped from these
+		results = validateFiles(args, mode, options.restricted, options.jobs, reporter, profiler);
+		
+		reporter.end();
+		if options.output:
+			reportStream.close();
+		
+		if len(results) > 1:
+			printBatchSummary(results);
+		profiler.report(format=options.profileFormat);
+		
+		# let scripts know if anything failed
+		if not all([passed for fileN, passed in results]):
+			sys.exit(1);
 	else:
 		# keep looping while user keeps supplying valid filenames 
 		while True:
@@ -330,7 +1063,7 @@ def main ():
 				break;
 			
 			# convert the file, then perform tests on it
-			processSchema(fileN, mode);
+			processSchema(fileN, mode, options.restricted);
 		
 if __name__ == '__main__':
 	main();
@@ -0,0 +1,135 @@
+# DBCSKIT - EER Modelling Toolkit
+# Copyright 2010, Joshua Leung (aligorith aT gmail DoT com)
+#
+# Watcher for directories of .dbcs files, which reprocesses files (i.e.
+# validating or rendering them) as soon as they've been edited. Only the
+# files which changed get processed again.
+
+import os
+import sys
+import time
+import traceback
+
+import dbcsLoader
+
+###############################
+# SETTINGS
+
+# time (in seconds) to wait between checks for changes
+POLL_INTERVAL = 0.25;
+
+# time (in seconds) that a file must stay unchanged after being modified before it gets processed
+# NOTE: this stops us loading half-saved files, or reprocessing several times for a series of saves
+DEBOUNCE_TIME = 0.3;
+
+###############################
+# WATCHER
+
+# Watches a set of files/directories, calling a callback for each .dbcs file which changes
+class Watcher:
+	__slots__ = [
+		# Settings
+		'paths',		# files and/or directories to watch
+		'callback',		# function (fileN), called for each file which changed
+		'debounce',		# time (in seconds) that changes must settle for before processing
+
+		# State
+		'stamps',		# fileN -> (mtime, size) of files when they were last processed
+		'pending',		# fileN -> (stamp, time that the stamp was first seen) for changes not processed yet
+	]
+
+	# Constructor
+	#	paths: list of files and/or directories (whose .dbcs files are watched)
+	#	callback: function (fileN), to call for each file that changes
+	def __init__ (self, paths, callback, debounce=DEBOUNCE_TIME):
+		self.paths = paths;
+		self.callback = callback;
+		self.debounce = debounce;
+
+		self.stamps = {};
+		self.pending = {};
+
+	# find the .dbcs files being watched, along with their current stamps
+	# < returns: dict of fileN -> (mtime, size)
+	def scan (self):
+		found = {};
+
+		for path in self.paths:
+			if os.path.isdir(path):
+				try:
+					names = os.listdir(path);
+				except OSError:
+					continue; # removed since
+				fileNs = [os.path.join(path, name) for name in names if name.endswith(".dbcs")];
+			else:
+				fileNs = [dbcsLoader.changeExtension(path, "dbcs")];
+
+			for fileN in fileNs:
+				try:
+					st = os.stat(fileN);
+				except OSError:
+					continue; # doesn't exist (anymore)
+				found[fileN] = (st.st_mtime, st.st_size);
+
+		return found;
+
+	# check for changes, processing the files which have settled since being changed
+	# < returns: list of files which were processed
+	def poll (self):
+		now = time.time();
+		found = self.scan();
+		processed = [];
+
+		# forget about files which have gone
+		for fileN in self.stamps.keys():
+			if fileN not in found:
+				print("$ Removed file ===> %s" % (fileN));
+				del self.stamps[fileN];
+		for fileN in self.pending.keys():
+			if fileN not in found:
+				del self.pending[fileN];
+
+		# check for changes
+		for fileN in sorted(found):
+			stamp = found[fileN];
+			if self.stamps.get(fileN) == stamp:
+				# unchanged since it was last processed
+				self.pending.pop(fileN, None);
+				continue;
+
+			# restart the wait if it has changed again since we last looked
+			pending = self.pending.get(fileN);
+			if (pending is None) or (pending[0] != stamp):
+				self.pending[fileN] = (stamp, now);
+				if self.debounce > 0:
+					continue;
+			elif (now - pending[1]) < self.debounce:
+				continue;
+
+			# the changes have settled, so process the file
+			del self.pending[fileN];
+			self.stamps[fileN] = stamp;
+			try:
+				self.callback(fileN);
+			except Exception:
+				# errors in the file shouldn't stop us watching (it'll get fixed in a later edit)
+				traceback.print_exc(file=sys.stderr);
+			processed.append(fileN);
+
+		return processed;
+
+	# keep watching for changes until interrupted (i.e. by Ctrl-C)
+	def run (self, interval=POLL_INTERVAL):
+		print("$ Watching %s for changes (Ctrl-C to stop) ..." % (", ".join(self.paths)));
+
+		try:
+			while True:
+				if self.poll():
+					print("$ Waiting for changes ...");
+				time.sleep(interval);
+		except KeyboardInterrupt:
+			print("\n$ Stopped watching");
+
+# Get the paths to watch given the commandline args (defaulting to the current directory)
+def getWatchPaths (args):
+	return list(args) or [os.curdir];